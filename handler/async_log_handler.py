@@ -0,0 +1,110 @@
+import asyncio
+import logging
+
+from handler.log_handler import (
+    merge_log_deltas,
+)
+
+
+class AsyncLogSubscription:
+    """Logs routed by an `AsyncLogHandler`, queued as `(removed_logs, added_logs)` deltas
+    """
+
+    def __init__(self, log_subscription, loop):
+        self.log_subscription = log_subscription
+        self.queue = asyncio.Queue(loop=loop)
+
+    @property
+    def address(self):
+        return self.log_subscription.address
+
+    @property
+    def topics(self):
+        return self.log_subscription.topics
+
+    def dispatch(self):
+        removed_logs, added_logs = self.log_subscription.pop_log_delta()
+        if len(removed_logs) != 0 or len(added_logs) != 0:
+            self.queue.put_nowait((removed_logs, added_logs))
+
+    def get_log_delta(self):
+        """Return the deltas queued so far merged into one, without waiting for new ones
+        """
+        log_deltas = []
+        while not self.queue.empty():
+            log_deltas.append(self.queue.get_nowait())
+        return merge_log_deltas(log_deltas)
+
+    def get_new_logs(self):
+        _, added_logs = self.get_log_delta()
+        return added_logs
+
+    async def wait_log_delta(self):
+        """Wait until a delta is queued, and return it merged with the other queued ones
+        """
+        log_delta = await self.queue.get()
+        removed_logs, added_logs = self.get_log_delta()
+        return merge_log_deltas((log_delta, (removed_logs, added_logs)))
+
+
+class AsyncLogHandler:
+    """Poll a `LogHandler` on a background task, and route the logs to the queues of the
+    subscriptions. The blocking RPCs run in the executor of the event loop
+    """
+
+    logger = logging.getLogger("evm.chain.sharding.AsyncLogHandler")
+
+    def __init__(self, log_handler, poll_interval=1, loop=None):
+        self.log_handler = log_handler
+        self.poll_interval = poll_interval
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.loop = loop
+        self.subscriptions = []
+        self._polling_task = None
+
+    @property
+    def is_running(self):
+        return self._polling_task is not None and not self._polling_task.done()
+
+    def subscribe(self, address=None, topics=None):
+        subscription = AsyncLogSubscription(
+            self.log_handler.subscribe(address=address, topics=topics),
+            self.loop,
+        )
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.remove(subscription)
+        self.log_handler.unsubscribe(subscription.log_subscription)
+
+    async def poll(self):
+        await self.loop.run_in_executor(None, self.log_handler.poll)
+        for subscription in self.subscriptions:
+            subscription.dispatch()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception("Failed to poll the new logs")
+            await asyncio.sleep(self.poll_interval, loop=self.loop)
+
+    def start(self):
+        if self.is_running:
+            raise ValueError('AsyncLogHandler is already running')
+        self._polling_task = asyncio.ensure_future(self._run(), loop=self.loop)
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self._polling_task.cancel()
+        try:
+            await self._polling_task
+        except asyncio.CancelledError:
+            pass
+        self._polling_task = None
@@ -0,0 +1,35 @@
+import asyncio
+
+from handler.shard_tracker import (
+    NoCandidateHead,
+    ShardTracker,
+)
+
+
+class AsyncShardTracker(ShardTracker):
+    """Track logs `CollationAdded` in mainchain, fed by the background polling task of the
+    `AsyncLogHandler` given as `log_handler`, instead of blocking on the RPCs
+    """
+
+    async def _wait_for_new_logs(self):
+        new_logs = self._process_log_delta(*await self.log_subscription.wait_log_delta())
+        self._extend_new_logs(new_logs)
+
+    async def wait_for_next_log(self, timeout=None):
+        """Same as `get_next_log`, but wait for the next new logs if there is none available
+        """
+        if len(self.new_logs) == 0:
+            self._extend_new_logs(self._get_new_logs())
+        while len(self.new_logs) == 0:
+            await asyncio.wait_for(self._wait_for_new_logs(), timeout)
+        return self._pop_new_log()
+
+    async def wait_for_candidate_head(self, timeout=None):
+        """Same as `fetch_candidate_head`, but wait for the next new logs if there is no
+        candidate head available
+        """
+        while True:
+            try:
+                return self.fetch_candidate_head()
+            except NoCandidateHead:
+                await asyncio.wait_for(self._wait_for_new_logs(), timeout)
@@ -0,0 +1,170 @@
+import json
+import os
+
+import rlp
+
+from eth_utils import (
+    decode_hex,
+    encode_hex,
+    is_bytes,
+    to_dict,
+)
+
+from contracts.utils.headers import (
+    CollationHeader,
+)
+
+from handler.utils.collation_added_logs import (
+    materialize_log_entries,
+    parse_collation_added_logs,
+)
+from handler.utils.score_indexed_logs import (
+    ScoreIndexedLogs,
+)
+
+
+CHECKPOINT_VERSION = 2
+
+# the fields of the logs restored as bytes, as web3 returns them
+LOG_HASH_FIELDS = ('blockHash', 'transactionHash')
+
+
+class InvalidCheckpoint(Exception):
+    pass
+
+
+@to_dict
+def serialize_log_entry(log_entry):
+    yield 'header', encode_hex(rlp.encode(log_entry['header']))
+    yield 'is_new_head', log_entry['is_new_head']
+    yield 'score', log_entry['score']
+
+
+@to_dict
+def deserialize_log_entry(serialized_log_entry):
+    yield 'header', rlp.decode(decode_hex(serialized_log_entry['header']), sedes=CollationHeader)
+    yield 'is_new_head', serialized_log_entry['is_new_head']
+    yield 'score', serialized_log_entry['score']
+
+
+@to_dict
+def serialize_log(log):
+    for key, value in log.items():
+        if key == 'topics':
+            yield key, [encode_hex(topic) if is_bytes(topic) else topic for topic in value]
+        elif is_bytes(value):
+            yield key, encode_hex(value)
+        else:
+            yield key, value
+
+
+@to_dict
+def deserialize_log(serialized_log):
+    for key, value in serialized_log.items():
+        if key == 'topics':
+            yield key, [decode_hex(topic) for topic in value]
+        elif key in LOG_HASH_FIELDS and value is not None:
+            yield key, decode_hex(value)
+        else:
+            yield key, value
+
+
+@to_dict
+def make_shard_tracker_checkpoint(shard_tracker):
+    # keep the logs already routed to the tracker as well, as `_process_log_delta` would add
+    # them, without changing the tracker
+    log_subscription = shard_tracker.log_subscription
+    revoked_header_hashes = set(
+        log_entry['header'].hash
+        for log_entry in parse_collation_added_logs(log_subscription.removed_logs)
+    )
+    new_logs = [
+        log_entry
+        for log_entry in shard_tracker.new_logs
+        if log_entry['header'].hash not in revoked_header_hashes
+    ] + materialize_log_entries(parse_collation_added_logs(log_subscription.added_logs))
+    yield 'current_score', shard_tracker.current_score
+    yield 'new_logs', [serialize_log_entry(log_entry) for log_entry in new_logs]
+    yield 'unchecked_logs', [
+        serialize_log_entry(log_entry)
+        for log_entry in shard_tracker.unchecked_logs
+        if log_entry['header'].hash not in revoked_header_hashes
+    ]
+
+
+@to_dict
+def make_checkpoint(log_handler, shard_trackers=()):
+    """Make a JSON serializable checkpoint of the window of recent blocks of `log_handler`,
+    the logs it delivered in them, and the pending logs of `shard_trackers`
+    """
+    recent_block_hashes = tuple(log_handler.recent_block_hashes)
+    yield 'version', CHECKPOINT_VERSION
+    yield 'recent_block_hashes', [encode_hex(block_hash) for block_hash in recent_block_hashes]
+    yield 'last_block_number', log_handler.header_cache.get_block(
+        recent_block_hashes[-1],
+    )['number']
+    # set if a `catch_up` stopped part-way, to resume it from there
+    yield 'caught_up_block_number', log_handler.caught_up_block_number
+    # kept to revoke the logs in the blocks reorged out while the handler is down
+    yield 'delivered_logs', {
+        encode_hex(block_hash): [serialize_log(log) for log in logs]
+        for block_hash, logs in log_handler.delivered_logs.items()
+    }
+    yield 'shard_trackers', {
+        str(shard_tracker.shard_id): make_shard_tracker_checkpoint(shard_tracker)
+        for shard_tracker in shard_trackers
+    }
+
+
+def save_checkpoint(path, log_handler, shard_trackers=()):
+    checkpoint = make_checkpoint(log_handler, shard_trackers)
+    # write to a temporary file first, so a crash never leaves a partial checkpoint behind
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path):
+    """Return the checkpoint saved at `path`, or None if there is none
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise InvalidCheckpoint(
+            "Unsupported checkpoint version: {0}".format(checkpoint.get('version'))
+        )
+    return checkpoint
+
+
+def get_checkpoint_block_hashes(checkpoint):
+    return tuple(decode_hex(block_hash) for block_hash in checkpoint['recent_block_hashes'])
+
+
+def get_checkpoint_delivered_logs(checkpoint):
+    return {
+        decode_hex(block_hash): [deserialize_log(log) for log in logs]
+        for block_hash, logs in checkpoint['delivered_logs'].items()
+    }
+
+
+def restore_shard_tracker(shard_tracker, checkpoint):
+    """Restore the pending logs of `shard_tracker` from `checkpoint`, if it has them.
+    Return whether `shard_tracker` is restored. Restore it before the `LogHandler` resumed
+    from `checkpoint` is polled, so the logs reorged out while it was down are revoked from it
+    """
+    shard_tracker_checkpoint = checkpoint['shard_trackers'].get(str(shard_tracker.shard_id))
+    if shard_tracker_checkpoint is None:
+        return False
+    shard_tracker.current_score = shard_tracker_checkpoint['current_score']
+    shard_tracker.new_logs = [
+        deserialize_log_entry(log_entry)
+        for log_entry in shard_tracker_checkpoint['new_logs']
+    ]
+    shard_tracker.unchecked_logs = ScoreIndexedLogs(
+        deserialize_log_entry(log_entry)
+        for log_entry in shard_tracker_checkpoint['unchecked_logs']
+    )
+    return True
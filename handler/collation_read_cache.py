@@ -0,0 +1,128 @@
+import collections
+import logging
+
+from eth_utils import (
+    encode_hex,
+)
+
+from handler.shard_tracker import (
+    COLLATION_ADDED_TOPIC,
+)
+from handler.utils.collation_added_logs import (
+    parse_collation_added_logs,
+)
+
+
+# `block_number` is the block of the `CollationAdded` log, or the block the getters are called
+# at if `from_log` is False, which is not lower than the block adding the header
+CollationReadEntry = collections.namedtuple(
+    'CollationReadEntry',
+    ['score', 'parent_hash', 'block_number', 'from_log'],
+)
+
+
+class CollationReadCache:
+    """A bounded LRU cache of the score and the parent hash of collation headers, keyed by
+    `(shard_id, collation_hash)`, for `SMCHandler.get_collation_score` and
+    `SMCHandler.get_parent_hash`.
+
+    The score and the parent of an added header never change, so an entry is only evicted when
+    a main chain reorg revokes the block adding the header. The entries are filled by the
+    `CollationAdded` logs routed by `log_handler` and by the results of the getters, and
+    `poll` has to be called to see the reorgs, e.g. along with the `ShardTracker`s sharing
+    `log_handler`
+    """
+
+    logger = logging.getLogger("evm.chain.sharding.CollationReadCache")
+
+    def __init__(self, log_handler, smc_handler_address, max_size=4096):
+        if not (isinstance(max_size, int) and max_size > 0):
+            raise ValueError('max_size should be provided as positive integer')
+        self.max_size = max_size
+        self.log_handler = log_handler
+        self.smc_handler_address = smc_handler_address
+        self.log_subscription = log_handler.subscribe(
+            address=self.smc_handler_address,
+            topics=[encode_hex(COLLATION_ADDED_TOPIC)],
+        )
+        # (shard_id, collation_hash) -> CollationReadEntry
+        self._entries = collections.OrderedDict()
+
+    def close(self):
+        """Stop routing the logs to the cache, e.g. when it is discarded
+        """
+        self.log_handler.unsubscribe(self.log_subscription)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, shard_id, collation_hash):
+        """Return the `CollationReadEntry` of the header, or None if it is not cached
+        """
+        key = (shard_id, collation_hash)
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def add(self, shard_id, collation_hash, score, parent_hash, block_number, from_log=False):
+        """Cache the score and the parent hash of the header, read at `block_number`. A zero
+        score means the header is not added yet, so it is not cached
+        """
+        if score == 0:
+            return
+        key = (shard_id, collation_hash)
+        entry = self._entries.get(key)
+        # the entry of the log knows the exact block adding the header
+        if entry is None or (from_log and not entry.from_log):
+            self._entries[key] = CollationReadEntry(score, parent_hash, block_number, from_log)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    #
+    # Replaying the logs
+    #
+    def poll(self):
+        """Cache the headers of the new `CollationAdded` logs, and evict the ones revoked by a
+        reorg. Return the number of the cached headers
+        """
+        return self._process_log_delta(*self.log_subscription.get_log_delta())
+
+    def _process_log_delta(self, removed_logs, added_logs):
+        if len(removed_logs) != 0:
+            self._evict_revoked_logs(removed_logs)
+        log_entries = parse_collation_added_logs(added_logs)
+        for log, log_entry in zip(added_logs, log_entries):
+            header = log_entry['header']
+            self.add(
+                header.shard_id,
+                header.hash,
+                log_entry['score'],
+                header.parent_hash,
+                log['blockNumber'],
+                from_log=True,
+            )
+        return len(log_entries)
+
+    def _evict_revoked_logs(self, removed_logs):
+        revoked_keys = set(
+            (log_entry['header'].shard_id, log_entry['header'].hash)
+            for log_entry in parse_collation_added_logs(removed_logs)
+        )
+        # the block adding a header read by the getters is unknown, so the entry is evicted
+        # if it can be in the revoked blocks
+        min_revoked_block_number = min(log['blockNumber'] for log in removed_logs)
+        evicted_keys = tuple(
+            key
+            for key, entry in self._entries.items()
+            if key in revoked_keys or (
+                not entry.from_log and entry.block_number >= min_revoked_block_number
+            )
+        )
+        for key in evicted_keys:
+            del self._entries[key]
+        self.logger.debug("Evicted %d headers revoked by a reorg", len(evicted_keys))
@@ -0,0 +1,209 @@
+import collections
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+import logging
+
+from handler.validity_cache import (
+    INVALID,
+    VALID,
+    memoized_fetch_and_verify_collation,
+    to_validity_status,
+)
+
+
+# the number of ancestors verified ahead of the one being checked, for each candidate head
+DEFAULT_ANCESTOR_LOOKAHEAD = 4
+# the number of candidate heads verified ahead of the one being checked
+DEFAULT_CANDIDATE_LOOKAHEAD = 2
+DEFAULT_MAX_WORKERS = 4
+
+
+class CandidateWalk:
+    """The walk back from a candidate head, through the headers fetched so far
+    """
+
+    def __init__(self, candidate_head):
+        self.candidate_head = candidate_head
+        # from the candidate head to its ancestors
+        self.headers = [candidate_head['header']]
+        # the number of the headers checked valid
+        self.checked_count = 0
+        self.reached_genesis = False
+        # an unchecked header is verified invalid ahead, so no more ancestors are fetched
+        self.is_doomed = False
+
+    @property
+    def unchecked_headers(self):
+        return self.headers[self.checked_count:]
+
+    def is_complete(self, max_depth):
+        if self.checked_count < len(self.headers):
+            return False
+        return self.reached_genesis or (max_depth is not None and self.checked_count > max_depth)
+
+
+class GuessHeadPipeline:
+    """`GUESS_HEAD` of doc.md, verifying the next ancestors of the candidate heads, and the
+    next candidate heads, concurrently in a thread pool, or in `executor` if given, e.g. a
+    process pool shared with other tasks.
+
+    The result is the same as `handler.validity_cache.guess_head`: the first candidate head
+    whose checked ancestors are all valid. The results verified ahead are only recorded in
+    `validity_cache` when the walks reach them, in the order of the candidate heads, so the
+    invalidity of a header out of the depth of a candidate head never spreads to it earlier
+    than in `guess_head`. The verifications not started yet are cancelled once their branch
+    is known invalid
+    """
+
+    logger = logging.getLogger("evm.chain.sharding.GuessHeadPipeline")
+
+    def __init__(self,
+                 get_parent,
+                 fetch_and_verify_collation,
+                 validity_cache,
+                 max_workers=DEFAULT_MAX_WORKERS,
+                 ancestor_lookahead=DEFAULT_ANCESTOR_LOOKAHEAD,
+                 candidate_lookahead=DEFAULT_CANDIDATE_LOOKAHEAD,
+                 executor=None):
+        if not (isinstance(ancestor_lookahead, int) and ancestor_lookahead > 0):
+            raise ValueError('ancestor_lookahead should be provided as positive integer')
+        if not (isinstance(candidate_lookahead, int) and candidate_lookahead >= 0):
+            raise ValueError('candidate_lookahead should be provided as non-negative integer')
+        self.get_parent = get_parent
+        self.fetch_and_verify_collation = fetch_and_verify_collation
+        self.validity_cache = validity_cache
+        self.max_workers = max_workers
+        self.ancestor_lookahead = ancestor_lookahead
+        self.candidate_lookahead = candidate_lookahead
+        self.executor = executor
+
+    def guess_head(self, candidate_heads, max_depth=None):
+        """Return the first candidate head in `candidate_heads` whose ancestors are all valid,
+        up to the genesis or up to `max_depth` ancestors, or None if there is no such one
+        """
+        candidate_heads = iter(candidate_heads)
+        walks = collections.deque()
+        # collation hash -> the future of its verification
+        futures = {}
+        # collation hash -> the validity status verified ahead, not recorded yet
+        results = {}
+        if self.executor is None:
+            executor = ThreadPoolExecutor(self.max_workers)
+        else:
+            executor = self.executor
+        try:
+            while True:
+                while len(walks) <= self.candidate_lookahead:
+                    candidate_head = next(candidate_heads, None)
+                    if candidate_head is None:
+                        break
+                    walks.append(CandidateWalk(candidate_head))
+                if len(walks) == 0:
+                    return None
+                for walk in walks:
+                    self._schedule(walk, executor, futures, results, max_depth)
+                self._collect_done(futures, results)
+                self._doom_invalid_walks(walks, futures, results)
+
+                walk = walks[0]
+                # e.g. the genesis is only found by the last `_schedule`
+                if walk.is_complete(max_depth):
+                    return walk.candidate_head
+                status = self._get_status(walk.headers[walk.checked_count], futures, results)
+                if status == VALID:
+                    walk.checked_count += 1
+                    if walk.is_complete(max_depth):
+                        return walk.candidate_head
+                else:
+                    walks.popleft()
+                    self._cancel_unshared(walk.unchecked_headers, walks, futures)
+        finally:
+            for future in futures.values():
+                future.cancel()
+            if executor is not self.executor:
+                executor.shutdown(wait=False)
+
+    def _schedule(self, walk, executor, futures, results, max_depth):
+        max_header_count = walk.checked_count + self.ancestor_lookahead
+        if max_depth is not None:
+            max_header_count = min(max_header_count, max_depth + 1)
+        if walk.is_doomed and walk.checked_count < len(walk.headers):
+            max_header_count = len(walk.headers)
+        while not walk.reached_genesis and len(walk.headers) < max_header_count:
+            parent = self.get_parent(walk.headers[-1])
+            if parent is None:
+                walk.reached_genesis = True
+            else:
+                walk.headers.append(parent)
+        for header in walk.unchecked_headers:
+            collation_hash = header.hash
+            if collation_hash in futures or collation_hash in results:
+                continue
+            if self.validity_cache.get(collation_hash) in (VALID, INVALID):
+                continue
+            if self.validity_cache.get(header.parent_hash) == INVALID:
+                continue
+            futures[collation_hash] = executor.submit(self.fetch_and_verify_collation, header)
+
+    def _collect_done(self, futures, results):
+        # keep the finished verifications, so the invalidity is known as early as possible
+        for collation_hash, future in tuple(futures.items()):
+            if future.done() and not future.cancelled() and future.exception() is None:
+                del futures[collation_hash]
+                results[collation_hash] = to_validity_status(future.result())
+
+    def _is_known_invalid(self, header, results):
+        collation_hash = header.hash
+        return (
+            results.get(collation_hash) == INVALID or
+            self.validity_cache.get(collation_hash) == INVALID
+        )
+
+    def _doom_invalid_walks(self, walks, futures, results):
+        # the ancestors above a known invalid header are never checked by the walk
+        for walk in tuple(walks)[1:]:
+            if walk.is_doomed:
+                continue
+            for idx in range(walk.checked_count, len(walk.headers)):
+                if self._is_known_invalid(walk.headers[idx], results):
+                    walk.is_doomed = True
+                    dropped_headers = walk.headers[idx + 1:]
+                    if len(dropped_headers) != 0:
+                        del walk.headers[idx + 1:]
+                        walk.reached_genesis = False
+                        self._cancel_unshared(dropped_headers, walks, futures)
+                    break
+
+    def _get_status(self, header, futures, results):
+        """The status of the header by `memoized_fetch_and_verify_collation`, as `guess_head`
+        gets it, with the result verified ahead if there is one
+        """
+        def fetch_and_verify_collation(header):
+            collation_hash = header.hash
+            if collation_hash in results:
+                return results.pop(collation_hash)
+            future = futures.pop(collation_hash, None)
+            # verify it right away, unless it is being verified already
+            if future is None or future.cancel():
+                return self.fetch_and_verify_collation(header)
+            return future.result()
+
+        return memoized_fetch_and_verify_collation(
+            self.validity_cache,
+            header,
+            fetch_and_verify_collation,
+        )
+
+    def _cancel_unshared(self, dropped_headers, walks, futures):
+        needed_hashes = set(
+            header.hash
+            for walk in walks
+            for header in walk.unchecked_headers
+        )
+        for header in dropped_headers:
+            collation_hash = header.hash
+            if collation_hash in needed_hashes or collation_hash not in futures:
+                continue
+            if futures[collation_hash].cancel():
+                del futures[collation_hash]
@@ -0,0 +1,154 @@
+import sqlite3
+
+from contracts.utils.headers import (
+    CollationHeader,
+)
+
+from handler.utils.collation_added_logs import (
+    get_header_bytes,
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS collation_headers (
+    hash BLOB PRIMARY KEY,
+    shard_id INTEGER NOT NULL,
+    parent_hash BLOB NOT NULL,
+    score INTEGER NOT NULL,
+    is_new_head INTEGER NOT NULL,
+    header BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS collation_headers_shard_id_score
+    ON collation_headers (shard_id, score);
+CREATE INDEX IF NOT EXISTS collation_headers_parent_hash
+    ON collation_headers (parent_hash);
+"""
+
+LOG_ENTRY_COLUMNS = "header, is_new_head, score"
+
+
+def row_to_log_entry(row):
+    header_bytes, is_new_head, score = row
+    return {
+        'header': CollationHeader.from_bytes(bytes(header_bytes)),
+        'is_new_head': bool(is_new_head),
+        'score': score,
+    }
+
+
+class CollationHeaderStore:
+    """An on-disk store of the collation headers from logs `CollationAdded`, with their scores,
+    indexed by (shard_id, score), hash and parent_hash. The log entries are the same as
+    `ShardTracker.new_logs`
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(SCHEMA)
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM collation_headers").fetchone()[0]
+
+    def __contains__(self, collation_hash):
+        row = self._connection.execute(
+            "SELECT 1 FROM collation_headers WHERE hash = ?",
+            (collation_hash,),
+        ).fetchone()
+        return row is not None
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_log_entries(self, log_entries):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO collation_headers "
+                "(hash, shard_id, parent_hash, score, is_new_head, header) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        log_entry['header'].hash,
+                        log_entry['header'].shard_id,
+                        log_entry['header'].parent_hash,
+                        log_entry['score'],
+                        int(log_entry['is_new_head']),
+                        get_header_bytes(log_entry['header']),
+                    )
+                    for log_entry in log_entries
+                ),
+            )
+
+    def remove(self, collation_hashes):
+        """Remove the headers, e.g. of the logs revoked by a main chain reorg
+        """
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM collation_headers WHERE hash = ?",
+                ((collation_hash,) for collation_hash in collation_hashes),
+            )
+
+    def get_log_entry(self, collation_hash):
+        """Return the log entry of the header with `collation_hash`, or None if not stored
+        """
+        row = self._connection.execute(
+            "SELECT " + LOG_ENTRY_COLUMNS + " FROM collation_headers WHERE hash = ?",
+            (collation_hash,),
+        ).fetchone()
+        if row is None:
+            return None
+        return row_to_log_entry(row)
+
+    def get_header(self, collation_hash):
+        log_entry = self.get_log_entry(collation_hash)
+        if log_entry is None:
+            return None
+        return log_entry['header']
+
+    def get_parent(self, header):
+        """Return the parent header of `header`, or None if it is not stored, e.g. the genesis
+        """
+        return self.get_header(header.parent_hash)
+
+    def get_children(self, collation_hash):
+        rows = self._connection.execute(
+            "SELECT " + LOG_ENTRY_COLUMNS + " FROM collation_headers WHERE parent_hash = ?",
+            (collation_hash,),
+        ).fetchall()
+        return tuple(row_to_log_entry(row) for row in rows)
+
+    def get_log_entries_by_score(self, shard_id, score):
+        rows = self._connection.execute(
+            "SELECT " + LOG_ENTRY_COLUMNS + " FROM collation_headers "
+            "WHERE shard_id = ? AND score = ?",
+            (shard_id, score),
+        ).fetchall()
+        return tuple(row_to_log_entry(row) for row in rows)
+
+    def get_max_score(self, shard_id):
+        """Return the highest score of the headers of the shard, or None if there is none
+        """
+        return self._connection.execute(
+            "SELECT MAX(score) FROM collation_headers WHERE shard_id = ?",
+            (shard_id,),
+        ).fetchone()[0]
+
+    def iter_log_entries_by_score(self, shard_id, min_score=None):
+        """Iterate over the log entries of the shard in descending order of score, and in
+        arrival order with the same score, as `ShardTracker.iter_candidate_heads` does
+        """
+        if min_score is None:
+            min_score = 0
+        cursor = self._connection.execute(
+            "SELECT " + LOG_ENTRY_COLUMNS + " FROM collation_headers "
+            "WHERE shard_id = ? AND score >= ? ORDER BY score DESC, rowid ASC",
+            (shard_id, min_score),
+        )
+        for row in cursor:
+            yield row_to_log_entry(row)
@@ -1,8 +1,59 @@
+import collections
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+import itertools
 import logging
 
+from eth_utils import (
+    decode_hex,
+    encode_hex,
+    is_bytes,
+    is_same_address,
+    to_dict,
+)
 
-def get_recent_block_hashes(w3, history_size):
-    block = w3.eth.getBlock('latest')
+from handler.checkpoint import (
+    get_checkpoint_block_hashes,
+    get_checkpoint_delivered_logs,
+)
+from handler.utils.block_hash_window import (
+    BlockHashWindow,
+)
+from handler.utils.bloom import (
+    is_filter_in_bloom,
+)
+from handler.utils.header_cache import (
+    BlockHeaderCache,
+)
+from handler.utils.metrics import (
+    NULL_METRICS,
+    timed_operation,
+)
+from handler.utils.web3_utils import (
+    get_blocks,
+    is_eth_tester,
+)
+
+
+# the number of blocks covered by one `getLogs` in `LogHandler.catch_up`
+DEFAULT_CATCH_UP_CHUNK_SIZE = 1000
+# the number of concurrent `getLogs` in `LogHandler.catch_up`
+DEFAULT_CATCH_UP_MAX_WORKERS = 4
+# the topic position the subscriptions are indexed by to route the logs, i.e. the first
+# indexed argument of the event, e.g. the shard id of `CollationAdded`
+ROUTING_TOPIC_INDEX = 1
+
+
+def get_block_getter(w3, header_cache=None):
+    if header_cache is None:
+        return w3.eth.getBlock
+    return header_cache.get_block
+
+
+def get_recent_block_hashes(w3, history_size, header_cache=None, block_identifier='latest'):
+    get_block = get_block_getter(w3, header_cache)
+    block = get_block(block_identifier)
     recent_hashes = []
 
     for _ in range(history_size):
@@ -10,13 +61,50 @@ def get_recent_block_hashes(w3, history_size):
         # break the loop if we hit the genesis block.
         if block['number'] == 0:
             break
-        block = w3.eth.getBlock(block['parentHash'])
+        block = get_block(block['parentHash'])
 
     return tuple(reversed(recent_hashes))
 
 
-def get_canonical_chain(w3, recent_block_hashes, history_size):
-    block = w3.eth.getBlock('latest')
+def is_continuous_chain(blocks):
+    # a block is missing, e.g. not known yet by the node it was fetched from
+    if any(block is None for block in blocks):
+        return False
+    for parent_block, block in zip(blocks, blocks[1:]):
+        if block['parentHash'] != parent_block['hash']:
+            return False
+    return True
+
+
+def get_recent_block_hashes_batched(w3,
+                                    history_size,
+                                    batch_size,
+                                    header_cache=None,
+                                    block_identifier='latest'):
+    """Same as `get_recent_block_hashes`, but fetch the blocks by number with up to
+    `batch_size` requests in flight, and check the `parentHash` links locally
+    """
+    latest_block = get_block_getter(w3, header_cache)(block_identifier)
+    first_block_number = max(0, latest_block['number'] - history_size + 1)
+    block_numbers = range(first_block_number, latest_block['number'])
+    if header_cache is None:
+        blocks = get_blocks(w3, block_numbers, batch_size=batch_size)
+    else:
+        blocks = header_cache.get_blocks(block_numbers, batch_size=batch_size)
+    blocks += (latest_block,)
+    # the chain was reorganized while the blocks were being fetched
+    if not is_continuous_chain(blocks):
+        return get_recent_block_hashes(w3, history_size, header_cache, block_identifier)
+    return tuple(block['hash'] for block in blocks)
+
+
+class NoCommonAncestor(Exception):
+    pass
+
+
+def get_canonical_chain(w3, recent_block_hashes, history_size, header_cache=None):
+    get_block = get_block_getter(w3, header_cache)
+    block = get_block('latest')
 
     new_block_hashes = []
 
@@ -24,9 +112,9 @@ def get_canonical_chain(w3, recent_block_hashes, history_size):
         if block['hash'] in recent_block_hashes:
             break
         new_block_hashes.append(block['hash'])
-        block = w3.eth.getBlock(block['parentHash'])
+        block = get_block(block['parentHash'])
     else:
-        raise Exception('No common ancestor found')
+        raise NoCommonAncestor('No common ancestor found')
 
     first_common_ancestor_idx = recent_block_hashes.index(block['hash'])
 
@@ -38,50 +126,594 @@ def get_canonical_chain(w3, recent_block_hashes, history_size):
     return revoked_hashes, reversed_new_block_hashes
 
 
+def normalize_topic(topic):
+    if is_bytes(topic):
+        return bytes(topic)
+    return decode_hex(topic)
+
+
+def get_topic_alternatives(topic):
+    """The topics accepted at a position of a filter, where an entry can be a list of
+    alternatives, as in `eth_getLogs`
+    """
+    if isinstance(topic, (list, tuple)):
+        return tuple(topic)
+    return (topic,)
+
+
+def normalize_topics_filter(topics):
+    """Normalize the `topics` of a filter once, into None or the set of the normalized
+    alternatives at each position, for `is_log_matching_normalized_filter`
+    """
+    if topics is None:
+        return None
+    return tuple(
+        None if topic is None else frozenset(
+            normalize_topic(alternative)
+            for alternative in get_topic_alternatives(topic)
+        )
+        for topic in topics
+    )
+
+
+def is_log_matching_normalized_filter(log, address, normalized_topics):
+    if address is not None and not is_same_address(log['address'], address):
+        return False
+    if normalized_topics is None:
+        return True
+    log_topics = log['topics']
+    for idx, alternatives in enumerate(normalized_topics):
+        if alternatives is None:
+            continue
+        if idx >= len(log_topics):
+            return False
+        if normalize_topic(log_topics[idx]) not in alternatives:
+            return False
+    return True
+
+
+def is_log_matching_filter(log, address=None, topics=None):
+    return is_log_matching_normalized_filter(log, address, normalize_topics_filter(topics))
+
+
+def filter_logs(logs, address=None, topics=None):
+    normalized_topics = normalize_topics_filter(topics)
+    return tuple(
+        log
+        for log in logs
+        if is_log_matching_normalized_filter(log, address, normalized_topics)
+    )
+
+
+def get_routing_topic(normalized_topics):
+    """Return the topic at `ROUTING_TOPIC_INDEX` of a normalized filter, or None if it is not
+    one topic
+    """
+    if normalized_topics is None or len(normalized_topics) <= ROUTING_TOPIC_INDEX:
+        return None
+    alternatives = normalized_topics[ROUTING_TOPIC_INDEX]
+    if alternatives is None or len(alternatives) != 1:
+        return None
+    routing_topic, = alternatives
+    return routing_topic
+
+
+def group_logs_by_routing_topic(logs):
+    logs_by_routing_topic = collections.OrderedDict()
+    for log in logs:
+        if len(log['topics']) > ROUTING_TOPIC_INDEX:
+            routing_topic = normalize_topic(log['topics'][ROUTING_TOPIC_INDEX])
+            logs_by_routing_topic.setdefault(routing_topic, []).append(log)
+    return logs_by_routing_topic
+
+
+def merge_topics(topics_at_idx):
+    """Merge the entries of the filters at one topic position, into the alternatives of all of
+    them, or None if any of them is unconstrained
+    """
+    if any(topic is None for topic in topics_at_idx):
+        return None
+    # normalized topic -> the topic as given
+    alternatives = collections.OrderedDict()
+    for topic in topics_at_idx:
+        for alternative in get_topic_alternatives(topic):
+            alternatives.setdefault(normalize_topic(alternative), alternative)
+    if len(alternatives) == 1:
+        merged_topic, = alternatives.values()
+        return merged_topic
+    return list(alternatives.values())
+
+
+def merge_log_filters(log_filters):
+    """Merge `(address, topics)` filters into one filter matching every log matched by any of
+    them. A topic position constrained by all the filters accepts the topics of any of them, a
+    field or topic position left out by any of them is left unconstrained, and logs are routed
+    to each filter locally
+    """
+    log_filters = tuple(log_filters)
+    if len(log_filters) == 0:
+        return None, None
+
+    first_address = log_filters[0][0]
+    if first_address is not None and all(
+            address is not None and is_same_address(address, first_address)
+            for address, _ in log_filters):
+        merged_address = first_address
+    else:
+        merged_address = None
+
+    if any(topics is None for _, topics in log_filters):
+        return merged_address, None
+    merged_topics = [
+        merge_topics(tuple(
+            topics[idx] if idx < len(topics) else None
+            for _, topics in log_filters
+        ))
+        for idx in range(max(len(topics) for _, topics in log_filters))
+    ]
+    # trailing unconstrained positions are redundant
+    while len(merged_topics) != 0 and merged_topics[-1] is None:
+        merged_topics.pop()
+    if len(merged_topics) == 0:
+        return merged_address, None
+    return merged_address, merged_topics
+
+
+def expand_topic_alternatives(topics):
+    """The filters without alternatives, matching the same logs as `topics` together
+    """
+    return [
+        [encode_hex(topic) if is_bytes(topic) else topic for topic in flat_topics]
+        for flat_topics in itertools.product(*map(get_topic_alternatives, topics))
+    ]
+
+
+@to_dict
+def make_log_filter_params(from_block,
+                           to_block,
+                           address=None,
+                           topics=None,
+                           expands_alternatives=False):
+    """The params of `getLogs`. With `expands_alternatives`, the topic alternatives are given as
+    a list of filters without alternatives, as eth-tester takes them, instead of per position
+    """
+    yield 'fromBlock', from_block
+    yield 'toBlock', to_block
+    # leave out the unconstrained fields, not all web3 versions accept `None` for them
+    if address is not None:
+        yield 'address', address
+    if topics is not None:
+        if expands_alternatives and any(isinstance(topic, (list, tuple)) for topic in topics):
+            yield 'topics', expand_topic_alternatives(topics)
+        else:
+            yield 'topics', topics
+
+
+def split_block_range(from_block, to_block, chunk_size):
+    """Split the block range `from_block..to_block` (inclusive) into ranges of at most
+    `chunk_size` blocks
+    """
+    if not (isinstance(chunk_size, int) and chunk_size > 0):
+        raise ValueError('chunk_size should be provided as positive integer')
+    return tuple(
+        (chunk_start, min(chunk_start + chunk_size - 1, to_block))
+        for chunk_start in range(from_block, to_block + 1, chunk_size)
+    )
+
+
+def group_block_ranges(block_numbers):
+    """Group the ascending `block_numbers` into ranges of consecutive numbers
+    """
+    block_ranges = []
+    for block_number in block_numbers:
+        if len(block_ranges) != 0 and block_ranges[-1][1] + 1 == block_number:
+            block_ranges[-1] = (block_ranges[-1][0], block_number)
+        else:
+            block_ranges.append((block_number, block_number))
+    return tuple(block_ranges)
+
+
+def get_log_identifier(log):
+    return log['blockHash'], log['logIndex']
+
+
+def merge_log_deltas(log_deltas):
+    """Merge consecutive `(removed_logs, added_logs)` deltas into one. The logs added and then
+    revoked in between are dropped from both sides
+    """
+    removed_logs, added_logs = [], []
+    for delta_removed_logs, delta_added_logs in log_deltas:
+        if len(delta_removed_logs) != 0:
+            revoked_log_ids = set(get_log_identifier(log) for log in delta_removed_logs)
+            added_log_ids = set(get_log_identifier(log) for log in added_logs)
+            added_logs = [
+                log
+                for log in added_logs
+                if get_log_identifier(log) not in revoked_log_ids
+            ]
+            removed_logs.extend(
+                log
+                for log in delta_removed_logs
+                if get_log_identifier(log) not in added_log_ids
+            )
+        added_logs.extend(delta_added_logs)
+    return tuple(removed_logs), tuple(added_logs)
+
+
+class LogSubscription:
+    """Logs matching `address` and `topics`, routed to the subscriber by a shared `LogHandler`
+    """
+
+    def __init__(self, log_handler, address=None, topics=None):
+        self.log_handler = log_handler
+        self.address = address
+        self.topics = topics
+        self.normalized_topics = normalize_topics_filter(topics)
+        self.routing_topic = get_routing_topic(self.normalized_topics)
+        self.removed_logs = tuple()
+        self.added_logs = tuple()
+
+    def _filter_logs(self, logs):
+        return tuple(
+            log
+            for log in logs
+            if is_log_matching_normalized_filter(log, self.address, self.normalized_topics)
+        )
+
+    def push_log_delta(self, removed_logs, added_logs):
+        self.removed_logs, self.added_logs = merge_log_deltas((
+            (self.removed_logs, self.added_logs),
+            (self._filter_logs(removed_logs), self._filter_logs(added_logs)),
+        ))
+
+    def pop_log_delta(self):
+        """Return `(removed_logs, added_logs)` routed to this subscription since the last call
+        """
+        removed_logs, added_logs = self.removed_logs, self.added_logs
+        self.removed_logs, self.added_logs = tuple(), tuple()
+        return removed_logs, added_logs
+
+    def get_log_delta(self):
+        """Same as `pop_log_delta`, but poll the `LogHandler` first if nothing is routed yet
+        """
+        if len(self.removed_logs) == 0 and len(self.added_logs) == 0:
+            self.log_handler.poll()
+        return self.pop_log_delta()
+
+    def get_new_logs(self):
+        _, added_logs = self.get_log_delta()
+        return added_logs
+
+
 class LogHandler:
 
     logger = logging.getLogger("evm.chain.sharding.LogHandler")
 
-    def __init__(self, w3, history_size=256):
+    metrics = NULL_METRICS
+
+    def __init__(self,
+                 w3,
+                 history_size=256,
+                 bootstrap_batch_size=None,
+                 recent_block_hashes=None,
+                 header_cache=None,
+                 bloom_filter=False,
+                 metrics=None,
+                 delivered_logs=None,
+                 last_block_number=None,
+                 caught_up_block_number=None):
         self.history_size = history_size
         self.w3 = w3
+        self.bootstrap_batch_size = bootstrap_batch_size
+        # test `logsBloom` of the new blocks locally, and skip `getLogs` on those can not match
+        self.bloom_filter = bloom_filter
+        # eth-tester takes the alternatives of the topics as a list of whole filters
+        self.expands_topic_alternatives = is_eth_tester(w3)
+        # the cache can be shared by several `LogHandler`s of the same chain
+        if header_cache is None:
+            header_cache = BlockHeaderCache(w3, max_size=2 * history_size)
+        self.header_cache = header_cache
+        if metrics is not None:
+            self.metrics = metrics
+        # the logs in the blocks revoked while the handler was down, removed by the next delta
+        self.resumed_removed_logs = tuple()
+        # the last block whose logs are all yielded by a `catch_up` stopped part-way, where
+        # the next `catch_up` resumes from
+        self.caught_up_block_number = caught_up_block_number
+        if recent_block_hashes:
+            self._resume_recent_block_hashes(
+                recent_block_hashes,
+                delivered_logs,
+                last_block_number,
+            )
+        else:
+            self._reset_recent_block_hashes()
+        self.subscriptions = []
+        # routing topic -> the subscriptions with it, to route the logs without matching them
+        # against every subscription
+        self._subscriptions_by_routing_topic = {}
+        # the subscriptions without a routing topic, which take all the logs
+        self._unrouted_subscriptions = []
+
+    @property
+    def recent_block_hashes(self):
+        """The hashes of the recent blocks, from the oldest to the newest
+        """
+        return tuple(self._block_hash_window)
+
+    @classmethod
+    def from_checkpoint(cls, w3, checkpoint, **kwargs):
+        """Create a `LogHandler` resuming from a checkpoint made by `handler.checkpoint`
+        """
+        return cls(
+            w3,
+            recent_block_hashes=get_checkpoint_block_hashes(checkpoint),
+            delivered_logs=get_checkpoint_delivered_logs(checkpoint),
+            last_block_number=checkpoint['last_block_number'],
+            caught_up_block_number=checkpoint.get('caught_up_block_number'),
+            **kwargs
+        )
+
+    def _resume_recent_block_hashes(self,
+                                    recent_block_hashes,
+                                    delivered_logs=None,
+                                    last_block_number=None):
+        self._block_hash_window = BlockHashWindow(self.history_size, recent_block_hashes)
+        if delivered_logs is None:
+            delivered_logs = {}
+        self.delivered_logs = {
+            block_hash: list(logs)
+            for block_hash, logs in delivered_logs.items()
+            if block_hash in self._block_hash_window
+        }
+        # drop the newest hashes not in the canonical chain anymore, e.g. revoked by a reorg
+        # while the handler was down, comparing them with the canonical hashes by number. The
+        # hashes in the window are of consecutive blocks. A reorg below the canonical ones is
+        # handled by `get_canonical_chain`
+        revoked_hashes = []
+        while len(self._block_hash_window) != 0:
+            tip_hash = self._block_hash_window[-1]
+            if last_block_number is None:
+                tip = self.header_cache.get_block(tip_hash)
+                if tip is not None:
+                    last_block_number = tip['number']
+            if last_block_number is not None:
+                canonical_block = self.header_cache.get_block(last_block_number)
+                if canonical_block is not None and canonical_block['hash'] == tip_hash:
+                    break
+                last_block_number -= 1
+            revoked_hashes.append(tip_hash)
+            self._block_hash_window.truncate(len(self._block_hash_window) - 1)
+        self.resumed_removed_logs = tuple(
+            log
+            for block_hash in revoked_hashes
+            for log in self.delivered_logs.pop(block_hash, ())
+        )
+        if len(self._block_hash_window) == 0:
+            self._reset_recent_block_hashes()
+
+    def _reset_recent_block_hashes(self, block_identifier='latest'):
+        if self.bootstrap_batch_size is None:
+            recent_block_hashes = get_recent_block_hashes(
+                self.w3,
+                self.history_size,
+                self.header_cache,
+                block_identifier,
+            )
+        else:
+            recent_block_hashes = get_recent_block_hashes_batched(
+                self.w3,
+                self.history_size,
+                self.bootstrap_batch_size,
+                self.header_cache,
+                block_identifier,
+            )
         # ----------> higher score
-        self.recent_block_hashes = get_recent_block_hashes(w3, history_size)
+        self._block_hash_window = BlockHashWindow(self.history_size, recent_block_hashes)
+        # block hash -> logs delivered in the block, kept to revoke them on reorgs
+        self.delivered_logs = {}
 
-    def get_new_logs(self, address=None, topics=None):
-        # TODO: should see if we need to do something with revoked_hashes
-        #       it seems reasonable to revoke logs in the blocks with hashes in `revoked_hashes`
+    def subscribe(self, address=None, topics=None):
+        """Subscribe to the logs matching `address` and `topics`. All the subscriptions share
+        the canonical chain tracking and one `getLogs` per block range
+        """
+        subscription = LogSubscription(self, address=address, topics=topics)
+        self.subscriptions.append(subscription)
+        if subscription.routing_topic is None:
+            self._unrouted_subscriptions.append(subscription)
+        else:
+            self._subscriptions_by_routing_topic.setdefault(
+                subscription.routing_topic,
+                [],
+            ).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.remove(subscription)
+        if subscription.routing_topic is None:
+            self._unrouted_subscriptions.remove(subscription)
+        else:
+            routed_subscriptions = self._subscriptions_by_routing_topic[subscription.routing_topic]
+            routed_subscriptions.remove(subscription)
+            if len(routed_subscriptions) == 0:
+                del self._subscriptions_by_routing_topic[subscription.routing_topic]
+
+    def _route_log_delta(self, removed_logs, added_logs):
+        for subscription in self._unrouted_subscriptions:
+            subscription.push_log_delta(removed_logs, added_logs)
+        if len(self._subscriptions_by_routing_topic) == 0:
+            return
+        removed_logs_by_routing_topic = group_logs_by_routing_topic(removed_logs)
+        added_logs_by_routing_topic = group_logs_by_routing_topic(added_logs)
+        routing_topics = set(removed_logs_by_routing_topic) | set(added_logs_by_routing_topic)
+        for routing_topic in routing_topics:
+            for subscription in self._subscriptions_by_routing_topic.get(routing_topic, ()):
+                subscription.push_log_delta(
+                    removed_logs_by_routing_topic.get(routing_topic, ()),
+                    added_logs_by_routing_topic.get(routing_topic, ()),
+                )
+
+    @timed_operation('poll')
+    def poll(self):
+        """Fetch the log delta of all subscriptions, and route it to them
+        """
+        self.get_log_delta(*merge_log_filters(
+            (subscription.address, subscription.topics)
+            for subscription in self.subscriptions
+        ))
+
+    @timed_operation('get_log_delta')
+    def get_log_delta(self, address=None, topics=None):
+        """Update the canonical chain, and return `(removed_logs, added_logs)`, where
+        `removed_logs` are the logs delivered before in the blocks revoked by a reorg,
+        and `added_logs` are the logs in the new canonical blocks
+        """
+        if len(self.subscriptions) == 0:
+            return self._get_log_delta(address, topics)
+        # fetch the logs of the subscriptions together, since the chain is only tracked once
+        removed_logs, added_logs = self._get_log_delta(
+            *self._merge_with_subscription_filters(address, topics)
+        )
+        self._route_log_delta(removed_logs, added_logs)
+        return filter_logs(removed_logs, address, topics), filter_logs(added_logs, address, topics)
+
+    def _merge_with_subscription_filters(self, address, topics):
+        return merge_log_filters(
+            ((address, topics),) + tuple(
+                (subscription.address, subscription.topics)
+                for subscription in self.subscriptions
+            )
+        )
+
+    def _get_log_delta(self, address, topics):
         revoked_hashes, new_block_hashes = get_canonical_chain(
             self.w3,
-            self.recent_block_hashes,
+            self._block_hash_window,
             self.history_size,
+            self.header_cache,
         )
-        # determine `unchanged_block_hashes` by revoked_hashes
-        # Note: use if/else to avoid self.recent_block_hashes[:-1 * 0]
-        #       when len(revoked_hashes) == 0
-        if len(revoked_hashes) != 0:
-            unchanged_block_hashes = self.recent_block_hashes[:-1 * len(revoked_hashes)]
-        else:
-            unchanged_block_hashes = self.recent_block_hashes
-        # append new blocks to `unchanged_hashes`, and move revoked ones out of
-        # `self.recent_block_hashes`
-        new_recent_block_hashes = unchanged_block_hashes + new_block_hashes
-        # keep len(self.recent_block_hashes) <= self.history_size
-        self.recent_block_hashes = new_recent_block_hashes[-1 * self.history_size:]
+        # move revoked blocks out of `self._block_hash_window`, and append the new ones.
+        # `self._block_hash_window` evicts the oldest hashes to keep its size <= history_size
+        self._block_hash_window.truncate(len(self._block_hash_window) - len(revoked_hashes))
+        evicted_hashes = self._block_hash_window.extend(new_block_hashes)
+
+        removed_logs = self.resumed_removed_logs + tuple(
+            log
+            for block_hash in revoked_hashes
+            for log in self.delivered_logs.pop(block_hash, ())
+        )
+        self.resumed_removed_logs = tuple()
+        # logs in the blocks out of the window can not be revoked anymore
+        for block_hash in evicted_hashes:
+            self.delivered_logs.pop(block_hash, None)
 
         if len(new_block_hashes) == 0:
-            return tuple()
-
-        from_block_hash = new_block_hashes[0]
-        to_block_hash = new_block_hashes[-1]
-        from_block_number = self.w3.eth.getBlock(from_block_hash)['number']
-        to_block_number = self.w3.eth.getBlock(to_block_hash)['number']
-
-        return self.w3.eth.getLogs(
-            {
-                'fromBlock': from_block_number,
-                'toBlock': to_block_number,
-                'address': address,
-                'topics': topics,
-            }
+            return removed_logs, tuple()
+
+        if self.bloom_filter:
+            # only query the blocks which can have the logs, by the headers just fetched
+            block_ranges = group_block_ranges(
+                header['number']
+                for header in map(self.header_cache.get_block, new_block_hashes)
+                if is_filter_in_bloom(header['logsBloom'], address, topics)
+            )
+        else:
+            from_block_hash = new_block_hashes[0]
+            to_block_hash = new_block_hashes[-1]
+            block_ranges = (
+                (
+                    self.header_cache.get_block(from_block_hash)['number'],
+                    self.header_cache.get_block(to_block_hash)['number'],
+                ),
+            )
+
+        added_logs = tuple(
+            log
+            for from_block_number, to_block_number in block_ranges
+            for log in self.w3.eth.getLogs(make_log_filter_params(
+                from_block_number,
+                to_block_number,
+                address,
+                topics,
+                self.expands_topic_alternatives,
+            ))
         )
+        for log in added_logs:
+            if log['blockHash'] in self._block_hash_window:
+                self.delivered_logs.setdefault(log['blockHash'], []).append(log)
+
+        return removed_logs, added_logs
+
+    @timed_operation('get_new_logs')
+    def get_new_logs(self, address=None, topics=None):
+        _, added_logs = self.get_log_delta(address=address, topics=topics)
+        return added_logs
+
+    def catch_up(self,
+                 from_block=None,
+                 address=None,
+                 topics=None,
+                 chunk_size=DEFAULT_CATCH_UP_CHUNK_SIZE,
+                 max_workers=DEFAULT_CATCH_UP_MAX_WORKERS):
+        """Yield the logs from `from_block` to the head in order, e.g. after `get_log_delta`
+        raises `NoCommonAncestor` because the gap is larger than `history_size`. By default,
+        continue from the last block processed, i.e. `caught_up_block_number` or the newest
+        block in the window.
+
+        The gap is split into ranges of at most `chunk_size` blocks, which are fetched by up to
+        `max_workers` concurrent `getLogs`. Only once the last chunk is yielded, the window of
+        recent blocks restarts from the block caught up to, so the next `get_log_delta`
+        continues from there. If the caller stops part-way, the window is left as it is, and
+        `caught_up_block_number` is the last block of the chunks yielded in full
+        """
+        if from_block is None:
+            from_block = self.get_last_block_number() + 1
+        to_block_header = self.header_cache.get_block('latest')
+        to_block = to_block_header['number']
+        merged_address, merged_topics = self._merge_with_subscription_filters(address, topics)
+        block_ranges = iter(split_block_range(from_block, to_block, chunk_size))
+        # the logs which can be in the window once it restarts, kept to revoke them on reorgs
+        recent_logs = []
+
+        def get_logs(block_range):
+            return block_range, self.w3.eth.getLogs(make_log_filter_params(
+                block_range[0],
+                block_range[1],
+                merged_address,
+                merged_topics,
+                self.expands_topic_alternatives,
+            ))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # keep a bounded number of chunks in flight, and consume them in order
+            pending_chunks = collections.deque(
+                executor.submit(get_logs, block_range)
+                for block_range in itertools.islice(block_ranges, 2 * max_workers)
+            )
+            while len(pending_chunks) != 0:
+                block_range, chunk_logs = pending_chunks.popleft().result()
+                chunk_logs = tuple(chunk_logs)
+                for block_range_to_fetch in itertools.islice(block_ranges, 1):
+                    pending_chunks.append(executor.submit(get_logs, block_range_to_fetch))
+                recent_logs.extend(
+                    log
+                    for log in chunk_logs
+                    if log['blockNumber'] > to_block - self.history_size
+                )
+                self._route_log_delta(tuple(), chunk_logs)
+                for log in filter_logs(chunk_logs, address, topics):
+                    yield log
+                self.caught_up_block_number = block_range[1]
+
+        self._reset_recent_block_hashes(to_block_header['hash'])
+        for log in recent_logs:
+            if log['blockHash'] in self._block_hash_window:
+                self.delivered_logs.setdefault(log['blockHash'], []).append(log)
+        self.caught_up_block_number = None
+
+    def get_last_block_number(self):
+        """Return the number of the last block whose logs are delivered
+        """
+        if self.caught_up_block_number is not None:
+            return self.caught_up_block_number
+        return self.header_cache.get_block(self._block_hash_window[-1])['number']
@@ -0,0 +1,134 @@
+import logging
+
+from eth_utils import (
+    big_endian_to_int,
+    encode_hex,
+)
+
+from handler.log_handler import (
+    LogSubscription,
+    normalize_topic,
+)
+from handler.shard_tracker import (
+    COLLATION_ADDED_TOPIC,
+    NoCandidateHead,
+    NextLogUnavailable,
+    ShardTracker,
+)
+
+
+def get_log_shard_id(log):
+    # `shard_id` is the first indexed entry, hence the second entry in topics
+    return big_endian_to_int(normalize_topic(log['topics'][1]))
+
+
+def group_logs_by_shard_id(logs):
+    logs_by_shard_id = {}
+    for log in logs:
+        logs_by_shard_id.setdefault(get_log_shard_id(log), []).append(log)
+    return logs_by_shard_id
+
+
+class MultiShardTracker:
+    """Track logs `CollationAdded` of all shards with a single filter, leaving the shard id
+    topic unconstrained. The logs are routed to a `ShardTracker` per shard, created when the
+    shard has its first log, so the memory is proportional to the active shards only
+    """
+
+    logger = logging.getLogger("evm.chain.sharding.MultiShardTracker")
+
+    def __init__(self, log_handler, smc_handler_address, metrics=None, header_store=None):
+        self.log_handler = log_handler
+        self.smc_handler_address = smc_handler_address
+        self.metrics = metrics
+        self.header_store = header_store
+        self.log_subscription = log_handler.subscribe(
+            address=self.smc_handler_address,
+            topics=[encode_hex(COLLATION_ADDED_TOPIC)],
+        )
+        # shard id -> ShardTracker
+        self.shard_trackers = {}
+        # shard id -> the subscription of the `ShardTracker` of the shard
+        self.shard_subscriptions = {}
+
+    def close(self):
+        """Stop routing the logs to the trackers of all shards
+        """
+        for shard_tracker in tuple(self.shard_trackers.values()):
+            shard_tracker.close()
+        self.shard_trackers = {}
+        self.log_handler.unsubscribe(self.log_subscription)
+
+    #
+    # Log source of the `ShardTracker`s
+    #
+    def subscribe(self, address=None, topics=None):
+        shard_id = big_endian_to_int(normalize_topic(topics[1]))
+        subscription = LogSubscription(self, address=address, topics=topics)
+        self.shard_subscriptions[shard_id] = subscription
+        return subscription
+
+    def unsubscribe(self, subscription):
+        shard_id = big_endian_to_int(normalize_topic(subscription.topics[1]))
+        del self.shard_subscriptions[shard_id]
+
+    def poll(self):
+        """Fetch the logs of all shards at once, and route them to the tracker of each shard
+        """
+        removed_logs, added_logs = self.log_subscription.get_log_delta()
+        removed_logs_by_shard_id = group_logs_by_shard_id(removed_logs)
+        added_logs_by_shard_id = group_logs_by_shard_id(added_logs)
+        for shard_id in added_logs_by_shard_id:
+            if shard_id not in self.shard_trackers:
+                self._create_shard_tracker(shard_id)
+        for shard_id in set(removed_logs_by_shard_id) | set(added_logs_by_shard_id):
+            subscription = self.shard_subscriptions.get(shard_id)
+            if subscription is not None:
+                subscription.push_log_delta(
+                    removed_logs_by_shard_id.get(shard_id, ()),
+                    added_logs_by_shard_id.get(shard_id, ()),
+                )
+
+    def _create_shard_tracker(self, shard_id):
+        self.logger.debug("Tracking the logs of shard %s", shard_id)
+        shard_tracker = ShardTracker(
+            shard_id,
+            self,
+            self.smc_handler_address,
+            metrics=self.metrics,
+            header_store=self.header_store,
+        )
+        self.shard_trackers[shard_id] = shard_tracker
+        return shard_tracker
+
+    #
+    # Per shard access
+    #
+    @property
+    def active_shard_ids(self):
+        return tuple(sorted(self.shard_trackers))
+
+    def get_shard_tracker(self, shard_id):
+        """Return the `ShardTracker` of the shard, or None if the shard has no log yet
+        """
+        if shard_id not in self.shard_trackers:
+            self.poll()
+        return self.shard_trackers.get(shard_id)
+
+    def get_next_log(self, shard_id):
+        shard_tracker = self.get_shard_tracker(shard_id)
+        if shard_tracker is None:
+            raise NextLogUnavailable("No more next logs")
+        return shard_tracker.get_next_log()
+
+    def iter_candidate_heads(self, shard_id):
+        shard_tracker = self.get_shard_tracker(shard_id)
+        if shard_tracker is None:
+            return iter(())
+        return shard_tracker.iter_candidate_heads()
+
+    def fetch_candidate_head(self, shard_id):
+        shard_tracker = self.get_shard_tracker(shard_id)
+        if shard_tracker is None:
+            raise NoCandidateHead("No candidate head available")
+        return shard_tracker.fetch_candidate_head()
@@ -0,0 +1,224 @@
+import collections
+
+from eth_utils import (
+    big_endian_to_int,
+    decode_hex,
+    encode_hex,
+    event_signature_to_log_topic,
+    to_canonical_address,
+)
+
+from handler.log_handler import (
+    get_log_identifier,
+    normalize_topic,
+)
+
+
+# Events:
+#   RegisterNotary(int128 index_in_notary_pool, address notary)
+#   DeregisterNotary(int128 index_in_notary_pool, address notary, int128 deregistered_period)
+#   ReleaseNotary(int128 index_in_notary_pool, address notary)
+REGISTER_NOTARY_TOPIC = event_signature_to_log_topic("RegisterNotary(int128,address)")
+DEREGISTER_NOTARY_TOPIC = event_signature_to_log_topic("DeregisterNotary(int128,address,int128)")
+RELEASE_NOTARY_TOPIC = event_signature_to_log_topic("ReleaseNotary(int128,address)")
+
+NOTARY_EVENT_TOPICS = (
+    REGISTER_NOTARY_TOPIC,
+    DEREGISTER_NOTARY_TOPIC,
+    RELEASE_NOTARY_TOPIC,
+)
+
+
+def parse_notary_log(log):
+    """Return `(topic, pool_index, notary, deregistered_period)` of a notary event log, with
+    `deregistered_period` None except for `DeregisterNotary`
+    """
+    topic = normalize_topic(log['topics'][0])
+    data_bytes = decode_hex(log['data'])
+    pool_index = big_endian_to_int(data_bytes[:32])
+    notary = to_canonical_address(data_bytes[44:64])
+    if topic == DEREGISTER_NOTARY_TOPIC:
+        deregistered_period = big_endian_to_int(data_bytes[64:96])
+    else:
+        deregistered_period = None
+    return topic, pool_index, notary, deregistered_period
+
+
+def get_log_sort_key(log):
+    return log['blockNumber'], log['logIndex']
+
+
+NotaryRecord = collections.namedtuple('NotaryRecord', ['deregistered', 'pool_index'])
+
+
+class NotaryPoolMirror:
+    """A local copy of `notary_pool`, `empty_slots_stack` and `notary_registry` of the
+    contract, replayed from the logs `RegisterNotary`, `DeregisterNotary` and `ReleaseNotary`
+    routed by `log_handler`, so the pool is read without any `eth_call`.
+
+    The mirror only knows the events after `log_handler` starts, use `LogHandler.catch_up`
+    from the block the contract is deployed to replay the earlier ones. The events revoked by
+    a main chain reorg are undone, from the latest one
+    """
+
+    def __init__(self, log_handler, smc_handler_address, config):
+        self.log_handler = log_handler
+        self.smc_handler_address = smc_handler_address
+        self.config = config
+        # any of the notary events, as the alternatives of the first topic
+        self.log_subscription = log_handler.subscribe(
+            address=self.smc_handler_address,
+            topics=[[encode_hex(topic) for topic in NOTARY_EVENT_TOPICS]],
+        )
+        # the notary address in each pool slot, or None for an empty slot
+        self._slots = []
+        self._empty_slots_stack = []
+        self._notary_pool_len = 0
+        # canonical notary address -> NotaryRecord
+        self._notary_registry = {}
+        # the applied events with what is needed to undo them, from the oldest to the latest,
+        # only those can still be revoked by a reorg are kept
+        self._journal = collections.deque()
+
+    def close(self):
+        """Stop routing the logs to the mirror, e.g. when it is discarded
+        """
+        self.log_handler.unsubscribe(self.log_subscription)
+
+    #
+    # Replaying the events
+    #
+    def poll(self):
+        """Apply the new notary events, and undo the revoked ones. Return the number of the
+        applied events
+        """
+        return self._process_log_delta(*self.log_subscription.get_log_delta())
+
+    def _process_log_delta(self, removed_logs, added_logs):
+        if len(removed_logs) != 0:
+            self._undo_revoked_logs(removed_logs)
+        notary_logs = sorted(added_logs, key=get_log_sort_key)
+        for log in notary_logs:
+            self._apply_log(log)
+        if len(notary_logs) != 0:
+            self._prune_journal(notary_logs[-1]['blockNumber'])
+        return len(notary_logs)
+
+    def _apply_log(self, log):
+        topic, pool_index, notary, deregistered_period = parse_notary_log(log)
+        if topic == REGISTER_NOTARY_TOPIC:
+            undo_payload = self._register_notary(pool_index, notary)
+        elif topic == DEREGISTER_NOTARY_TOPIC:
+            undo_payload = self._deregister_notary(pool_index, notary, deregistered_period)
+        else:
+            undo_payload = self._release_notary(notary)
+        self._journal.append((get_log_identifier(log), log['blockNumber'], topic, undo_payload))
+
+    def _register_notary(self, pool_index, notary):
+        if pool_index < len(self._slots):
+            # the contract reuses the slot on the top of the empty slots stack
+            is_reused_slot = True
+            self._empty_slots_stack.pop()
+        else:
+            is_reused_slot = False
+            self._slots.append(None)
+        self._slots[pool_index] = notary
+        self._notary_pool_len += 1
+        self._notary_registry[notary] = NotaryRecord(deregistered=0, pool_index=pool_index)
+        return pool_index, notary, is_reused_slot
+
+    def _deregister_notary(self, pool_index, notary, deregistered_period):
+        self._empty_slots_stack.append(pool_index)
+        self._slots[pool_index] = None
+        self._notary_pool_len -= 1
+        self._notary_registry[notary] = NotaryRecord(
+            deregistered=deregistered_period,
+            pool_index=pool_index,
+        )
+        return pool_index, notary
+
+    def _release_notary(self, notary):
+        return notary, self._notary_registry.pop(notary)
+
+    def _undo_revoked_logs(self, removed_logs):
+        revoked_log_ids = set(get_log_identifier(log) for log in removed_logs)
+        # the revoked events are the latest ones, since a reorg revokes the latest blocks
+        while len(self._journal) != 0 and self._journal[-1][0] in revoked_log_ids:
+            _, _, topic, undo_payload = self._journal.pop()
+            if topic == REGISTER_NOTARY_TOPIC:
+                pool_index, notary, is_reused_slot = undo_payload
+                self._slots[pool_index] = None
+                if is_reused_slot:
+                    self._empty_slots_stack.append(pool_index)
+                else:
+                    self._slots.pop()
+                self._notary_pool_len -= 1
+                del self._notary_registry[notary]
+            elif topic == DEREGISTER_NOTARY_TOPIC:
+                pool_index, notary = undo_payload
+                self._empty_slots_stack.pop()
+                self._slots[pool_index] = notary
+                self._notary_pool_len += 1
+                self._notary_registry[notary] = NotaryRecord(deregistered=0, pool_index=pool_index)
+            else:
+                notary, notary_record = undo_payload
+                self._notary_registry[notary] = notary_record
+
+    def _prune_journal(self, latest_block_number):
+        # the blocks out of the window of `log_handler` can not be revoked anymore
+        min_block_number = latest_block_number - self.log_handler.history_size
+        while len(self._journal) != 0 and self._journal[0][1] <= min_block_number:
+            self._journal.popleft()
+
+    #
+    # Queries
+    #
+    @property
+    def notary_pool(self):
+        """The notary addresses in all the pool slots, with None for the empty slots, e.g. for
+        `ProposerOracle.get_schedule`
+        """
+        return tuple(self._slots)
+
+    @property
+    def notary_pool_len(self):
+        return self._notary_pool_len
+
+    @property
+    def empty_slots_stack_top(self):
+        return len(self._empty_slots_stack)
+
+    @property
+    def slot_count(self):
+        return len(self._slots)
+
+    def does_notary_exist(self, notary):
+        return to_canonical_address(notary) in self._notary_registry
+
+    def get_notary_record(self, notary):
+        """Return the `NotaryRecord` of the notary, or None if it is not registered
+        """
+        return self._notary_registry.get(to_canonical_address(notary))
+
+    def get_notary_index(self, notary):
+        """Return the pool index of the notary, or None if it is not in the pool
+        """
+        notary_record = self.get_notary_record(notary)
+        if notary_record is None or notary_record.deregistered != 0:
+            return None
+        return notary_record.pool_index
+
+    def get_release_period(self, notary):
+        """Return the first period the notary can release its deposit in, or None if it is not
+        deregistered
+        """
+        notary_record = self.get_notary_record(notary)
+        if notary_record is None or notary_record.deregistered == 0:
+            return None
+        return notary_record.deregistered + self.config['NOTARY_LOCKUP_LENGTH'] + 1
+
+    def can_release(self, notary, period):
+        """Whether `release_notary` of the notary passes in `period`, as checked by the contract
+        """
+        release_period = self.get_release_period(notary)
+        return release_period is not None and period >= release_period
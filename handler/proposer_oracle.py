@@ -0,0 +1,105 @@
+from eth_utils import (
+    big_endian_to_int,
+    keccak,
+)
+
+from evm.constants import (
+    ZERO_ADDRESS,
+    ZERO_HASH32,
+)
+
+from handler.utils.web3_utils import (
+    DEFAULT_BATCH_SIZE,
+    get_blocks,
+)
+
+
+# `BLOCKHASH` only returns the hashes of the 256 most recent blocks, and zero otherwise
+BLOCKHASH_WINDOW = 256
+
+
+def get_proposer_index(seed_block_hash, shard_id, pool_size):
+    """The sampling rule of `get_eligible_proposer` in the contract
+    """
+    seed = keccak(seed_block_hash + shard_id.to_bytes(32, byteorder='big'))
+    return big_endian_to_int(seed) % pool_size
+
+
+class ProposerOracle:
+    """Compute the eligible proposers of all shards locally, with the sampling rule of
+    `get_eligible_proposer` in the contract, over a mirror of the notary pool, i.e. the
+    addresses in the pool slots with None for the empty slots.
+
+    The contract samples its `validators` mapping, which is never filled, so its
+    `get_eligible_proposer` always reverts, and no getter of the contract samples the notary
+    pool. The schedule is not equivalent to any on-chain getter, it only follows the same rule
+    """
+
+    def __init__(self, w3, config):
+        self.w3 = w3
+        self.config = config
+
+    def get_seed_block_number(self, period):
+        return (period - self.config['LOOKAHEAD_PERIODS']) * self.config['PERIOD_LENGTH']
+
+    def get_available_periods(self, block_number):
+        """Return the range of the periods whose proposers can be known at `block_number`,
+        from the current period
+        """
+        current_period = block_number // self.config['PERIOD_LENGTH']
+        start_period = max(current_period, self.config['LOOKAHEAD_PERIODS'])
+        # the seed block of the period should be before `block_number`
+        end_period = (
+            (block_number - 1) // self.config['PERIOD_LENGTH'] +
+            self.config['LOOKAHEAD_PERIODS'] + 1
+        )
+        return range(start_period, max(start_period, end_period))
+
+    def _get_seed_block_hashes(self, periods, block_number, batch_size):
+        seed_block_numbers = tuple(map(self.get_seed_block_number, periods))
+        # the transactions sent at `block_number` run in the next block, where `BLOCKHASH` of
+        # the block `BLOCKHASH_WINDOW` blocks before `block_number` is zero already
+        available_block_numbers = tuple(
+            seed_block_number
+            for seed_block_number in seed_block_numbers
+            if block_number - seed_block_number < BLOCKHASH_WINDOW
+        )
+        blocks = get_blocks(self.w3, available_block_numbers, batch_size=batch_size)
+        block_hashes = {
+            block['number']: bytes(block['hash'])
+            for block in blocks
+        }
+        return tuple(
+            block_hashes.get(seed_block_number, ZERO_HASH32)
+            for seed_block_number in seed_block_numbers
+        )
+
+    def get_schedule(self,
+                     notary_pool,
+                     block_number=None,
+                     shard_ids=None,
+                     batch_size=DEFAULT_BATCH_SIZE):
+        """Return `{period: proposers}` for all the periods available at `block_number`, where
+        `proposers[idx]` is the eligible proposer of `shard_ids[idx]`, by default all shards
+        """
+        if block_number is None:
+            block_number = self.w3.eth.blockNumber
+        if shard_ids is None:
+            shard_ids = range(self.config['SHARD_COUNT'])
+        if len(notary_pool) == 0:
+            raise ValueError("The notary pool is empty")
+        # the contract returns the zero address for an empty slot
+        notary_pool = tuple(
+            ZERO_ADDRESS if notary_address is None else notary_address
+            for notary_address in notary_pool
+        )
+        periods = self.get_available_periods(block_number)
+        seed_block_hashes = self._get_seed_block_hashes(periods, block_number, batch_size)
+        pool_size = len(notary_pool)
+        return {
+            period: tuple(
+                notary_pool[get_proposer_index(seed_block_hash, shard_id, pool_size)]
+                for shard_id in shard_ids
+            )
+            for period, seed_block_hash in zip(periods, seed_block_hashes)
+        }
@@ -1,11 +1,9 @@
-from cytoolz import (
-    pipe,
-)
+import heapq
+import itertools
 
 from eth_utils import (
     event_signature_to_log_topic,
     to_dict,
-    to_tuple,
     encode_hex,
     decode_hex,
     big_endian_to_int,
@@ -15,6 +13,18 @@ from contracts.utils.headers import (
     CollationHeader,
 )
 
+from handler.utils.collation_added_logs import (
+    materialize_log_entries,
+    parse_collation_added_logs,
+)
+from handler.utils.metrics import (
+    NULL_METRICS,
+    timed_operation,
+)
+from handler.utils.score_indexed_logs import (
+    ScoreIndexedLogs,
+)
+
 
 class NextLogUnavailable(Exception):
     pass
@@ -46,6 +56,13 @@ def parse_collation_added_log(log):
     yield 'score', score
 
 
+# The changes journaled after `ShardTracker.take_snapshot`, to undo them on restore
+EXTEND_NEW_LOGS = 'extend_new_logs'
+POP_NEW_LOG = 'pop_new_log'
+APPEND_UNCHECKED_LOG = 'append_unchecked_log'
+POP_UNCHECKED_LOG = 'pop_unchecked_log'
+
+
 class ShardTracker:
     """Track logs `CollationAdded` in mainchain
     """
@@ -53,57 +70,177 @@ class ShardTracker:
     current_score = None
     new_logs = None
     unchecked_logs = None
+    metrics = NULL_METRICS
+    # the changes since the snapshot, or None if there is no snapshot
+    _journal = None
+    _snapshot_score = None
 
-    def __init__(self, shard_id, log_handler, smc_handler_address):
-        # TODO: currently set one log_handler for each shard. Should see if there is a better way
-        #       to make one log_handler shared over all shards.
+    def __init__(self,
+                 shard_id,
+                 log_handler,
+                 smc_handler_address,
+                 metrics=None,
+                 header_store=None):
         self.shard_id = shard_id
+        if metrics is not None:
+            self.metrics = metrics
+        # keep the headers of the logs on disk as well, if a `CollationHeaderStore` is given
+        self.header_store = header_store
         self.log_handler = log_handler
         self.smc_handler_address = smc_handler_address
-        self.current_score = None
-        self.new_logs = []
-        self.unchecked_logs = []
-
-    @to_tuple
-    def _get_new_logs(self):
+        # `log_handler` can be shared over the trackers of all shards, it tracks the canonical
+        # chain once and routes the logs to each of them by the shard id topic
         shard_id_topic_hex = encode_hex(self.shard_id.to_bytes(32, byteorder='big'))
-        new_logs = self.log_handler.get_new_logs(
+        self.log_subscription = log_handler.subscribe(
             address=self.smc_handler_address,
             topics=[
                 encode_hex(COLLATION_ADDED_TOPIC),
                 shard_id_topic_hex,
             ],
         )
-        for log in new_logs:
-            yield parse_collation_added_log(log)
+        self.current_score = None
+        self.new_logs = []
+        self.unchecked_logs = ScoreIndexedLogs()
+
+    def close(self):
+        """Stop routing the logs to the tracker, e.g. when it is discarded
+        """
+        self.log_handler.unsubscribe(self.log_subscription)
+
+    def _get_new_logs(self):
+        return self._process_log_delta(*self.log_subscription.get_log_delta())
+
+    def _process_log_delta(self, removed_logs, added_logs):
+        if len(removed_logs) != 0:
+            self._remove_revoked_logs(removed_logs)
+        log_entries = tuple(materialize_log_entries(parse_collation_added_logs(added_logs)))
+        if self.header_store is not None and len(log_entries) != 0:
+            self.header_store.add_log_entries(log_entries)
+        return log_entries
+
+    def _remove_revoked_logs(self, removed_logs):
+        # drop the logs revoked by a main chain reorg, instead of re-scanning all of them
+        revoked_header_hashes = set(
+            log_entry['header'].hash
+            for log_entry in parse_collation_added_logs(removed_logs)
+        )
+        self.new_logs = [
+            log_entry
+            for log_entry in self.new_logs
+            if log_entry['header'].hash not in revoked_header_hashes
+        ]
+        self.unchecked_logs.remove_if(
+            lambda log_entry: log_entry['header'].hash in revoked_header_hashes
+        )
+        if self.header_store is not None:
+            self.header_store.remove(revoked_header_hashes)
+        if self._journal is not None:
+            # the revoked logs should not be brought back by `restore_snapshot`
+            journal = []
+            for operation, payload in self._journal:
+                if operation == EXTEND_NEW_LOGS:
+                    payload = [
+                        log_entry
+                        for log_entry in payload
+                        if log_entry['header'].hash not in revoked_header_hashes
+                    ]
+                elif payload['header'].hash in revoked_header_hashes:
+                    continue
+                journal.append((operation, payload))
+            self._journal = journal
+
+    #
+    # Journaled changes of `new_logs` and `unchecked_logs`
+    #
+    def _extend_new_logs(self, log_entries):
+        self.new_logs.extend(log_entries)
+        if self._journal is not None and len(log_entries) != 0:
+            self._journal.append((EXTEND_NEW_LOGS, list(log_entries)))
+
+    def _pop_new_log(self):
+        log_entry = self.new_logs.pop()
+        if self._journal is not None:
+            self._journal.append((POP_NEW_LOG, log_entry))
+        return log_entry
+
+    def _append_unchecked_log(self, log_entry):
+        self.unchecked_logs.append(log_entry)
+        if self._journal is not None:
+            self._journal.append((APPEND_UNCHECKED_LOG, log_entry))
+
+    def _pop_unchecked_log(self, score):
+        log_entry = self.unchecked_logs.pop_latest(score)
+        if self._journal is not None and log_entry is not None:
+            self._journal.append((POP_UNCHECKED_LOG, log_entry))
+        return log_entry
 
+    #
+    # Snapshot
+    #
+    @property
+    def has_snapshot(self):
+        return self._journal is not None
+
+    def take_snapshot(self):
+        """Save the status of `new_logs`, `unchecked_logs` and `current_score`, e.g. when
+        `GUESS_HEAD` starts. Nothing is copied, the changes afterwards are journaled instead
+        """
+        self._journal = []
+        self._snapshot_score = self.current_score
+
+    def discard_snapshot(self):
+        self._journal = None
+        self._snapshot_score = None
+
+    def restore_snapshot(self):
+        """Restore the status saved by `take_snapshot`, and append the logs fetched since then,
+        including the pending ones, to `new_logs`, so `GUESS_HEAD` can be re-run with them.
+        A new snapshot is taken at the restored status. Return the number of the appended logs
+        """
+        if self._journal is None:
+            raise ValueError("No snapshot to restore")
+        # fetch first, the revoked logs are dropped from the journal as well
+        pending_logs = self._get_new_logs()
+        fetched_logs = []
+        # undo the changes from the latest one, so each of them is undone on the status it
+        # was made on
+        for operation, payload in reversed(self._journal):
+            if operation == EXTEND_NEW_LOGS:
+                if len(payload) != 0:
+                    del self.new_logs[-len(payload):]
+                fetched_logs = payload + fetched_logs
+            elif operation == POP_NEW_LOG:
+                self.new_logs.append(payload)
+            elif operation == APPEND_UNCHECKED_LOG:
+                self.unchecked_logs.pop_latest(payload['score'])
+            elif operation == POP_UNCHECKED_LOG:
+                self.unchecked_logs.append(payload)
+        # the fetched logs are more recent than the ones at the snapshot
+        self.new_logs.extend(fetched_logs)
+        self.new_logs.extend(pending_logs)
+        self.current_score = self._snapshot_score
+        self._journal = []
+        return len(fetched_logs) + len(pending_logs)
+
+    @timed_operation('get_next_log')
     def get_next_log(self):
         new_logs = self._get_new_logs()
-        self.new_logs.extend(new_logs)
+        self._extend_new_logs(new_logs)
         if len(self.new_logs) == 0:
             raise NextLogUnavailable("No more next logs")
-        return self.new_logs.pop()
+        return self._pop_new_log()
 
-    # TODO: this method may return wrong result when new logs arrive before the logs inside
-    #       `self.new_logs` are consumed entirely. This issue can be resolved by saving the
-    #       status of `new_logs`, `unchecked_logs`, and `current_score`, when it start to run
-    #       `GUESS_HEAD`. If there is a new block arriving, just restore them to the saved status,
-    #       append new logs to `new_logs`, and re-run `GUESS_HEAD`
+    # Logs arriving before the logs inside `self.new_logs` are consumed entirely may make
+    # the result wrong, since they are more recent. Call `take_snapshot` when `GUESS_HEAD`
+    # starts, and `restore_snapshot` when there is a new block arriving, to re-run it
+    @timed_operation('fetch_candidate_head')
     def fetch_candidate_head(self):
         # Try to return a log that has the score that we are checking for,
         # checking in order of oldest to most recent.
-        unchecked_logs = pipe(
-            self.unchecked_logs,
-            enumerate,
-            tuple,
-            reversed,
-            tuple,
-        )
-        current_score = self.current_score
-
-        for idx, log_entry in unchecked_logs:
-            if log_entry['score'] == current_score:
-                return self.unchecked_logs.pop(idx)
+        # The logs are fetched from the most recent one, so the oldest is the latest arrived
+        log_entry = self._pop_unchecked_log(self.current_score)
+        if log_entry is not None:
+            return log_entry
         # If no further recorded but unchecked logs exist, go to the next
         # is_new_head = true log
         while True:
@@ -115,10 +252,48 @@ class ShardTracker:
                 raise NoCandidateHead("No candidate head available")
             if log_entry['is_new_head']:
                 break
-            self.unchecked_logs.append(log_entry)
+            self._append_unchecked_log(log_entry)
         self.current_score = log_entry['score']
         return log_entry
 
+    def iter_candidate_heads(self):
+        """Yield the candidate heads in the order of `fetch_candidate_head`, i.e. in reverse
+        sorted order of score, and from the oldest to the most recent with the same score.
+
+        The logs are kept in a heap, and pulled from `new_logs` only when the heap can not tell
+        the next candidate yet. The logs arriving after the iteration starts are left to the
+        next iteration. The logs pulled but not yielded are put back when it is closed early
+        """
+        self._extend_new_logs(self._get_new_logs())
+        # (-score, -arrival index, log entry). The logs are pulled from the most recent one,
+        # so the earlier arrived one is the more recent one
+        heap = []
+        arrival_counter = itertools.count()
+        # all the logs older than a new head have lower scores than it, so the logs with
+        # scores no lower than the oldest new head pulled can be yielded
+        min_new_head_score = None
+        try:
+            while len(self.new_logs) != 0:
+                while (
+                    len(heap) != 0 and
+                    min_new_head_score is not None and
+                    -heap[0][0] >= min_new_head_score
+                ):
+                    yield heapq.heappop(heap)[2]
+                log_entry = self._pop_new_log()
+                heapq.heappush(heap, (-log_entry['score'], -next(arrival_counter), log_entry))
+                if log_entry['is_new_head']:
+                    min_new_head_score = log_entry['score']
+            while len(heap) != 0:
+                yield heapq.heappop(heap)[2]
+        finally:
+            # put back from the oldest one
+            self._extend_new_logs([
+                log_entry
+                for _, _, log_entry in sorted(heap, key=lambda item: item[1])
+            ])
+
     def clean_logs(self):
         self.new_logs = []
-        self.unchecked_logs = []
+        self.unchecked_logs = ScoreIndexedLogs()
+        self.discard_snapshot()
@@ -1,16 +1,44 @@
+import collections
+from concurrent.futures import (
+    ProcessPoolExecutor,
+)
 import logging
 
 from web3.contract import (
     Contract,
 )
+from web3.utils.abi import (
+    filter_by_name,
+    filter_by_type,
+)
 
 from eth_utils import (
+    big_endian_to_int,
     is_canonical_address,
+    to_canonical_address,
     to_checksum_address,
     to_dict,
     decode_hex,
 )
 
+from evm.constants import (
+    ZERO_ADDRESS,
+)
+
+from handler.utils.metrics import (
+    NULL_METRICS,
+    timed_operation,
+)
+from handler.utils.transaction_builder import (
+    make_add_header_data,
+    sign_raw_transaction,
+    sign_raw_transaction_job,
+)
+from handler.utils.web3_utils import (
+    DEFAULT_BATCH_SIZE,
+    batch_requests,
+)
+
 
 # Basic call context helper functions
 @to_dict
@@ -57,6 +85,46 @@ def make_transaction_context(nonce,
         yield 'data', data
 
 
+# Collation header helper functions
+# the bytes of the score in the entries of `collation_headers`, with the parent hash above it
+COLLATION_SCORE_SIZE = 6
+
+
+def unpack_collation_header_entry(entry):
+    """Return `(score, parent_hash)` packed in an entry of `collation_headers` of the contract,
+    as `parent_hash * 2**48 + score`. The collation hashes have 6 leading zero bytes, so the
+    parent hash fits in the rest of the entry
+    """
+    score = big_endian_to_int(entry[-COLLATION_SCORE_SIZE:])
+    parent_hash = b'\x00' * COLLATION_SCORE_SIZE + entry[:-COLLATION_SCORE_SIZE]
+    return score, parent_hash
+
+
+# the signing jobs sent to a worker process at a time by `SMCHandler.send_bulk`
+DEFAULT_SIGNING_CHUNK_SIZE = 16
+
+
+# Batched transaction helper functions
+@to_dict
+def make_transaction_call(func_name,
+                          args=(),
+                          value=0,
+                          gas=None,
+                          gas_price=None,
+                          data=None):
+    """Make a contract function call for `SMCHandler.send_many`
+    """
+    yield 'func_name', func_name
+    yield 'args', list(args)
+    yield 'value', value
+    if gas is not None:
+        yield 'gas', gas
+    if gas_price is not None:
+        yield 'gas_price', gas_price
+    if data is not None:
+        yield 'data', data
+
+
 class SMCHandler(Contract):
 
     logger = logging.getLogger("evm.chain.sharding.SMCHandler")
@@ -64,11 +132,29 @@ class SMCHandler(Contract):
     _privkey = None
     _sender_address = None
     _config = None
+    metrics = NULL_METRICS
+    nonce_manager = None
+    read_cache = None
 
-    def __init__(self, *args, default_privkey, config, **kwargs):
+    def __init__(self,
+                 *args,
+                 default_privkey,
+                 config,
+                 metrics=None,
+                 nonce_manager=None,
+                 read_cache=None,
+                 **kwargs):
         self._privkey = default_privkey
         self._sender_address = default_privkey.public_key.to_canonical_address()
         self._config = config
+        if metrics is not None:
+            self.metrics = metrics
+        # hand out the nonces locally instead of `getTransactionCount` per transaction
+        if nonce_manager is not None:
+            self.nonce_manager = nonce_manager
+        # serve the scores and parents of the added headers from a `CollationReadCache`
+        if read_cache is not None:
+            self.read_cache = read_cache
 
         super().__init__(*args, **kwargs)
 
@@ -124,22 +210,96 @@ class SMCHandler(Contract):
         return decode_hex(address_in_hex)
 
     def get_parent_hash(self, shard_id, collation_hash):
-        return self.functions.get_collation_header_parent_hash(
-            shard_id,
-            collation_hash,
-        ).call(self.basic_call_context)
+        if self.read_cache is not None:
+            _, parent_hash = self._get_cached_score_and_parent_hash(shard_id, collation_hash)
+            return parent_hash
+        _, parent_hash = unpack_collation_header_entry(
+            self.functions.collation_headers(
+                shard_id,
+                collation_hash,
+            ).call(self.basic_call_context)
+        )
+        return parent_hash
 
     def get_collation_score(self, shard_id, collation_hash):
+        if self.read_cache is not None:
+            score, _ = self._get_cached_score_and_parent_hash(shard_id, collation_hash)
+            return score
         return self.functions.get_collation_header_score(
             shard_id,
             collation_hash,
         ).call(self.basic_call_context)
 
-    def _send_transaction(self,
+    def _get_cached_score_and_parent_hash(self, shard_id, collation_hash):
+        entry = self.read_cache.get(shard_id, collation_hash)
+        if entry is not None:
+            return entry.score, entry.parent_hash
+        # keep the block of the call to evict the entry on reorgs
+        block_number = self.web3.eth.blockNumber
+        score, parent_hash = unpack_collation_header_entry(
+            self.functions.collation_headers(
+                shard_id,
+                collation_hash,
+            ).call(self.basic_call_context, block_identifier=block_number)
+        )
+        self.read_cache.add(shard_id, collation_hash, score, parent_hash, block_number)
+        return score, parent_hash
+
+    #
+    # Batched reads
+    #
+    @timed_operation('batch_call')
+    def batch_call(self, getter_calls, block_identifier=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Call the getters `(func_name, args)` in `getter_calls` all against the same block,
+        `block_identifier` or the latest one, so the results are consistent. Up to `batch_size`
+        concurrent `eth_call`s are kept in flight, one at a time by default. Return the results
+        in the order of `getter_calls`
+        """
+        if block_identifier is None:
+            block_identifier = self.web3.eth.blockNumber
+        call_context = self.basic_call_context
+
+        def call(func_name, args):
+            return getattr(self.functions, func_name)(*args).call(
+                call_context,
+                block_identifier=block_identifier,
+            )
+
+        return batch_requests(call, getter_calls, batch_size=batch_size)
+
+    def get_notary_pool(self, block_identifier=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Return the addresses in all the notary pool slots at the same block, with None for
+        the empty slots
+        """
+        if block_identifier is None:
+            block_identifier = self.web3.eth.blockNumber
+        notary_pool_len, empty_slots_stack_top = self.batch_call(
+            (
+                ('notary_pool_len', ()),
+                ('empty_slots_stack_top', ()),
+            ),
+            block_identifier=block_identifier,
+            batch_size=batch_size,
+        )
+        addresses_in_hex = self.batch_call(
+            (
+                ('notary_pool', (pool_index,))
+                for pool_index in range(notary_pool_len + empty_slots_stack_top)
+            ),
+            block_identifier=block_identifier,
+            batch_size=batch_size,
+        )
+        notary_addresses = tuple(map(decode_hex, addresses_in_hex))
+        return tuple(
+            None if notary_address == ZERO_ADDRESS else notary_address
+            for notary_address in notary_addresses
+        )
+
+    def _sign_transaction(self,
                           func_name,
                           args,
-                          private_key=None,
-                          nonce=None,
+                          private_key,
+                          nonce,
                           chain_id=None,
                           gas=None,
                           value=0,
@@ -149,10 +309,6 @@ class SMCHandler(Contract):
             gas = self.config['DEFAULT_GAS']
         if gas_price is None:
             gas_price = self.config['GAS_PRICE']
-        if private_key is None:
-            private_key = self.private_key
-        if nonce is None:
-            nonce = self.web3.eth.getTransactionCount(private_key.public_key.to_checksum_address())
         build_transaction_detail = make_transaction_context(
             nonce=nonce,
             gas=gas,
@@ -169,9 +325,203 @@ class SMCHandler(Contract):
             unsigned_transaction,
             private_key.to_hex(),
         )
-        tx_hash = self.web3.eth.sendRawTransaction(signed_transaction_dict['rawTransaction'])
+        return signed_transaction_dict['rawTransaction']
+
+    def _reserve_nonces(self, private_key, count):
+        sender_address = private_key.public_key.to_checksum_address()
+        if self.nonce_manager is not None:
+            return self.nonce_manager.reserve_nonces(sender_address, count)
+        start_nonce = self.web3.eth.getTransactionCount(sender_address)
+        return range(start_nonce, start_nonce + count)
+
+    def _send_raw_transactions(self, private_keys, raw_transactions, uses_reserved_nonces):
+        """Send `raw_transactions`, signed by `private_keys`. `raw_transactions` may be made
+        lazily, so the failures to make them are recovered from as well
+        """
+        try:
+            return tuple(
+                self.web3.eth.sendRawTransaction(raw_transaction)
+                for raw_transaction in raw_transactions
+            )
+        except Exception:
+            # the nonces of the transactions not sent are left unused, so start over from the
+            # chain next time
+            if uses_reserved_nonces and self.nonce_manager is not None:
+                for private_key in private_keys:
+                    self.nonce_manager.reset(private_key.public_key.to_checksum_address())
+            raise
+
+    @timed_operation('_send_transaction')
+    def _send_transaction(self,
+                          func_name,
+                          args,
+                          private_key=None,
+                          nonce=None,
+                          chain_id=None,
+                          gas=None,
+                          value=0,
+                          gas_price=None,
+                          data=None):
+        if private_key is None:
+            private_key = self.private_key
+        uses_reserved_nonces = nonce is None
+        if nonce is None:
+            nonce = self._reserve_nonces(private_key, 1)[0]
+        transaction_call = make_transaction_call(
+            func_name,
+            args,
+            value=value,
+            gas=gas,
+            gas_price=gas_price,
+            data=data,
+        )
+        raw_transactions = self._iter_signed_transactions(
+            private_key,
+            (nonce,),
+            (transaction_call,),
+            chain_id,
+        )
+        tx_hash, = self._send_raw_transactions(
+            (private_key,),
+            raw_transactions,
+            uses_reserved_nonces,
+        )
         return tx_hash
 
+    def _iter_signed_transactions(self, private_key, nonces, transaction_calls, chain_id):
+        # a generator, so the failures to sign give the reserved nonces back in
+        # `_send_raw_transactions` as well. All of them are signed before the first is sent
+        raw_transactions = tuple(
+            self._sign_transaction(
+                private_key=private_key,
+                nonce=nonce,
+                chain_id=chain_id,
+                **transaction_call
+            )
+            for nonce, transaction_call in zip(nonces, transaction_calls)
+        )
+        yield from raw_transactions
+
+    @timed_operation('send_many')
+    def send_many(self, transaction_calls, private_key=None, chain_id=None):
+        """Sign the calls made by `make_transaction_call` with consecutive nonces, and then
+        send them all at once. Return the transaction hashes in the same order
+        """
+        if private_key is None:
+            private_key = self.private_key
+        transaction_calls = tuple(transaction_calls)
+        nonces = self._reserve_nonces(private_key, len(transaction_calls))
+        raw_transactions = self._iter_signed_transactions(
+            private_key,
+            nonces,
+            transaction_calls,
+            chain_id,
+        )
+        return self._send_raw_transactions((private_key,), raw_transactions, True)
+
+    def _get_function_abi(self, func_name):
+        fn_abis = filter_by_name(func_name, filter_by_type('function', self.abi))
+        if len(fn_abis) != 1:
+            raise ValueError(
+                "Expected exactly one function named {0}, got {1}".format(func_name, len(fn_abis))
+            )
+        return fn_abis[0]
+
+    def _make_signing_job(self,
+                          private_key,
+                          nonce,
+                          chain_id,
+                          func_name,
+                          args,
+                          value=0,
+                          gas=None,
+                          gas_price=None,
+                          data=None):
+        if gas is None:
+            gas = self.config['DEFAULT_GAS']
+        if gas_price is None:
+            gas_price = self.config['GAS_PRICE']
+        # the arguments are ABI encoded by the job, in the process pool
+        return (
+            private_key.to_bytes(),
+            nonce,
+            gas_price,
+            gas,
+            to_canonical_address(self.address),
+            value,
+            self._get_function_abi(func_name),
+            tuple(args),
+            chain_id,
+        )
+
+    @timed_operation('send_bulk')
+    def send_bulk(self,
+                  signing_calls,
+                  chain_id=None,
+                  executor=None,
+                  max_workers=None,
+                  chunk_size=DEFAULT_SIGNING_CHUNK_SIZE):
+        """Encode and sign the calls in `signing_calls`, `(private_key, transaction_call)`
+        pairs with the calls made by `make_transaction_call`, across a process pool, and then
+        send them one after another, e.g. for the notaries of a fleet. The nonces of each key
+        are consecutive in the order of `signing_calls`. `executor` is a `ProcessPoolExecutor`
+        to reuse, otherwise one with `max_workers` is made for the call. Return the transaction
+        hashes in the same order.
+
+        If anything fails, the nonces of all the keys are reset, including those of the
+        transactions already sent, which relies on `getTransactionCount` counting the pending
+        transactions
+        """
+        signing_calls = tuple(signing_calls)
+        if len(signing_calls) == 0:
+            return tuple()
+        # private key bytes -> private key
+        private_keys = collections.OrderedDict()
+        for private_key, _ in signing_calls:
+            private_keys[private_key.to_bytes()] = private_key
+        signing_jobs = self._iter_signing_jobs(signing_calls, private_keys, chain_id)
+        raw_transactions = self._sign_bulk(signing_jobs, executor, max_workers, chunk_size)
+        return self._send_raw_transactions(private_keys.values(), raw_transactions, True)
+
+    def _iter_signing_jobs(self, signing_calls, private_keys, chain_id):
+        # a generator, so a failure to reserve the nonces of a key resets the keys reserved
+        # before it in `_send_raw_transactions`
+        call_counts = collections.Counter(
+            private_key.to_bytes()
+            for private_key, _ in signing_calls
+        )
+        nonce_iters = {
+            private_key_bytes: iter(self._reserve_nonces(
+                private_key,
+                call_counts[private_key_bytes],
+            ))
+            for private_key_bytes, private_key in private_keys.items()
+        }
+        for private_key, transaction_call in signing_calls:
+            yield self._make_signing_job(
+                private_key,
+                next(nonce_iters[private_key.to_bytes()]),
+                chain_id,
+                **transaction_call
+            )
+
+    def _sign_bulk(self, signing_jobs, executor, max_workers, chunk_size):
+        # a generator, so the signing fails within `_send_raw_transactions`
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                raw_transactions = tuple(executor.map(
+                    sign_raw_transaction_job,
+                    signing_jobs,
+                    chunksize=chunk_size,
+                ))
+        else:
+            raw_transactions = tuple(executor.map(
+                sign_raw_transaction_job,
+                signing_jobs,
+                chunksize=chunk_size,
+            ))
+        yield from raw_transactions
+
     #
     # Transactions
     #
@@ -206,30 +556,58 @@ class SMCHandler(Contract):
         )
         return tx_hash
 
+    @timed_operation('add_header')
     def add_header(self,
                    collation_header,
                    gas=None,
-                   gas_price=None):
-        """Add the collation header with the given parameters
+                   gas_price=None,
+                   private_key=None,
+                   nonce=None,
+                   chain_id=None):
+        """Add the collation header with the given parameters. The transaction is encoded and
+        signed directly, instead of through `buildTransaction`, since a proposer has only a
+        few seconds to send it
         """
-        tx_hash = self._send_transaction(
-            'add_header',
-            [
-                collation_header.shard_id,
-                collation_header.expected_period_number,
-                collation_header.period_start_prevhash,
-                collation_header.parent_hash,
-                collation_header.transaction_root,
-                to_checksum_address(collation_header.coinbase),
-                collation_header.state_root,
-                collation_header.receipt_root,
-                collation_header.number,
-            ],
-            gas=gas,
-            gas_price=gas_price,
+        if private_key is None:
+            private_key = self.private_key
+        uses_reserved_nonces = nonce is None
+        if nonce is None:
+            nonce = self._reserve_nonces(private_key, 1)[0]
+        raw_transactions = self._iter_signed_add_header(
+            collation_header,
+            private_key,
+            nonce,
+            self.config['DEFAULT_GAS'] if gas is None else gas,
+            self.config['GAS_PRICE'] if gas_price is None else gas_price,
+            chain_id,
+        )
+        tx_hash, = self._send_raw_transactions(
+            (private_key,),
+            raw_transactions,
+            uses_reserved_nonces,
         )
         return tx_hash
 
+    def _iter_signed_add_header(self,
+                                collation_header,
+                                private_key,
+                                nonce,
+                                gas,
+                                gas_price,
+                                chain_id):
+        # a generator, so a malformed header gives the reserved nonce back in
+        # `_send_raw_transactions` as well
+        yield sign_raw_transaction(
+            private_key,
+            nonce=nonce,
+            gas_price=gas_price,
+            gas=gas,
+            to=to_canonical_address(self.address),
+            value=0,
+            data=make_add_header_data(collation_header),
+            chain_id=chain_id,
+        )
+
     def tx_to_shard(self,
                     to,
                     shard_id,
@@ -0,0 +1,80 @@
+class BlockHashWindow:
+    """A bounded window of the most recent block hashes, ordered from the oldest to the newest.
+
+    The hashes are kept in a ring buffer, together with a map from each hash to its absolute
+    position, so appending, membership tests, `index` and truncation are all O(1) amortized.
+    """
+
+    def __init__(self, capacity, block_hashes=()):
+        if not (isinstance(capacity, int) and capacity > 0):
+            raise ValueError('capacity should be provided as positive integer')
+        self.capacity = capacity
+        self._buffer = [None] * capacity
+        # block hash -> absolute position
+        self._positions = {}
+        # absolute positions of the oldest hash, and the one after the newest hash
+        self._start = 0
+        self._end = 0
+        self.extend(block_hashes)
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __contains__(self, block_hash):
+        return block_hash in self._positions
+
+    def __iter__(self):
+        for position in range(self._start, self._end):
+            yield self._buffer[position % self.capacity]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not (0 <= index < len(self)):
+            raise IndexError('BlockHashWindow index out of range')
+        return self._buffer[(self._start + index) % self.capacity]
+
+    def __repr__(self):
+        return "<BlockHashWindow {0}/{1}>".format(len(self), self.capacity)
+
+    def index(self, block_hash):
+        try:
+            return self._positions[block_hash] - self._start
+        except KeyError:
+            raise ValueError('{0!r} is not in the window'.format(block_hash))
+
+    def append(self, block_hash):
+        """Append `block_hash` as the newest hash, and return the evicted oldest hash, if any
+        """
+        evicted_hash = None
+        if len(self) == self.capacity:
+            evicted_hash = self._buffer[self._start % self.capacity]
+            del self._positions[evicted_hash]
+            self._start += 1
+        self._buffer[self._end % self.capacity] = block_hash
+        self._positions[block_hash] = self._end
+        self._end += 1
+        return evicted_hash
+
+    def extend(self, block_hashes):
+        return tuple(
+            evicted_hash
+            for evicted_hash in (self.append(block_hash) for block_hash in block_hashes)
+            if evicted_hash is not None
+        )
+
+    def truncate(self, length):
+        """Remove the newest hashes until at most `length` hashes are left, and return the
+        removed hashes ordered from the oldest to the newest
+        """
+        removed_hashes = []
+        while len(self) > max(length, 0):
+            self._end -= 1
+            buffer_index = self._end % self.capacity
+            removed_hash = self._buffer[buffer_index]
+            self._buffer[buffer_index] = None
+            del self._positions[removed_hash]
+            removed_hashes.append(removed_hash)
+        return tuple(reversed(removed_hashes))
@@ -0,0 +1,41 @@
+from eth_utils import (
+    decode_hex,
+    is_bytes,
+    keccak,
+)
+
+
+def get_bloom_mask(value):
+    """Return the bits set by `value` in a 2048-bit `logsBloom`, as an integer
+    """
+    value_hash = keccak(value)
+    bloom_mask = 0
+    for idx in (0, 2, 4):
+        bloom_mask |= 1 << (((value_hash[idx] << 8) | value_hash[idx + 1]) & 2047)
+    return bloom_mask
+
+
+def is_value_in_bloom(logs_bloom, value):
+    """Return False if `value` is surely not in `logs_bloom`
+    """
+    if not is_bytes(value):
+        value = decode_hex(value)
+    bloom_mask = get_bloom_mask(bytes(value))
+    return logs_bloom & bloom_mask == bloom_mask
+
+
+def is_filter_in_bloom(logs_bloom, address=None, topics=None):
+    """Return False if no log matching `address` and `topics` can be in the block with
+    `logs_bloom`. An entry of `topics` can be a list of alternatives
+    """
+    if address is not None and not is_value_in_bloom(logs_bloom, address):
+        return False
+    for topic in topics or ():
+        if topic is None:
+            continue
+        if isinstance(topic, (list, tuple)):
+            if not any(is_value_in_bloom(logs_bloom, item) for item in topic):
+                return False
+        elif not is_value_in_bloom(logs_bloom, topic):
+            return False
+    return True
@@ -0,0 +1,183 @@
+from eth_utils import (
+    decode_hex,
+    keccak,
+)
+
+from evm.utils.numeric import (
+    int_to_bytes32,
+)
+from evm.utils.padding import (
+    pad32,
+)
+
+from contracts.utils.headers import (
+    CollationHeader,
+)
+
+
+# the offsets of the 32-byte fields in the header bytes, excluding `shard_id`
+EXPECTED_PERIOD_NUMBER_OFFSET = 0
+PERIOD_START_PREVHASH_OFFSET = 32
+PARENT_HASH_OFFSET = 64
+TRANSACTION_ROOT_OFFSET = 96
+COINBASE_OFFSET = 128
+STATE_ROOT_OFFSET = 160
+RECEIPT_ROOT_OFFSET = 192
+NUMBER_OFFSET = 224
+# the header fields in `data` are followed by `is_new_head` and `score`
+HEADER_DATA_SIZE = 256
+
+ZERO_WORD_HEX = '0' * 64
+
+
+class LazyCollationHeader:
+    """A collation header decoded from the fixed-width fields of a `CollationAdded` log.
+
+    The log data is only decoded when a field is accessed, and the fields are read through a
+    `memoryview` of it. It is only used within the bulk decoding, `materialize` builds the
+    `CollationHeader` handed out by the public accessors
+    """
+
+    __slots__ = ('shard_id', '_raw_data', '_view', '_hash')
+
+    def __init__(self, shard_id, raw_data):
+        self.shard_id = shard_id
+        # the log data, as hex or bytes
+        self._raw_data = raw_data
+        self._view = None
+        self._hash = None
+
+    @property
+    def _data(self):
+        if self._view is None:
+            if isinstance(self._raw_data, str):
+                self._view = memoryview(decode_hex(self._raw_data))[:HEADER_DATA_SIZE]
+            else:
+                self._view = memoryview(self._raw_data)[:HEADER_DATA_SIZE]
+            self._raw_data = None
+        return self._view
+
+    def __repr__(self):
+        return "<LazyCollationHeader #{0} (shard #{1})>".format(
+            self.expected_period_number,
+            self.shard_id,
+        )
+
+    def _get_int(self, offset):
+        return int.from_bytes(self._data[offset:offset + 32], 'big')
+
+    def _get_bytes32(self, offset):
+        return bytes(self._data[offset:offset + 32])
+
+    @property
+    def expected_period_number(self):
+        return self._get_int(EXPECTED_PERIOD_NUMBER_OFFSET)
+
+    @property
+    def period_start_prevhash(self):
+        return self._get_bytes32(PERIOD_START_PREVHASH_OFFSET)
+
+    @property
+    def parent_hash(self):
+        return self._get_bytes32(PARENT_HASH_OFFSET)
+
+    @property
+    def transaction_root(self):
+        return self._get_bytes32(TRANSACTION_ROOT_OFFSET)
+
+    @property
+    def coinbase(self):
+        return bytes(self._data[COINBASE_OFFSET + 12:COINBASE_OFFSET + 32])
+
+    @property
+    def state_root(self):
+        return self._get_bytes32(STATE_ROOT_OFFSET)
+
+    @property
+    def receipt_root(self):
+        return self._get_bytes32(RECEIPT_ROOT_OFFSET)
+
+    @property
+    def number(self):
+        return self._get_int(NUMBER_OFFSET)
+
+    def to_bytes(self):
+        """Return the header fields padded to 32 bytes, as `CollationHeader.from_bytes` takes
+        """
+        return self.shard_id.to_bytes(32, 'big') + self._data.tobytes()
+
+    @property
+    def hash(self):
+        # same as `CollationHeader.hash`, the log data is already the padded header fields
+        if self._hash is None:
+            self._hash = pad32(keccak(self.to_bytes())[6:])
+        return self._hash
+
+    def materialize(self):
+        return CollationHeader(
+            shard_id=self.shard_id,
+            expected_period_number=self.expected_period_number,
+            period_start_prevhash=self.period_start_prevhash,
+            parent_hash=self.parent_hash,
+            transaction_root=self.transaction_root,
+            coinbase=self.coinbase,
+            state_root=self.state_root,
+            receipt_root=self.receipt_root,
+            number=self.number,
+        )
+
+
+def parse_collation_added_logs(logs):
+    """Parse the `CollationAdded` logs in bulk, same as `parse_collation_added_log` for each of
+    them, except the headers are `LazyCollationHeader`s
+    """
+    log_entries = []
+    append = log_entries.append
+    for log in logs:
+        data = log['data']
+        # `shard_id` is the first indexed entry, hence the second entry in topics
+        shard_id_topic = log['topics'][1]
+        if isinstance(shard_id_topic, str):
+            shard_id = int(shard_id_topic, 16)
+        else:
+            shard_id = int.from_bytes(shard_id_topic, 'big')
+        # `is_new_head` and `score` are the last two words
+        if isinstance(data, str):
+            is_new_head = data[-128:-64] != ZERO_WORD_HEX
+            score = int(data[-64:], 16)
+        else:
+            is_new_head = any(data[-64:-32])
+            score = int.from_bytes(data[-32:], 'big')
+        append({
+            'header': LazyCollationHeader(shard_id, data),
+            'is_new_head': is_new_head,
+            'score': score,
+        })
+    return log_entries
+
+
+def materialize_log_entries(log_entries):
+    """Replace the lazy headers of `log_entries` parsed by `parse_collation_added_logs` with
+    `CollationHeader`s, e.g. for the log entries kept by `ShardTracker`
+    """
+    for log_entry in log_entries:
+        log_entry['header'] = log_entry['header'].materialize()
+    return log_entries
+
+
+def get_header_bytes(header):
+    """Return the header fields of `header`, lazy or not, padded to 32 bytes
+    """
+    if isinstance(header, LazyCollationHeader):
+        return header.to_bytes()
+    return b''.join((
+        int_to_bytes32(header.shard_id),
+        int_to_bytes32(header.expected_period_number),
+        header.period_start_prevhash,
+        header.parent_hash,
+        header.transaction_root,
+        pad32(header.coinbase),
+        header.state_root,
+        header.receipt_root,
+        int_to_bytes32(header.number),
+    ))
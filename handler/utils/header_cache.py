@@ -0,0 +1,100 @@
+import collections
+
+from eth_utils import (
+    big_endian_to_int,
+    decode_hex,
+    is_bytes,
+    is_hex,
+    to_dict,
+)
+
+from handler.utils.web3_utils import (
+    DEFAULT_BATCH_SIZE,
+    get_blocks,
+)
+
+
+def get_logs_bloom(block):
+    """Return the `logsBloom` of `block` as an integer
+    """
+    # some backends, e.g. eth-tester, name it `logs_bloom`
+    logs_bloom = block['logsBloom'] if 'logsBloom' in block else block['logs_bloom']
+    if isinstance(logs_bloom, int):
+        return logs_bloom
+    if is_bytes(logs_bloom):
+        return big_endian_to_int(logs_bloom)
+    return big_endian_to_int(decode_hex(logs_bloom))
+
+
+@to_dict
+def extract_block_header(block):
+    yield 'hash', block['hash']
+    yield 'number', block['number']
+    yield 'parentHash', block['parentHash']
+    yield 'logsBloom', get_logs_bloom(block)
+
+
+def is_block_hash(block_identifier):
+    if is_bytes(block_identifier):
+        return len(block_identifier) == 32
+    return (
+        isinstance(block_identifier, str) and
+        len(block_identifier) == 66 and
+        is_hex(block_identifier)
+    )
+
+
+class BlockHeaderCache:
+    """A bounded LRU cache of block headers keyed by block hash. Lookups by hash are served
+    from the cache when possible, while lookups by number or tag always go to the chain, since
+    their results change on reorgs. Both fill the cache
+    """
+
+    def __init__(self, w3, max_size=1024):
+        if not (isinstance(max_size, int) and max_size > 0):
+            raise ValueError('max_size should be provided as positive integer')
+        self.w3 = w3
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._headers = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._headers)
+
+    def __contains__(self, block_hash):
+        return bytes(block_hash) in self._headers
+
+    def _put(self, block):
+        header = extract_block_header(block)
+        self._headers[bytes(header['hash'])] = header
+        self._headers.move_to_end(bytes(header['hash']))
+        if len(self._headers) > self.max_size:
+            self._headers.popitem(last=False)
+        return header
+
+    def get_block(self, block_identifier):
+        """Return the header of the block with the given hash, number or tag, or None if the
+        chain does not have it
+        """
+        if is_block_hash(block_identifier):
+            if is_bytes(block_identifier):
+                block_hash = bytes(block_identifier)
+            else:
+                block_hash = decode_hex(block_identifier)
+            if block_hash in self._headers:
+                self.hits += 1
+                self._headers.move_to_end(block_hash)
+                return self._headers[block_hash]
+        self.misses += 1
+        block = self.w3.eth.getBlock(block_identifier)
+        if block is None:
+            return None
+        return self._put(block)
+
+    def get_blocks(self, block_identifiers, batch_size=DEFAULT_BATCH_SIZE):
+        """Fetch the blocks with up to `batch_size` requests in flight, bypassing the cache
+        """
+        blocks = get_blocks(self.w3, block_identifiers, batch_size=batch_size)
+        self.misses += len(blocks)
+        return tuple(None if block is None else self._put(block) for block in blocks)
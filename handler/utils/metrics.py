@@ -0,0 +1,155 @@
+import functools
+import json
+import threading
+import time
+
+from eth_utils import (
+    encode_hex,
+    is_bytes,
+)
+
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float('inf'))
+
+
+class CallStats:
+    """Call count, error count, latency histogram and payload sizes of one RPC method or
+    operation. Safe to record from several threads
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.error_count = 0
+        self.total_duration = 0
+        self.max_duration = 0
+        self.latency_histogram = [0] * len(LATENCY_BUCKETS)
+        self.request_size = 0
+        self.response_size = 0
+        self._lock = threading.Lock()
+
+    def record(self, duration, request_size=0, response_size=0, is_error=False):
+        with self._lock:
+            self.count += 1
+            if is_error:
+                self.error_count += 1
+            self.total_duration += duration
+            self.max_duration = max(self.max_duration, duration)
+            for idx, upper_bound in enumerate(LATENCY_BUCKETS):
+                if duration <= upper_bound:
+                    self.latency_histogram[idx] += 1
+                    break
+            self.request_size += request_size
+            self.response_size += response_size
+
+    @property
+    def average_duration(self):
+        if self.count == 0:
+            return 0
+        return self.total_duration / self.count
+
+
+class NoopMetrics:
+    """The default metrics, which records nothing
+    """
+
+    enabled = False
+
+    def record_rpc(self, method, duration, request_size=0, response_size=0, is_error=False):
+        pass
+
+    def record_operation(self, name, duration, is_error=False):
+        pass
+
+
+NULL_METRICS = NoopMetrics()
+
+
+class Metrics(NoopMetrics):
+    """Record the RPCs, through `make_metrics_middleware`, and the high level operations of
+    the handlers
+    """
+
+    enabled = True
+
+    def __init__(self):
+        # RPC method -> CallStats
+        self.rpc_stats = {}
+        # operation name -> CallStats
+        self.operation_stats = {}
+        # guards adding the stats, e.g. of the RPCs from the thread pools
+        self._lock = threading.Lock()
+
+    def _get_call_stats(self, stats, key):
+        with self._lock:
+            if key not in stats:
+                stats[key] = CallStats()
+            return stats[key]
+
+    def record_rpc(self, method, duration, request_size=0, response_size=0, is_error=False):
+        self._get_call_stats(self.rpc_stats, method).record(
+            duration,
+            request_size,
+            response_size,
+            is_error,
+        )
+
+    def record_operation(self, name, duration, is_error=False):
+        self._get_call_stats(self.operation_stats, name).record(duration, is_error=is_error)
+
+
+def timed_operation(name):
+    """Record the duration of the decorated method to `self.metrics` as operation `name`
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if not metrics.enabled:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            is_error = True
+            try:
+                result = method(self, *args, **kwargs)
+                is_error = False
+                return result
+            finally:
+                metrics.record_operation(name, time.perf_counter() - start, is_error)
+        return wrapper
+    return decorator
+
+
+def _encode_json_default(value):
+    if is_bytes(value):
+        return encode_hex(value)
+    return str(value)
+
+
+def get_payload_size(payload):
+    return len(json.dumps(payload, default=_encode_json_default))
+
+
+def make_metrics_middleware(metrics, measures_payload_size=False):
+    """Make a web3 middleware recording the count, errors and latency of each RPC method to
+    `metrics`. The payload sizes are only recorded with `measures_payload_size`, since they
+    are measured by encoding the request and the response to JSON again
+    """
+    def metrics_middleware(make_request, web3):
+        def middleware(method, params):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = make_request(method, params)
+            finally:
+                duration = time.perf_counter() - start
+                # raised, or answered with a JSON-RPC error
+                is_error = response is None or 'error' in response
+                if measures_payload_size:
+                    request_size = get_payload_size(params)
+                    response_size = 0 if response is None else get_payload_size(response)
+                else:
+                    request_size = response_size = 0
+                metrics.record_rpc(method, duration, request_size, response_size, is_error)
+            return response
+        return middleware
+    return metrics_middleware
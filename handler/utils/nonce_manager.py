@@ -0,0 +1,44 @@
+import threading
+
+from eth_utils import (
+    to_checksum_address,
+)
+
+
+class NonceManager:
+    """Hand out the nonces of each sender locally, so sending transactions back-to-back needs
+    no `getTransactionCount` each, and never reuses a nonce.
+
+    The first nonce of a sender comes from its pending transaction count, and `reset` starts
+    over from there, e.g. after a failure to send
+    """
+
+    def __init__(self, web3):
+        self.web3 = web3
+        # checksum address -> the next nonce to hand out
+        self._next_nonces = {}
+        self._lock = threading.Lock()
+
+    def _get_transaction_count(self, address):
+        return self.web3.eth.getTransactionCount(address, 'pending')
+
+    def reserve_nonces(self, address, count):
+        """Reserve `count` consecutive nonces of `address`, and return them as a range
+        """
+        address = to_checksum_address(address)
+        with self._lock:
+            if address not in self._next_nonces:
+                self._next_nonces[address] = self._get_transaction_count(address)
+            start_nonce = self._next_nonces[address]
+            self._next_nonces[address] += count
+        return range(start_nonce, start_nonce + count)
+
+    def get_next_nonce(self, address):
+        return self.reserve_nonces(address, 1)[0]
+
+    def reset(self, address):
+        """Forget the local nonce of `address`, e.g. after failing to send a transaction with
+        a reserved nonce, so the next one is from the chain again
+        """
+        with self._lock:
+            self._next_nonces.pop(to_checksum_address(address), None)
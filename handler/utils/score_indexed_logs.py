@@ -0,0 +1,69 @@
+import collections
+import heapq
+import itertools
+
+
+class ScoreIndexedLogs:
+    """Log entries indexed by their score, keeping the arrival order of the entries.
+
+    Each score maps to a deque of the entries with that score in arrival order, so appending
+    and popping the latest entry of a given score are O(1).
+    """
+
+    def __init__(self, log_entries=()):
+        self._arrival_counter = itertools.count()
+        # score -> deque of (arrival index, log entry)
+        self._logs_by_score = {}
+        self._size = 0
+        for log_entry in log_entries:
+            self.append(log_entry)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        """Iterate over the entries in arrival order
+        """
+        # the arrival indices are unique, so the entries themselves are never compared
+        for _, log_entry in heapq.merge(*self._logs_by_score.values()):
+            yield log_entry
+
+    def __repr__(self):
+        return "<ScoreIndexedLogs {0} entries, {1} scores>".format(
+            len(self),
+            len(self._logs_by_score),
+        )
+
+    def append(self, log_entry):
+        score = log_entry['score']
+        if score not in self._logs_by_score:
+            self._logs_by_score[score] = collections.deque()
+        self._logs_by_score[score].append((next(self._arrival_counter), log_entry))
+        self._size += 1
+
+    def pop_latest(self, score):
+        """Remove and return the latest arrived entry with `score`, or None if there is none
+        """
+        entries = self._logs_by_score.get(score)
+        if not entries:
+            return None
+        _, log_entry = entries.pop()
+        if len(entries) == 0:
+            del self._logs_by_score[score]
+        self._size -= 1
+        return log_entry
+
+    def remove_if(self, predicate):
+        """Remove all the entries for which `predicate` returns True
+        """
+        for score, entries in tuple(self._logs_by_score.items()):
+            kept_entries = collections.deque(
+                (arrival_index, log_entry)
+                for arrival_index, log_entry in entries
+                if not predicate(log_entry)
+            )
+            self._size -= len(entries) - len(kept_entries)
+            if len(kept_entries) == 0:
+                del self._logs_by_score[score]
+            else:
+                self._logs_by_score[score] = kept_entries
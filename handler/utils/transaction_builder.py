@@ -0,0 +1,100 @@
+import rlp
+
+from eth_abi import (
+    encode_abi,
+)
+from eth_keys import (
+    keys,
+)
+from eth_utils import (
+    function_abi_to_4byte_selector,
+    function_signature_to_4byte_selector,
+    keccak,
+)
+from web3.utils.abi import (
+    get_abi_input_types,
+    map_abi_data,
+)
+from web3.utils.normalizers import (
+    abi_address_to_hex,
+    abi_bytes_to_bytes,
+    abi_string_to_text,
+)
+
+from handler.utils.collation_added_logs import (
+    get_header_bytes,
+)
+
+
+ADD_HEADER_SIGNATURE = (
+    "add_header(int128,int128,bytes32,bytes32,bytes32,address,bytes32,bytes32,int128)"
+)
+ADD_HEADER_SELECTOR = function_signature_to_4byte_selector(ADD_HEADER_SIGNATURE)
+# the selector followed by the nine 32-byte arguments
+ADD_HEADER_DATA_SIZE = 4 + 9 * 32
+
+
+def make_add_header_data(collation_header):
+    """Encode the call of `add_header` with `collation_header`, lazy or not. All the arguments
+    are static, so the ABI encoding is the header fields padded to 32 bytes
+    """
+    data = ADD_HEADER_SELECTOR + get_header_bytes(collation_header)
+    if len(data) != ADD_HEADER_DATA_SIZE:
+        raise ValueError("Malformed collation header: {0}".format(collation_header))
+    return data
+
+
+def encode_function_call(fn_abi, args):
+    """Encode the call of the function of `fn_abi` with `args`, the same as
+    `Contract.encodeABI` does, except that ENS names are not resolved, since it needs no web3
+    """
+    argument_types = get_abi_input_types(fn_abi)
+    normalized_args = map_abi_data(
+        (abi_address_to_hex, abi_bytes_to_bytes, abi_string_to_text),
+        argument_types,
+        args,
+    )
+    return function_abi_to_4byte_selector(fn_abi) + encode_abi(argument_types, normalized_args)
+
+
+def sign_raw_transaction(private_key,
+                         nonce,
+                         gas_price,
+                         gas,
+                         to,
+                         value,
+                         data,
+                         chain_id=None):
+    """Sign the transaction with `private_key` and return it RLP encoded, the same as
+    `web3.eth.account.signTransaction` does, without building it through web3. `to` is a
+    canonical address, and the signature follows EIP-155 if `chain_id` is given
+    """
+    if chain_id is None:
+        unsigned_fields = [nonce, gas_price, gas, to, value, data]
+    else:
+        unsigned_fields = [nonce, gas_price, gas, to, value, data, chain_id, 0, 0]
+    signature = private_key.sign_msg_hash(keccak(rlp.encode(unsigned_fields)))
+    if chain_id is None:
+        v = signature.v + 27
+    else:
+        v = signature.v + 35 + 2 * chain_id
+    return rlp.encode([nonce, gas_price, gas, to, value, data, v, signature.r, signature.s])
+
+
+def sign_raw_transaction_job(job):
+    """`sign_raw_transaction` with the arguments in `job`, with the raw private key bytes
+    instead of the key object and the function ABI and arguments instead of the data, so the
+    jobs can be sent to a process pool, which encodes the calls as well
+    """
+    private_key_bytes, nonce, gas_price, gas, to, value, fn_abi, args, chain_id = job
+    data = encode_function_call(fn_abi, args)
+    return sign_raw_transaction(
+        keys.PrivateKey(private_key_bytes),
+        nonce,
+        gas_price,
+        gas,
+        to,
+        value,
+        data,
+        chain_id,
+    )
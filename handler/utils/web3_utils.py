@@ -1,8 +1,15 @@
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+
 import rlp
 
 from eth_utils import (
     to_checksum_address,
 )
+from web3.providers.eth_tester import (
+    EthereumTesterProvider,
+)
 
 
 def get_code(web3, address):
@@ -13,6 +20,40 @@ def get_nonce(web3, address):
     return web3.eth.getTransactionCount(to_checksum_address(address))
 
 
+# the number of requests kept in flight at the same time by `batch_requests`. Serial by
+# default, since not every provider takes concurrent requests, e.g. eth-tester shares the
+# state journal of py-evm between them. Raise it for a node over HTTP or IPC
+DEFAULT_BATCH_SIZE = 1
+
+
+def batch_requests(request_fn, args_list, batch_size=DEFAULT_BATCH_SIZE):
+    """Issue `request_fn(*args)` for every `args` in `args_list`, keeping up to `batch_size`
+    requests in flight from a thread pool, and return the results in the order of `args_list`.
+    These are separate requests, not one JSON-RPC batch
+    """
+    if not (isinstance(batch_size, int) and batch_size > 0):
+        raise ValueError('batch_size should be provided as positive integer')
+    args_list = tuple(args_list)
+    if len(args_list) == 0:
+        return tuple()
+    if batch_size == 1:
+        return tuple(request_fn(*args) for args in args_list)
+    with ThreadPoolExecutor(max_workers=min(batch_size, len(args_list))) as executor:
+        return tuple(executor.map(lambda args: request_fn(*args), args_list))
+
+
+def get_blocks(web3, block_identifiers, batch_size=DEFAULT_BATCH_SIZE):
+    return batch_requests(
+        web3.eth.getBlock,
+        ((block_identifier,) for block_identifier in block_identifiers),
+        batch_size=batch_size,
+    )
+
+
+def is_eth_tester(web3):
+    return any(isinstance(provider, EthereumTesterProvider) for provider in web3.providers)
+
+
 def take_snapshot(web3):
     return web3.testing.snapshot()
 
@@ -0,0 +1,167 @@
+import collections
+import logging
+
+
+VALID = 'valid'
+INVALID = 'invalid'
+# the collation data can not be fetched, it may be available later
+UNAVAILABLE = 'unavailable'
+
+VALIDITY_STATUSES = (VALID, INVALID, UNAVAILABLE)
+
+
+def to_validity_status(status):
+    """Convert the result of `fetch_and_verify_collation`, a validity status or whether the
+    collation is valid, to a validity status
+    """
+    if isinstance(status, bool):
+        return VALID if status else INVALID
+    return status
+
+
+class ValidityCache:
+    """A bounded LRU cache of the validity of collations, keyed by collation hash.
+
+    The parent of each collation is recorded as well, so marking a collation invalid marks
+    all of its known descendants invalid, and a collation added under an invalid parent is
+    invalid right away. One cache is meant to be shared by all the code paths verifying
+    collations, e.g. watching the shards and creating collations
+    """
+
+    logger = logging.getLogger("evm.chain.sharding.ValidityCache")
+
+    def __init__(self, max_size=4096):
+        if not (isinstance(max_size, int) and max_size > 0):
+            raise ValueError('max_size should be provided as positive integer')
+        self.max_size = max_size
+        # collation hash -> validity status, or None if not verified yet
+        self._statuses = collections.OrderedDict()
+        # collation hash -> collation hashes of its children, bounded by `max_size` as well,
+        # since the parents are not necessarily in `_statuses`
+        self._children = collections.OrderedDict()
+        # collation hash -> the parent hash, for the collations in `_children`
+        self._parents = {}
+
+    def __len__(self):
+        return len(self._statuses)
+
+    def __contains__(self, collation_hash):
+        return collation_hash in self._statuses
+
+    def _touch(self, collation_hash):
+        if collation_hash in self._statuses:
+            self._statuses.move_to_end(collation_hash)
+        else:
+            self._statuses[collation_hash] = None
+            if len(self._statuses) > self.max_size:
+                evicted_hash, _ = self._statuses.popitem(last=False)
+                self._remove_children(evicted_hash)
+                self._remove_from_parent(evicted_hash)
+
+    def _remove_children(self, parent_hash):
+        for child_hash in self._children.pop(parent_hash, ()):
+            self._parents.pop(child_hash, None)
+
+    def _remove_from_parent(self, collation_hash):
+        parent_hash = self._parents.pop(collation_hash, None)
+        if parent_hash not in self._children:
+            return
+        children = self._children[parent_hash]
+        children.discard(collation_hash)
+        if len(children) == 0:
+            del self._children[parent_hash]
+
+    def _add_child(self, parent_hash, collation_hash):
+        self._remove_from_parent(collation_hash)
+        if parent_hash in self._children:
+            self._children.move_to_end(parent_hash)
+        else:
+            self._children[parent_hash] = set()
+            if len(self._children) > self.max_size:
+                evicted_parent_hash, _ = self._children.popitem(last=False)
+                self._remove_children(evicted_parent_hash)
+        self._children[parent_hash].add(collation_hash)
+        self._parents[collation_hash] = parent_hash
+
+    def get(self, collation_hash):
+        """Return the validity status of the collation, or None if it is unknown
+        """
+        if collation_hash not in self._statuses:
+            return None
+        self._statuses.move_to_end(collation_hash)
+        return self._statuses[collation_hash]
+
+    def add_collation(self, collation_hash, parent_hash):
+        """Record the parent of the collation, inheriting the invalidity of the parent
+        """
+        self._touch(collation_hash)
+        self._add_child(parent_hash, collation_hash)
+        if self._statuses.get(parent_hash) == INVALID:
+            self.set_status(collation_hash, INVALID)
+
+    def set_status(self, collation_hash, status):
+        if status not in VALIDITY_STATUSES:
+            raise ValueError("Unknown validity status: {0}".format(status))
+        self._touch(collation_hash)
+        if status != INVALID:
+            # an invalid collation stays invalid
+            if self._statuses[collation_hash] != INVALID:
+                self._statuses[collation_hash] = status
+            return
+        # propagate the invalidity to the known descendants
+        pending_hashes = [collation_hash]
+        while len(pending_hashes) != 0:
+            invalid_hash = pending_hashes.pop()
+            if invalid_hash in self._statuses:
+                self._statuses[invalid_hash] = INVALID
+            pending_hashes.extend(self._children.get(invalid_hash, ()))
+
+
+def memoized_fetch_and_verify_collation(validity_cache,
+                                        collation_header,
+                                        fetch_and_verify_collation):
+    """Return the validity status of the collation, calling `fetch_and_verify_collation` only
+    if it is not known by `validity_cache` yet, or it was unavailable.
+    `fetch_and_verify_collation` returns a validity status, or whether the collation is valid
+    """
+    collation_hash = collation_header.hash
+    status = validity_cache.get(collation_hash)
+    if status in (VALID, INVALID):
+        return status
+    validity_cache.add_collation(collation_hash, collation_header.parent_hash)
+    status = validity_cache.get(collation_hash)
+    if status == INVALID:
+        return status
+    status = to_validity_status(fetch_and_verify_collation(collation_header))
+    validity_cache.set_status(collation_hash, status)
+    return status
+
+
+def guess_head(candidate_heads,
+               get_parent,
+               fetch_and_verify_collation,
+               validity_cache,
+               max_depth=None):
+    """`GUESS_HEAD` of doc.md. Walk back from each candidate head in `candidate_heads`, e.g.
+    `ShardTracker.iter_candidate_heads()`, and return the first one whose ancestors are all
+    valid, up to the genesis, where `get_parent` returns None, or up to `max_depth` ancestors.
+    Return None if there is no such candidate head
+    """
+    for candidate_head in candidate_heads:
+        header = candidate_head['header']
+        depth = 0
+        while True:
+            status = memoized_fetch_and_verify_collation(
+                validity_cache,
+                header,
+                fetch_and_verify_collation,
+            )
+            if status != VALID:
+                break
+            depth += 1
+            if max_depth is not None and depth > max_depth:
+                return candidate_head
+            header = get_parent(header)
+            if header is None:
+                return candidate_head
+    return None
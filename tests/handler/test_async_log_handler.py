@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from handler.async_log_handler import (
+    AsyncLogHandler,
+)
+from handler.log_handler import (
+    LogHandler,
+)
+from handler.utils.web3_utils import (
+    mine,
+    take_snapshot,
+    revert_to_snapshot,
+)
+
+from tests.handler.test_log_handler import (  # noqa: F401
+    contract,
+    default_tx_detail,
+)
+
+
+@pytest.mark.asyncio  # noqa: F811
+async def test_async_log_handler_polling(contract, event_loop):
+    w3 = contract.web3
+    async_log_handler = AsyncLogHandler(LogHandler(w3), poll_interval=0.01, loop=event_loop)
+    subscription = async_log_handler.subscribe(address=contract.address)
+    assert subscription.get_log_delta() == (tuple(), tuple())
+    async_log_handler.start()
+    assert async_log_handler.is_running
+    with pytest.raises(ValueError):
+        async_log_handler.start()
+
+    snapshot_id = take_snapshot(w3)
+    contract.transact(default_tx_detail).emit_log(0)
+    mine(w3, 1)
+    removed_logs, added_logs = await asyncio.wait_for(subscription.wait_log_delta(), 5)
+    assert removed_logs == tuple()
+    assert tuple(int(log['data'], 16) for log in added_logs) == (0,)
+
+    revert_to_snapshot(w3, snapshot_id)
+    contract.transact(default_tx_detail).emit_log(1)
+    mine(w3, 2)
+    removed_logs, added_logs = await asyncio.wait_for(subscription.wait_log_delta(), 5)
+    assert tuple(int(log['data'], 16) for log in removed_logs) == (0,)
+    assert tuple(int(log['data'], 16) for log in added_logs) == (1,)
+
+    await async_log_handler.stop()
+    assert not async_log_handler.is_running
+    # stopping twice is fine
+    await async_log_handler.stop()
+
+
+@pytest.mark.asyncio  # noqa: F811
+async def test_async_log_handler_poll(contract, event_loop):
+    w3 = contract.web3
+    async_log_handler = AsyncLogHandler(LogHandler(w3), loop=event_loop)
+    subscription = async_log_handler.subscribe(address=contract.address)
+    for i in range(2):
+        contract.transact(default_tx_detail).emit_log(i)
+        mine(w3, 1)
+        await async_log_handler.poll()
+    # the queued deltas are merged
+    logs = subscription.get_new_logs()
+    assert tuple(int(log['data'], 16) for log in logs) == (0, 1)
+    assert subscription.get_new_logs() == tuple()
+    async_log_handler.unsubscribe(subscription)
+    assert len(async_log_handler.log_handler.subscriptions) == 0
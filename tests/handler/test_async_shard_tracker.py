@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from handler.async_log_handler import (
+    AsyncLogHandler,
+)
+from handler.async_shard_tracker import (
+    AsyncShardTracker,
+)
+from handler.log_handler import (
+    LogHandler,
+)
+from handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.handler.fixtures import (  # noqa: F401
+    smc_handler,
+)
+from tests.handler.test_shard_tracker import (
+    COLLATION_ADDED_LOG_0,
+    COLLATION_ADDED_LOG_1,
+)
+
+
+@pytest.mark.asyncio  # noqa: F811
+async def test_async_shard_tracker_wait_for_candidate_head(smc_handler,
+                                                           event_loop,
+                                                           monkeypatch):
+    w3 = smc_handler.web3
+    mock_logs = [
+        [dict(COLLATION_ADDED_LOG_0, address=smc_handler.address)],
+        [dict(COLLATION_ADDED_LOG_1, address=smc_handler.address)],
+    ]
+    monkeypatch.setattr(
+        w3.eth,
+        'getLogs',
+        lambda filter_params: mock_logs.pop(0) if len(mock_logs) != 0 else [],
+    )
+    async_log_handler = AsyncLogHandler(LogHandler(w3), poll_interval=0.01, loop=event_loop)
+    shard_tracker = AsyncShardTracker(0, async_log_handler, smc_handler.address)
+    async_log_handler.start()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await shard_tracker.wait_for_candidate_head(timeout=0.05)
+        mine(w3, 1)
+        log = await shard_tracker.wait_for_candidate_head(timeout=5)
+        assert log['score'] == 1
+        mine(w3, 1)
+        log = await shard_tracker.wait_for_next_log(timeout=5)
+        assert log['score'] == 2
+        with pytest.raises(asyncio.TimeoutError):
+            await shard_tracker.wait_for_next_log(timeout=0.05)
+    finally:
+        await async_log_handler.stop()
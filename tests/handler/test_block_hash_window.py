@@ -0,0 +1,69 @@
+import pytest
+
+from handler.utils.block_hash_window import (
+    BlockHashWindow,
+)
+
+
+def make_hashes(numbers):
+    return tuple(number.to_bytes(32, byteorder='big') for number in numbers)
+
+
+@pytest.mark.parametrize(
+    'capacity',
+    (0, -1, None),
+)
+def test_block_hash_window_invalid_capacity(capacity):
+    with pytest.raises(ValueError):
+        BlockHashWindow(capacity)
+
+
+def test_block_hash_window_append_and_evict():
+    window = BlockHashWindow(3)
+    assert len(window) == 0
+    assert tuple(window) == tuple()
+    hashes = make_hashes(range(5))
+    assert window.append(hashes[0]) is None
+    assert window.extend(hashes[1:3]) == tuple()
+    assert tuple(window) == hashes[:3]
+    assert window.append(hashes[3]) == hashes[0]
+    assert window.extend(hashes[4:]) == hashes[1:2]
+    assert tuple(window) == hashes[2:]
+    assert len(window) == 3
+    assert hashes[0] not in window
+    assert hashes[1] not in window
+    assert hashes[2] in window
+
+
+def test_block_hash_window_index_and_getitem():
+    hashes = make_hashes(range(6))
+    window = BlockHashWindow(4, hashes)
+    assert window.index(hashes[2]) == 0
+    assert window.index(hashes[5]) == 3
+    with pytest.raises(ValueError):
+        window.index(hashes[0])
+    assert window[0] == hashes[2]
+    assert window[-1] == hashes[5]
+    with pytest.raises(IndexError):
+        window[4]
+    with pytest.raises(IndexError):
+        window[-5]
+    assert window[1:] == hashes[3:]
+    assert window[:-1] == hashes[2:5]
+    assert window[window.index(hashes[3]) + 1:] == hashes[4:]
+
+
+def test_block_hash_window_truncate():
+    hashes = make_hashes(range(6))
+    window = BlockHashWindow(4, hashes)
+    assert window.truncate(4) == tuple()
+    assert window.truncate(2) == hashes[4:]
+    assert tuple(window) == hashes[2:4]
+    assert hashes[4] not in window
+    # the window keeps working over the wrapped ring buffer after a truncation
+    new_hashes = make_hashes(range(10, 13))
+    assert window.extend(new_hashes) == hashes[2:3]
+    assert tuple(window) == hashes[3:4] + new_hashes
+    assert window.index(new_hashes[-1]) == 3
+    assert window.truncate(0) == hashes[3:4] + new_hashes
+    assert len(window) == 0
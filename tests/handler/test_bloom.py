@@ -0,0 +1,54 @@
+import pytest
+
+from eth_utils import (
+    encode_hex,
+)
+
+from handler.utils.bloom import (
+    get_bloom_mask,
+    is_filter_in_bloom,
+    is_value_in_bloom,
+)
+
+
+ADDRESS = b'\x11' * 20
+TOPIC_0 = b'\xaa' * 32
+TOPIC_1 = b'\xbb' * 32
+OTHER_TOPIC = b'\xcc' * 32
+LOGS_BLOOM = get_bloom_mask(ADDRESS) | get_bloom_mask(TOPIC_0) | get_bloom_mask(TOPIC_1)
+
+
+def test_get_bloom_mask():
+    bloom_mask = get_bloom_mask(ADDRESS)
+    assert 0 < bloom_mask < 2 ** 2048
+    assert 1 <= bin(bloom_mask).count('1') <= 3
+
+
+@pytest.mark.parametrize(
+    'value, expected',
+    (
+        (ADDRESS, True),
+        (encode_hex(ADDRESS), True),
+        (TOPIC_1, True),
+        (OTHER_TOPIC, False),
+    )
+)
+def test_is_value_in_bloom(value, expected):
+    assert is_value_in_bloom(LOGS_BLOOM, value) == expected
+
+
+@pytest.mark.parametrize(
+    'address, topics, expected',
+    (
+        (None, None, True),
+        (ADDRESS, None, True),
+        (b'\x22' * 20, None, False),
+        (ADDRESS, [TOPIC_0, TOPIC_1], True),
+        (ADDRESS, [None, encode_hex(TOPIC_1)], True),
+        (ADDRESS, [TOPIC_0, OTHER_TOPIC], False),
+        (ADDRESS, [TOPIC_0, [OTHER_TOPIC, TOPIC_1]], True),
+        (ADDRESS, [[OTHER_TOPIC]], False),
+    )
+)
+def test_is_filter_in_bloom(address, topics, expected):
+    assert is_filter_in_bloom(LOGS_BLOOM, address, topics) == expected
@@ -0,0 +1,209 @@
+import json
+
+import pytest
+
+from contracts.utils.headers import (
+    CollationHeader,
+)
+from handler.checkpoint import (
+    InvalidCheckpoint,
+    load_checkpoint,
+    make_checkpoint,
+    make_shard_tracker_checkpoint,
+    restore_shard_tracker,
+    save_checkpoint,
+)
+from handler.log_handler import (
+    LogHandler,
+    LogSubscription,
+    get_recent_block_hashes,
+)
+from handler.shard_tracker import (
+    ShardTracker,
+)
+from handler.utils.score_indexed_logs import (
+    ScoreIndexedLogs,
+)
+from handler.utils.web3_utils import (
+    mine,
+    take_snapshot,
+    revert_to_snapshot,
+)
+
+from tests.handler.test_log_handler import (  # noqa: F401
+    HISTORY_SIZE,
+    contract,
+    default_tx_detail,
+)
+from tests.handler.test_shard_tracker import (
+    COLLATION_ADDED_LOG_0,
+    COLLATION_ADDED_LOG_1,
+)
+
+
+def make_log_entry(score, is_new_head):
+    return {
+        'header': CollationHeader(0, score, b'\x01' * 32, b'\x02' * 32, score),
+        'is_new_head': is_new_head,
+        'score': score,
+    }
+
+
+def test_checkpoint_warm_restart(contract, tmpdir, monkeypatch):  # noqa: F811
+    w3 = contract.web3
+    path = str(tmpdir.join('checkpoint.json'))
+    assert load_checkpoint(path) is None
+
+    log_handler = LogHandler(w3)
+    shard_tracker = ShardTracker(0, log_handler, contract.address)
+    shard_tracker.new_logs = [make_log_entry(1, True), make_log_entry(2, True)]
+    shard_tracker.unchecked_logs = ScoreIndexedLogs([make_log_entry(1, False)])
+    shard_tracker.current_score = 3
+    mine(w3, 2)
+    log_handler.get_new_logs(address=contract.address)
+    save_checkpoint(path, log_handler, (shard_tracker,))
+    checkpoint = load_checkpoint(path)
+    assert checkpoint['last_block_number'] == w3.eth.blockNumber
+    assert checkpoint['caught_up_block_number'] is None
+
+    contract.transact(default_tx_detail).emit_log(0)
+    mine(w3, 1)
+    get_block_calls = []
+    get_block = w3.eth.getBlock
+
+    def counting_get_block(block_identifier):
+        get_block_calls.append(block_identifier)
+        return get_block(block_identifier)
+
+    monkeypatch.setattr(w3.eth, 'getBlock', counting_get_block)
+    restored_log_handler = LogHandler.from_checkpoint(w3, checkpoint)
+    # only the tip is verified instead of walking the window
+    assert len(get_block_calls) == 1
+    assert tuple(restored_log_handler.recent_block_hashes) == tuple(
+        log_handler.recent_block_hashes
+    )
+    logs = restored_log_handler.get_new_logs(address=contract.address)
+    assert tuple(int(log['data'], 16) for log in logs) == (0,)
+
+    restored_shard_tracker = ShardTracker(1, restored_log_handler, contract.address)
+    assert not restore_shard_tracker(restored_shard_tracker, checkpoint)
+    restored_shard_tracker = ShardTracker(0, restored_log_handler, contract.address)
+    assert restore_shard_tracker(restored_shard_tracker, checkpoint)
+    assert restored_shard_tracker.current_score == 3
+    assert restored_shard_tracker.new_logs == shard_tracker.new_logs
+    assert tuple(restored_shard_tracker.unchecked_logs) == tuple(shard_tracker.unchecked_logs)
+
+
+def test_checkpoint_catch_up_stopped_part_way(contract):  # noqa: F811
+    w3 = contract.web3
+    log_handler = LogHandler(w3)
+    for i in range(4):
+        contract.transact(default_tx_detail).emit_log(i)
+        mine(w3, 1)
+    logs = log_handler.catch_up(address=contract.address, chunk_size=2, max_workers=1)
+    for _ in range(3):
+        next(logs)
+    logs.close()
+    checkpoint = make_checkpoint(log_handler)
+    assert checkpoint['caught_up_block_number'] == log_handler.caught_up_block_number
+    # resume the catch-up where it stopped
+    restored_log_handler = LogHandler.from_checkpoint(w3, checkpoint)
+    logs = tuple(restored_log_handler.catch_up(address=contract.address))
+    assert tuple(int(log['data'], 16) for log in logs) == (2, 3)
+
+
+def test_checkpoint_reorged_tip(contract):  # noqa: F811
+    w3 = contract.web3
+    snapshot_id = take_snapshot(w3)
+    mine(w3, 2)
+    checkpoint = make_checkpoint(LogHandler(w3))
+    revert_to_snapshot(w3, snapshot_id)
+    contract.transact(default_tx_detail).emit_log(0)
+    mine(w3, 3)
+    # the reorg below the tip is handled after resuming
+    restored_log_handler = LogHandler.from_checkpoint(w3, checkpoint)
+    logs = restored_log_handler.get_new_logs(address=contract.address)
+    assert tuple(int(log['data'], 16) for log in logs) == (0,)
+    assert tuple(restored_log_handler.recent_block_hashes) == get_recent_block_hashes(
+        w3,
+        HISTORY_SIZE,
+    )
+
+
+def test_checkpoint_revokes_logs_reorged_while_down(contract):  # noqa: F811
+    w3 = contract.web3
+    log_handler = LogHandler(w3)
+    log_handler.get_new_logs(address=contract.address)
+    snapshot_id = take_snapshot(w3)
+    contract.transact(default_tx_detail).emit_log(7)
+    mine(w3, 1)
+    assert len(log_handler.get_new_logs(address=contract.address)) == 1
+    checkpoint = json.loads(json.dumps(make_checkpoint(log_handler)))
+
+    # the tip is still known by the chain, but not canonical anymore
+    revert_to_snapshot(w3, snapshot_id)
+    mine(w3, 2)
+    restored_log_handler = LogHandler.from_checkpoint(w3, checkpoint)
+    assert len(restored_log_handler.resumed_removed_logs) == 1
+    removed_logs, added_logs = restored_log_handler.get_log_delta(address=contract.address)
+    assert tuple(int(log['data'], 16) for log in removed_logs) == (7,)
+    assert added_logs == tuple()
+    assert restored_log_handler.resumed_removed_logs == tuple()
+    assert tuple(restored_log_handler.recent_block_hashes) == get_recent_block_hashes(
+        w3,
+        HISTORY_SIZE,
+    )
+
+
+class SubscribingLogHandler:
+
+    def subscribe(self, address=None, topics=None):
+        return LogSubscription(self, address=address, topics=topics)
+
+
+def test_make_shard_tracker_checkpoint_pending_logs():
+    shard_tracker = ShardTracker(0, SubscribingLogHandler(), COLLATION_ADDED_LOG_0['address'])
+    shard_tracker.new_logs = [make_log_entry(1, True)]
+    shard_tracker.log_subscription.push_log_delta(
+        tuple(),
+        (COLLATION_ADDED_LOG_0, COLLATION_ADDED_LOG_1),
+    )
+    shard_tracker_checkpoint = make_shard_tracker_checkpoint(shard_tracker)
+    assert len(shard_tracker_checkpoint['new_logs']) == 3
+    # the tracker is not changed
+    assert shard_tracker.new_logs == [make_log_entry(1, True)]
+    assert len(shard_tracker.log_subscription.added_logs) == 2
+
+    shard_tracker.log_subscription.push_log_delta((COLLATION_ADDED_LOG_1,), tuple())
+    shard_tracker_checkpoint = make_shard_tracker_checkpoint(shard_tracker)
+    assert [
+        log_entry['score']
+        for log_entry in shard_tracker_checkpoint['new_logs']
+    ] == [1, 1]
+
+
+def test_checkpoint_unknown_block_hashes(contract):  # noqa: F811
+    w3 = contract.web3
+    mine(w3, 2)
+    checkpoint = make_checkpoint(LogHandler(w3))
+    checkpoint['recent_block_hashes'][-1] = '0x' + '00' * 32
+    restored_log_handler = LogHandler.from_checkpoint(w3, checkpoint)
+    assert tuple(restored_log_handler.recent_block_hashes) == get_recent_block_hashes(
+        w3,
+        HISTORY_SIZE,
+    )[:-1]
+    # cold start if the chain knows none of them
+    checkpoint['recent_block_hashes'] = ['0x' + '00' * 32]
+    restored_log_handler = LogHandler.from_checkpoint(w3, checkpoint)
+    assert tuple(restored_log_handler.recent_block_hashes) == get_recent_block_hashes(
+        w3,
+        HISTORY_SIZE,
+    )
+
+
+def test_load_checkpoint_invalid_version(tmpdir):
+    path = str(tmpdir.join('checkpoint.json'))
+    with open(path, 'w') as f:
+        json.dump({'version': 0}, f)
+    with pytest.raises(InvalidCheckpoint):
+        load_checkpoint(path)
@@ -0,0 +1,80 @@
+import time
+
+from contracts.utils.headers import (
+    CollationHeader,
+)
+from handler.shard_tracker import (
+    parse_collation_added_log,
+)
+from handler.utils.collation_added_logs import (
+    LazyCollationHeader,
+    materialize_log_entries,
+    parse_collation_added_logs,
+)
+
+from tests.handler.test_shard_tracker import (
+    COLLATION_ADDED_LOG_0,
+    COLLATION_ADDED_LOG_1,
+)
+
+
+BENCHMARK_LOG_COUNT = 20000
+# logs per second on one core
+MIN_THROUGHPUT = 100000
+
+
+def test_parse_collation_added_logs():
+    logs = (COLLATION_ADDED_LOG_0, COLLATION_ADDED_LOG_1)
+    log_entries = parse_collation_added_logs(logs)
+    assert len(log_entries) == 2
+    for log, log_entry in zip(logs, log_entries):
+        expected_log_entry = parse_collation_added_log(log)
+        assert isinstance(log_entry['header'], LazyCollationHeader)
+        assert log_entry['is_new_head'] == expected_log_entry['is_new_head']
+        assert log_entry['score'] == expected_log_entry['score']
+        expected_header = expected_log_entry['header']
+        for field_name, _ in expected_header.fields:
+            assert getattr(log_entry['header'], field_name) == getattr(expected_header, field_name)
+        assert log_entry['header'].hash == expected_header.hash
+        assert log_entry['header'].materialize() == expected_header
+    materialize_log_entries(log_entries)
+    for log, log_entry in zip(logs, log_entries):
+        assert type(log_entry['header']) is CollationHeader
+        assert log_entry['header'] == parse_collation_added_log(log)['header']
+
+
+def test_parse_collation_added_logs_hex_topic():
+    log = dict(
+        COLLATION_ADDED_LOG_0,
+        topics=['0x' + COLLATION_ADDED_LOG_0['topics'][0].hex(), '0x' + '00' * 31 + '03'],
+    )
+    log_entry, = parse_collation_added_logs((log,))
+    assert log_entry['header'].shard_id == 3
+
+
+def test_parse_collation_added_logs_unprefixed_data():
+    log = dict(COLLATION_ADDED_LOG_1, data=COLLATION_ADDED_LOG_1['data'][2:])
+    log_entry, = parse_collation_added_logs((log,))
+    expected_header = parse_collation_added_log(COLLATION_ADDED_LOG_1)['header']
+    assert log_entry['header'].materialize() == expected_header
+
+
+def test_parse_collation_added_logs_throughput():
+    logs = [
+        (COLLATION_ADDED_LOG_0, COLLATION_ADDED_LOG_1)[idx % 2]
+        for idx in range(BENCHMARK_LOG_COUNT)
+    ]
+    start = time.perf_counter()
+    log_entries = parse_collation_added_logs(logs)
+    duration = time.perf_counter() - start
+    assert len(log_entries) == BENCHMARK_LOG_COUNT
+    assert BENCHMARK_LOG_COUNT / duration > MIN_THROUGHPUT
+
+
+def test_parse_collation_added_logs_bytes_data():
+    log = dict(COLLATION_ADDED_LOG_1, data=bytes.fromhex(COLLATION_ADDED_LOG_1['data'][2:]))
+    log_entry, = parse_collation_added_logs((log,))
+    expected_log_entry = parse_collation_added_log(COLLATION_ADDED_LOG_1)
+    assert log_entry['is_new_head'] == expected_log_entry['is_new_head']
+    assert log_entry['score'] == expected_log_entry['score']
+    assert log_entry['header'].materialize() == expected_log_entry['header']
@@ -0,0 +1,109 @@
+import pytest
+
+from handler.collation_read_cache import (
+    CollationReadCache,
+    CollationReadEntry,
+)
+from handler.shard_tracker import (
+    parse_collation_added_log,
+)
+from handler.smc_handler import (
+    unpack_collation_header_entry,
+)
+
+from tests.handler.fixtures import (  # noqa: F401
+    smc_handler,
+)
+from tests.handler.test_shard_tracker import (
+    COLLATION_ADDED_LOG_0,
+    COLLATION_ADDED_LOG_1,
+    DeltaLogHandler,
+)
+
+
+HEADER_0 = parse_collation_added_log(COLLATION_ADDED_LOG_0)['header']
+HEADER_1 = parse_collation_added_log(COLLATION_ADDED_LOG_1)['header']
+HASH_A = b'\x0a' * 32
+HASH_B = b'\x0b' * 32
+
+
+def make_read_cache(deltas, max_size=4096):
+    return CollationReadCache(
+        DeltaLogHandler(deltas),
+        COLLATION_ADDED_LOG_0['address'],
+        max_size=max_size,
+    )
+
+
+def test_collation_read_cache():
+    read_cache = make_read_cache((
+        (tuple(), (COLLATION_ADDED_LOG_0, COLLATION_ADDED_LOG_1)),
+    ))
+    assert read_cache.get(0, HEADER_1.hash) is None
+    assert read_cache.poll() == 2
+    assert len(read_cache) == 2
+    assert read_cache.get(0, HEADER_1.hash) == CollationReadEntry(
+        score=2,
+        parent_hash=HEADER_1.parent_hash,
+        block_number=COLLATION_ADDED_LOG_1['blockNumber'],
+        from_log=True,
+    )
+    # the same hash in another shard is another header
+    assert read_cache.get(1, HEADER_1.hash) is None
+    # the headers not added yet are not cached
+    read_cache.add(0, HASH_A, 0, b'\x00' * 32, 40)
+    assert (0, HASH_A) not in read_cache
+    # the entries of the logs are kept over the ones of the getters
+    read_cache.add(0, HEADER_0.hash, 1, HEADER_0.parent_hash, 40)
+    assert read_cache.get(0, HEADER_0.hash).from_log
+
+    with pytest.raises(ValueError):
+        make_read_cache((), max_size=0)
+
+
+def test_collation_read_cache_lru():
+    read_cache = make_read_cache((), max_size=2)
+    read_cache.add(0, HASH_A, 1, b'\x00' * 32, 10)
+    read_cache.add(0, HASH_B, 2, HASH_A, 11)
+    read_cache.get(0, HASH_A)
+    read_cache.add(1, HASH_A, 1, b'\x00' * 32, 12)
+    assert (0, HASH_A) in read_cache
+    assert (0, HASH_B) not in read_cache
+    assert (1, HASH_A) in read_cache
+
+
+def test_collation_read_cache_reorg():
+    read_cache = make_read_cache((
+        (tuple(), (COLLATION_ADDED_LOG_0, COLLATION_ADDED_LOG_1)),
+        ((COLLATION_ADDED_LOG_1,), tuple()),
+    ))
+    read_cache.poll()
+    # read by the getters before the reorg, at a block below and above the revoked log
+    read_cache.add(1, HASH_A, 1, b'\x00' * 32, COLLATION_ADDED_LOG_1['blockNumber'] - 1)
+    read_cache.add(1, HASH_B, 2, HASH_A, COLLATION_ADDED_LOG_1['blockNumber'])
+    read_cache.poll()
+    assert read_cache.get(0, HEADER_1.hash) is None
+    assert read_cache.get(0, HEADER_0.hash) is not None
+    assert read_cache.get(1, HASH_A) is not None
+    assert read_cache.get(1, HASH_B) is None
+
+
+def test_unpack_collation_header_entry():
+    # the collation hashes have 6 leading zero bytes
+    parent_hash = b'\x00' * 6 + b'\x11' * 26
+    entry = parent_hash[6:] + (2).to_bytes(6, 'big')
+    assert unpack_collation_header_entry(entry) == (2, parent_hash)
+    assert unpack_collation_header_entry(b'\x00' * 32) == (0, b'\x00' * 32)
+
+
+def test_smc_handler_read_cache(smc_handler):  # noqa: F811
+    read_cache = make_read_cache(())
+    smc_handler.read_cache = read_cache
+    # the headers not added are read from the contract every time
+    assert smc_handler.get_collation_score(0, HASH_A) == 0
+    assert smc_handler.get_parent_hash(0, HASH_A) == b'\x00' * 32
+    assert len(read_cache) == 0
+    # the cached headers need no call
+    read_cache.add(0, HASH_B, 3, HASH_A, smc_handler.web3.eth.blockNumber)
+    assert smc_handler.get_collation_score(0, HASH_B) == 3
+    assert smc_handler.get_parent_hash(0, HASH_B) == HASH_A
@@ -0,0 +1,219 @@
+from concurrent.futures import (
+    Executor,
+    Future,
+)
+import random
+import time
+
+import pytest
+
+from handler.guess_head_pipeline import (
+    GuessHeadPipeline,
+)
+from handler.validity_cache import (
+    INVALID,
+    ValidityCache,
+    guess_head,
+)
+
+from tests.handler.test_validity_cache import (
+    make_chain,
+)
+
+
+def make_headers_by_hash(*chains):
+    return {
+        header.hash: header
+        for chain in chains
+        for header in chain
+    }
+
+
+def make_candidate_heads(headers_by_hash, hashes):
+    return tuple(
+        {'header': headers_by_hash[collation_hash]}
+        for collation_hash in hashes
+    )
+
+
+@pytest.mark.parametrize(
+    'invalid_hashes, candidate_hashes, max_depth',
+    (
+        ((b'x',), (b'z', b'y', b'c'), None),
+        ((b'x', b'b'), (b'z', b'y', b'c', b'a'), None),
+        ((b'a',), (b'z', b'c'), None),
+        ((b'x',), (b'z', b'c'), 1),
+        ((), (b'z', b'c'), 0),
+        ((), (), None),
+    )
+)
+def test_guess_head_pipeline_same_as_guess_head(invalid_hashes, candidate_hashes, max_depth):
+    # genesis <- a <- b <- c, and a <- x <- y <- z
+    headers_by_hash = make_headers_by_hash(
+        make_chain((b'a', b'b', b'c')),
+        make_chain((b'x', b'y', b'z'), parent_hash=b'a'),
+    )
+    candidate_heads = make_candidate_heads(headers_by_hash, candidate_hashes)
+
+    def get_parent(header):
+        return headers_by_hash.get(header.parent_hash)
+
+    def fetch_and_verify_collation(header):
+        return header.hash not in invalid_hashes
+
+    expected_head = guess_head(
+        candidate_heads,
+        get_parent,
+        fetch_and_verify_collation,
+        ValidityCache(),
+        max_depth=max_depth,
+    )
+    pipeline = GuessHeadPipeline(get_parent, fetch_and_verify_collation, ValidityCache())
+    assert pipeline.guess_head(candidate_heads, max_depth=max_depth) == expected_head
+
+
+def test_guess_head_pipeline_reaching_genesis_one_by_one():
+    header, = make_chain((b'a',))
+    pipeline = GuessHeadPipeline(
+        lambda header: None,
+        lambda header: True,
+        ValidityCache(),
+        ancestor_lookahead=1,
+    )
+    assert pipeline.guess_head(({'header': header},)) == {'header': header}
+
+
+def make_random_tree(rng, header_count):
+    headers = []
+    for idx in range(header_count):
+        if len(headers) == 0 or rng.random() < 0.2:
+            parent_hash = b'genesis'
+        else:
+            parent_hash = rng.choice(headers).hash
+        header, = make_chain((bytes([idx]),), parent_hash=parent_hash)
+        headers.append(header)
+    return headers
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_guess_head_pipeline_same_as_guess_head_randomized(seed):
+    rng = random.Random(seed)
+    headers = make_random_tree(rng, rng.randint(1, 12))
+    headers_by_hash = make_headers_by_hash(headers)
+    invalid_hashes = set(
+        header.hash
+        for header in headers
+        if rng.random() < 0.3
+    )
+    candidate_heads = tuple(
+        {'header': header}
+        for header in rng.sample(headers, rng.randint(1, len(headers)))
+    )
+    max_depth = rng.choice((None, 0, 1, 2))
+
+    def get_parent(header):
+        return headers_by_hash.get(header.parent_hash)
+
+    def fetch_and_verify_collation(header):
+        return header.hash not in invalid_hashes
+
+    expected_head = guess_head(
+        candidate_heads,
+        get_parent,
+        fetch_and_verify_collation,
+        ValidityCache(),
+        max_depth=max_depth,
+    )
+    pipeline = GuessHeadPipeline(
+        get_parent,
+        fetch_and_verify_collation,
+        ValidityCache(),
+        ancestor_lookahead=rng.randint(1, 4),
+        candidate_lookahead=rng.randint(0, 3),
+        executor=rng.choice((LazyExecutor(), EagerExecutor())),
+    )
+    assert pipeline.guess_head(candidate_heads, max_depth=max_depth) == expected_head
+
+
+def test_guess_head_pipeline_concurrent_verification():
+    chain = make_chain(tuple(bytes([idx]) for idx in range(6)))
+    headers_by_hash = make_headers_by_hash(chain)
+    verification_time = 0.2
+
+    def fetch_and_verify_collation(header):
+        time.sleep(verification_time)
+        return True
+
+    pipeline = GuessHeadPipeline(
+        lambda header: headers_by_hash.get(header.parent_hash),
+        fetch_and_verify_collation,
+        ValidityCache(),
+        max_workers=6,
+        ancestor_lookahead=6,
+    )
+    start = time.perf_counter()
+    head = pipeline.guess_head(({'header': chain[-1]},))
+    duration = time.perf_counter() - start
+    assert head['header'] is chain[-1]
+    # far less than verifying them one by one
+    assert duration < verification_time * len(chain) / 2
+
+
+class LazyFuture(Future):
+    """A future running its call when its result is asked for
+    """
+
+    def __init__(self, fn, args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+
+    def result(self, timeout=None):
+        if self.set_running_or_notify_cancel():
+            self.set_result(self.fn(*self.args))
+        return super().result(timeout)
+
+
+class LazyExecutor(Executor):
+
+    def submit(self, fn, *args):
+        return LazyFuture(fn, args)
+
+
+class EagerExecutor(Executor):
+    """Run the call right away, so all the verifications ahead are done before any check
+    """
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_guess_head_pipeline_cancel_invalid_branch():
+    # genesis <- a <- b <- c, and genesis <- x <- y
+    headers_by_hash = make_headers_by_hash(
+        make_chain((b'a', b'b', b'c')),
+        make_chain((b'x', b'y')),
+    )
+    verified_hashes = []
+
+    def fetch_and_verify_collation(header):
+        verified_hashes.append(header.hash)
+        return header.hash not in (b'c', b'x')
+
+    validity_cache = ValidityCache()
+    pipeline = GuessHeadPipeline(
+        lambda header: headers_by_hash.get(header.parent_hash),
+        fetch_and_verify_collation,
+        validity_cache,
+        ancestor_lookahead=2,
+        executor=LazyExecutor(),
+    )
+    candidate_heads = make_candidate_heads(headers_by_hash, (b'c', b'y'))
+    assert pipeline.guess_head(candidate_heads) is None
+    assert validity_cache.get(b'c') == INVALID
+    assert validity_cache.get(b'y') == INVALID
+    # the verification of `b` is cancelled once `c` is invalid
+    assert verified_hashes == [b'c', b'y', b'x']
@@ -0,0 +1,116 @@
+import pytest
+
+from eth_utils import (
+    encode_hex,
+)
+
+from handler.log_handler import (
+    LogHandler,
+)
+from handler.utils.header_cache import (
+    BlockHeaderCache,
+    get_logs_bloom,
+    is_block_hash,
+)
+from handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.handler.test_log_handler import (  # noqa: F401
+    contract,
+    default_tx_detail,
+)
+
+
+@pytest.mark.parametrize(
+    'block_identifier, expected',
+    (
+        (b'\x01' * 32, True),
+        ('0x' + '01' * 32, True),
+        (b'\x01' * 31, False),
+        ('0x' + '01' * 31, False),
+        ('latest', False),
+        (1, False),
+    )
+)
+def test_is_block_hash(block_identifier, expected):
+    assert is_block_hash(block_identifier) == expected
+
+
+@pytest.mark.parametrize(
+    'block, expected',
+    (
+        ({'logsBloom': 5}, 5),
+        ({'logsBloom': b'\x01\x00'}, 256),
+        ({'logsBloom': '0x0100'}, 256),
+        ({'logs_bloom': 3}, 3),
+    )
+)
+def test_get_logs_bloom(block, expected):
+    assert get_logs_bloom(block) == expected
+
+
+def test_block_header_cache(contract):  # noqa: F811
+    w3 = contract.web3
+    mine(w3, 3)
+    header_cache = BlockHeaderCache(w3, max_size=2)
+    block2 = w3.eth.getBlock(2)
+    block3 = w3.eth.getBlock(3)
+    header = header_cache.get_block(3)
+    assert header == {
+        'hash': block3['hash'],
+        'number': 3,
+        'parentHash': block3['parentHash'],
+        'logsBloom': get_logs_bloom(block3),
+    }
+    assert (header_cache.hits, header_cache.misses) == (0, 1)
+    # lookups by number always go to the chain
+    header_cache.get_block(3)
+    assert (header_cache.hits, header_cache.misses) == (0, 2)
+    assert header_cache.get_block(block3['hash']) == header
+    assert header_cache.get_block(encode_hex(block3['hash'])) == header
+    assert (header_cache.hits, header_cache.misses) == (2, 2)
+    assert header_cache.get_block(b'\x00' * 32) is None
+    assert (header_cache.hits, header_cache.misses) == (2, 3)
+
+    header_cache.get_blocks((1, 2))
+    assert (header_cache.hits, header_cache.misses) == (2, 5)
+    # the least recently used one is evicted
+    assert len(header_cache) == 2
+    assert block3['hash'] not in header_cache
+    assert block2['hash'] in header_cache
+
+
+def test_block_header_cache_invalid_max_size(contract):  # noqa: F811
+    with pytest.raises(ValueError):
+        BlockHeaderCache(contract.web3, max_size=0)
+
+
+def test_log_handler_rpcs_per_poll(contract, monkeypatch):  # noqa: F811
+    w3 = contract.web3
+    mine(w3, 3)
+    header_cache = BlockHeaderCache(w3)
+    log_handler = LogHandler(w3, header_cache=header_cache)
+    # another log handler sharing the cache does not refetch the headers
+    get_block_calls = []
+    get_block = w3.eth.getBlock
+
+    def counting_get_block(block_identifier):
+        get_block_calls.append(block_identifier)
+        return get_block(block_identifier)
+
+    monkeypatch.setattr(w3.eth, 'getBlock', counting_get_block)
+    other_log_handler = LogHandler(w3, header_cache=header_cache)
+    assert get_block_calls == ['latest']
+
+    for num_blocks in (1, 3):
+        get_block_calls = []
+        contract.transact(default_tx_detail).emit_log(0)
+        mine(w3, num_blocks)
+        assert len(log_handler.get_new_logs(address=contract.address)) == 1
+        # one RPC per new block, the newest one fetched by 'latest'
+        assert len(get_block_calls) == num_blocks
+        assert get_block_calls[0] == 'latest'
+        get_block_calls = []
+        assert len(other_log_handler.get_new_logs(address=contract.address)) == 1
+        assert get_block_calls == ['latest']
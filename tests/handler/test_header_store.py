@@ -0,0 +1,103 @@
+from contracts.utils.headers import (
+    CollationHeader,
+)
+
+from handler.header_store import (
+    CollationHeaderStore,
+)
+from handler.shard_tracker import (
+    ShardTracker,
+    parse_collation_added_log,
+)
+from handler.utils.collation_added_logs import (
+    get_header_bytes,
+    parse_collation_added_logs,
+)
+
+from tests.handler.test_shard_tracker import (
+    COLLATION_ADDED_LOG_0,
+    COLLATION_ADDED_LOG_1,
+    DeltaLogHandler,
+)
+
+
+def test_get_header_bytes():
+    lazy_log_entry, = parse_collation_added_logs((COLLATION_ADDED_LOG_1,))
+    log_entry = parse_collation_added_log(COLLATION_ADDED_LOG_1)
+    assert get_header_bytes(lazy_log_entry['header']) == get_header_bytes(log_entry['header'])
+    assert len(get_header_bytes(log_entry['header'])) == 32 * 9
+
+
+def test_collation_header_store(tmpdir):
+    path = str(tmpdir.join('headers.sqlite'))
+    log_entry_0 = parse_collation_added_log(COLLATION_ADDED_LOG_0)
+    log_entry_1, = parse_collation_added_logs((COLLATION_ADDED_LOG_1,))
+    header_0 = log_entry_0['header']
+    header_1 = log_entry_1['header'].materialize()
+    with CollationHeaderStore(path) as header_store:
+        assert len(header_store) == 0
+        assert header_store.get_max_score(0) is None
+        header_store.add_log_entries((log_entry_0, log_entry_1))
+        # adding twice is ignored
+        header_store.add_log_entries((log_entry_0,))
+        assert len(header_store) == 2
+
+    # the headers are kept over restarts
+    with CollationHeaderStore(path) as header_store:
+        assert len(header_store) == 2
+        assert header_0.hash in header_store
+        assert header_store.get_log_entry(header_0.hash) == log_entry_0
+        assert header_store.get_header(header_1.hash) == header_1
+        assert header_store.get_header(b'\x00' * 32) is None
+        assert header_store.get_max_score(0) == 2
+        assert header_store.get_max_score(1) is None
+        assert header_store.get_log_entries_by_score(0, 1) == (log_entry_0,)
+        assert tuple(
+            log_entry['score']
+            for log_entry in header_store.iter_log_entries_by_score(0)
+        ) == (2, 1)
+        assert tuple(header_store.iter_log_entries_by_score(0, min_score=2))[0]['header'] == (
+            header_1
+        )
+        children = header_store.get_children(header_1.parent_hash)
+        assert tuple(log_entry['header'] for log_entry in children) == (header_1,)
+        assert header_store.get_parent(header_0) is None
+        header_store.remove((header_1.hash,))
+        assert len(header_store) == 1
+        assert header_store.get_header(header_1.hash) is None
+
+
+def test_iter_log_entries_by_score_arrival_order():
+    log_entries = tuple(
+        {
+            'header': CollationHeader(0, 1, b'\x00' * 32, b'\x00' * 32, 1, state_root=state_root),
+            'is_new_head': False,
+            'score': 1,
+        }
+        # the hashes of the headers are not in arrival order
+        for state_root in (b'\x03' * 32, b'\x01' * 32, b'\x02' * 32)
+    )
+    with CollationHeaderStore() as header_store:
+        header_store.add_log_entries(log_entries[:2])
+        header_store.add_log_entries(log_entries[2:])
+        assert tuple(header_store.iter_log_entries_by_score(0)) == log_entries
+
+
+def test_shard_tracker_header_store():
+    log_handler = DeltaLogHandler((
+        (tuple(), (COLLATION_ADDED_LOG_0, COLLATION_ADDED_LOG_1)),
+        ((COLLATION_ADDED_LOG_1,), tuple()),
+    ))
+    header_store = CollationHeaderStore()
+    shard_0_tracker = ShardTracker(
+        0,
+        log_handler,
+        COLLATION_ADDED_LOG_0['address'],
+        header_store=header_store,
+    )
+    shard_0_tracker.get_next_log()
+    assert len(header_store) == 2
+    # the revoked log is removed from the store as well
+    shard_0_tracker.get_next_log()
+    assert len(header_store) == 1
+    assert header_store.get_max_score(0) == 1
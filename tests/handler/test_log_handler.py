@@ -15,6 +15,7 @@ from web3.providers.eth_tester import (
 )
 
 from eth_utils import (
+    encode_hex,
     event_signature_to_log_topic,
 )
 
@@ -32,8 +33,19 @@ from eth_tester.backends.pyevm.main import (
 
 from handler.log_handler import (
     LogHandler,
+    NoCommonAncestor,
+    expand_topic_alternatives,
     get_canonical_chain,
     get_recent_block_hashes,
+    get_recent_block_hashes_batched,
+    group_block_ranges,
+    is_continuous_chain,
+    is_log_matching_filter,
+    merge_log_filters,
+    split_block_range,
+)
+from handler.utils.block_hash_window import (
+    BlockHashWindow,
 )
 from handler.utils.web3_utils import (
     mine,
@@ -58,6 +70,7 @@ default_tx_detail = {
     'gas': 500000,
 }
 test_event_signature = event_signature_to_log_topic("Test(int128)")
+other_event_signature = event_signature_to_log_topic("Other(int128)")
 
 HISTORY_SIZE = 256
 
@@ -94,6 +107,44 @@ def test_get_recent_block_hashes(contract):
     assert block3['hash'] == recent_block_hashes[3]
 
 
+@pytest.mark.parametrize(
+    'history_size, batch_size',
+    (
+        (HISTORY_SIZE, 4),
+        (HISTORY_SIZE, 1),
+        (3, 2),
+        (1, 4),
+    )
+)
+def test_get_recent_block_hashes_batched(contract, history_size, batch_size):
+    w3 = contract.web3
+    mine(w3, 5)
+    assert get_recent_block_hashes_batched(
+        w3,
+        history_size,
+        batch_size,
+    ) == get_recent_block_hashes(w3, history_size)
+
+
+def test_is_continuous_chain(contract):
+    w3 = contract.web3
+    mine(w3, 2)
+    blocks = tuple(w3.eth.getBlock(i) for i in range(4))
+    assert is_continuous_chain(blocks)
+    assert is_continuous_chain(blocks[:1])
+    assert not is_continuous_chain(blocks[:1] + blocks[2:])
+    assert not is_continuous_chain((None,) + blocks[1:])
+    assert not is_continuous_chain(blocks[:3] + (None,))
+    assert not is_continuous_chain((None,))
+
+
+def test_log_handler_bootstrap_batch_size(contract):
+    w3 = contract.web3
+    mine(w3, 3)
+    log_handler = LogHandler(w3, bootstrap_batch_size=2)
+    assert log_handler.recent_block_hashes == get_recent_block_hashes(w3, HISTORY_SIZE)
+
+
 def test_get_canonical_chain_without_forks(contract):
     w3 = contract.web3
     recent_block_hashes = get_recent_block_hashes(w3, HISTORY_SIZE)
@@ -189,6 +240,42 @@ def test_get_canonical_chain_with_forks(contract):
     assert block4_prime['hash'] == new_block_hashes[-1]
 
 
+def test_get_canonical_chain_with_block_hash_window(contract):
+    w3 = contract.web3
+    history_size = 3
+    mine(w3, 3)
+    recent_block_hashes = BlockHashWindow(
+        history_size,
+        get_recent_block_hashes(w3, history_size),
+    )
+    snapshot_id = take_snapshot(w3)
+    mine(w3, 1)
+    block5 = w3.eth.getBlock('latest')
+    revoked_hashes, new_block_hashes = get_canonical_chain(w3, recent_block_hashes, history_size)
+    assert revoked_hashes == tuple()
+    assert new_block_hashes == (block5['hash'],)
+    recent_block_hashes.extend(new_block_hashes)
+
+    revert_to_snapshot(w3, snapshot_id)
+    contract.transact(default_tx_detail).emit_log(0)
+    mine(w3, 1)
+    block5_prime = w3.eth.getBlock('latest')
+    revoked_hashes, new_block_hashes = get_canonical_chain(w3, recent_block_hashes, history_size)
+    assert revoked_hashes == (block5['hash'],)
+    assert new_block_hashes == (block5_prime['hash'],)
+
+
+def test_log_handler_recent_block_hashes_bounded(contract):
+    w3 = contract.web3
+    history_size = 4
+    log_handler = LogHandler(w3, history_size=history_size)
+    for _ in range(3):
+        mine(w3, 3)
+        log_handler.get_new_logs(address=contract.address)
+    assert len(log_handler.recent_block_hashes) == history_size
+    assert tuple(log_handler.recent_block_hashes) == get_recent_block_hashes(w3, history_size)
+
+
 def test_log_handler_get_new_logs_without_forks(contract):
     w3 = contract.web3
     log_handler = LogHandler(w3)
@@ -235,3 +322,380 @@ def test_log_handler_get_new_logs_with_forks(contract):
     assert int(logs[0]['data'], 16) == 1
     assert int(logs[1]['data'], 16) == 2
     assert log_handler.get_new_logs() == tuple()
+
+
+def test_log_handler_get_log_delta_with_forks(contract):
+    w3 = contract.web3
+    log_handler = LogHandler(w3)
+    snapshot_id = take_snapshot(w3)
+    contract.transact(default_tx_detail).emit_log(0)
+    mine(w3, 1)
+    removed_logs, added_logs = log_handler.get_log_delta(address=contract.address)
+    assert removed_logs == tuple()
+    assert len(added_logs) == 1
+    assert int(added_logs[0]['data'], 16) == 0
+    assert log_handler.get_log_delta(address=contract.address) == (tuple(), tuple())
+
+    revert_to_snapshot(w3, snapshot_id)
+    contract.transact(default_tx_detail).emit_log(1)
+    mine(w3, 1)
+    contract.transact(default_tx_detail).emit_log(2)
+    mine(w3, 1)
+    removed_logs, added_logs = log_handler.get_log_delta(address=contract.address)
+    assert len(removed_logs) == 1
+    assert int(removed_logs[0]['data'], 16) == 0
+    assert len(added_logs) == 2
+    assert int(added_logs[0]['data'], 16) == 1
+    assert int(added_logs[1]['data'], 16) == 2
+
+
+def test_log_handler_delivered_logs_bounded(contract):
+    w3 = contract.web3
+    history_size = 2
+    log_handler = LogHandler(w3, history_size=history_size)
+    for i in range(4):
+        contract.transact(default_tx_detail).emit_log(i)
+        mine(w3, 1)
+        log_handler.get_new_logs(address=contract.address)
+    assert len(log_handler.delivered_logs) == history_size
+    assert set(log_handler.delivered_logs) == set(log_handler.recent_block_hashes)
+
+
+@pytest.mark.parametrize(
+    'log_filter, expected',
+    (
+        ((None, None), True),
+        (('0x' + '11' * 20, None), True),
+        (('0x' + '22' * 20, None), False),
+        ((None, ['0x' + 'aa' * 32]), True),
+        ((None, [b'\xaa' * 32, b'\xbb' * 32]), True),
+        ((None, [None, '0x' + 'bb' * 32]), True),
+        ((None, [None, '0x' + 'cc' * 32]), False),
+        ((None, [None, None, '0x' + 'cc' * 32]), False),
+        ((None, [None, ['0x' + 'cc' * 32, b'\xbb' * 32]]), True),
+        ((None, [['0x' + 'cc' * 32, '0x' + 'dd' * 32]]), False),
+    )
+)
+def test_is_log_matching_filter(log_filter, expected):
+    log = {
+        'address': '0x' + '11' * 20,
+        'topics': [b'\xaa' * 32, b'\xbb' * 32],
+    }
+    assert is_log_matching_filter(log, *log_filter) == expected
+
+
+@pytest.mark.parametrize(
+    'log_filters, expected',
+    (
+        (tuple(), (None, None)),
+        (((None, None),), (None, None)),
+        (
+            (('0x' + '11' * 20, ['0x' + 'aa' * 32, '0x' + 'bb' * 32]),),
+            ('0x' + '11' * 20, ['0x' + 'aa' * 32, '0x' + 'bb' * 32]),
+        ),
+        (
+            (
+                ('0x' + '11' * 20, ['0x' + 'aa' * 32, '0x' + 'bb' * 32]),
+                ('0x' + '11' * 20, [b'\xaa' * 32, '0x' + 'cc' * 32]),
+            ),
+            ('0x' + '11' * 20, ['0x' + 'aa' * 32, ['0x' + 'bb' * 32, '0x' + 'cc' * 32]]),
+        ),
+        (
+            (
+                ('0x' + '11' * 20, ['0x' + 'aa' * 32]),
+                ('0x' + '22' * 20, ['0x' + 'aa' * 32, '0x' + 'cc' * 32]),
+            ),
+            (None, ['0x' + 'aa' * 32]),
+        ),
+        (
+            (
+                ('0x' + '11' * 20, [['0x' + 'aa' * 32, '0x' + 'bb' * 32]]),
+                ('0x' + '11' * 20, ['0x' + 'cc' * 32, '0x' + 'dd' * 32]),
+            ),
+            ('0x' + '11' * 20, [['0x' + 'aa' * 32, '0x' + 'bb' * 32, '0x' + 'cc' * 32]]),
+        ),
+        (
+            (
+                ('0x' + '11' * 20, ['0x' + 'aa' * 32]),
+                ('0x' + '11' * 20, None),
+            ),
+            ('0x' + '11' * 20, None),
+        ),
+        (
+            (
+                (None, [None, '0x' + 'bb' * 32]),
+                (None, ['0x' + 'aa' * 32, '0x' + 'bb' * 32]),
+            ),
+            (None, [None, '0x' + 'bb' * 32]),
+        ),
+    )
+)
+def test_merge_log_filters(log_filters, expected):
+    assert merge_log_filters(log_filters) == expected
+
+
+def test_expand_topic_alternatives():
+    assert expand_topic_alternatives(['0x' + 'aa' * 32, None]) == [['0x' + 'aa' * 32, None]]
+    assert expand_topic_alternatives(
+        [[b'\xaa' * 32, '0x' + 'bb' * 32], None, ['0x' + 'cc' * 32, '0x' + 'dd' * 32]],
+    ) == [
+        ['0x' + 'aa' * 32, None, '0x' + 'cc' * 32],
+        ['0x' + 'aa' * 32, None, '0x' + 'dd' * 32],
+        ['0x' + 'bb' * 32, None, '0x' + 'cc' * 32],
+        ['0x' + 'bb' * 32, None, '0x' + 'dd' * 32],
+    ]
+
+
+def test_log_handler_subscriptions(contract, monkeypatch):
+    w3 = contract.web3
+    log_handler = LogHandler(w3)
+    get_logs_params = []
+    get_logs = w3.eth.getLogs
+
+    def counting_get_logs(filter_params):
+        get_logs_params.append(filter_params)
+        return get_logs(filter_params)
+
+    monkeypatch.setattr(w3.eth, 'getLogs', counting_get_logs)
+
+    test_subscription = log_handler.subscribe(
+        address=contract.address,
+        topics=[test_event_signature],
+    )
+    other_subscription = log_handler.subscribe(
+        address=contract.address,
+        topics=[other_event_signature],
+    )
+    contract.transact(default_tx_detail).emit_log(0)
+    mine(w3, 1)
+    assert other_subscription.get_new_logs() == tuple()
+    assert len(get_logs_params) == 1
+    # the logs are fetched once with the merged filter
+    assert get_logs_params[0]['address'] == contract.address
+    assert get_logs_params[0]['topics'] == expand_topic_alternatives(
+        [[test_event_signature, other_event_signature]],
+    )
+    logs = test_subscription.get_new_logs()
+    assert len(logs) == 1
+    assert int(logs[0]['data'], 16) == 0
+    assert len(get_logs_params) == 1
+
+    # fetching the logs directly from the log handler routes them to the subscriptions as well
+    contract.transact(default_tx_detail).emit_log(1)
+    mine(w3, 1)
+    assert log_handler.get_new_logs(topics=[other_event_signature]) == tuple()
+    assert len(get_logs_params) == 2
+    log_handler.unsubscribe(other_subscription)
+    logs = test_subscription.get_new_logs()
+    assert len(logs) == 1
+    assert int(logs[0]['data'], 16) == 1
+    assert len(get_logs_params) == 2
+
+
+def make_routed_log(data, routing_topic=None):
+    topics = [test_event_signature]
+    if routing_topic is not None:
+        topics.append(routing_topic)
+    return {
+        'address': '0x' + '00' * 20,
+        'topics': topics,
+        'data': data,
+        'blockHash': b'\x01' * 32,
+        'logIndex': int(data, 16),
+    }
+
+
+def test_log_handler_routes_by_topic(contract):
+    log_handler = LogHandler(contract.web3)
+    topic_a, topic_b = b'\x0a' * 32, b'\x0b' * 32
+    subscription_a = log_handler.subscribe(topics=[test_event_signature, encode_hex(topic_a)])
+    subscription_b = log_handler.subscribe(topics=[None, topic_b])
+    # several topics at the routing position can not be indexed
+    subscription_ab = log_handler.subscribe(topics=[None, [topic_a, topic_b]])
+    assert subscription_a.routing_topic == topic_a
+    assert subscription_b.routing_topic == topic_b
+    assert subscription_ab.routing_topic is None
+    assert log_handler._unrouted_subscriptions == [subscription_ab]
+    logs = (
+        make_routed_log('0x0', topic_a),
+        make_routed_log('0x1', topic_b),
+        make_routed_log('0x2'),
+    )
+    log_handler._route_log_delta(tuple(), logs)
+    assert subscription_a.pop_log_delta() == (tuple(), logs[:1])
+    assert subscription_b.pop_log_delta() == (tuple(), logs[1:2])
+    assert subscription_ab.pop_log_delta() == (tuple(), logs[:2])
+    log_handler._route_log_delta(logs[:1], tuple())
+    assert subscription_a.pop_log_delta() == (logs[:1], tuple())
+    assert subscription_b.pop_log_delta() == (tuple(), tuple())
+
+    log_handler.unsubscribe(subscription_a)
+    log_handler.unsubscribe(subscription_ab)
+    assert tuple(log_handler._subscriptions_by_routing_topic) == (topic_b,)
+    assert log_handler._unrouted_subscriptions == []
+
+
+def test_log_subscription_get_log_delta_with_forks(contract):
+    w3 = contract.web3
+    log_handler = LogHandler(w3)
+    subscription = log_handler.subscribe(address=contract.address)
+    snapshot_id = take_snapshot(w3)
+    contract.transact(default_tx_detail).emit_log(0)
+    mine(w3, 1)
+    contract.transact(default_tx_detail).emit_log(1)
+    mine(w3, 1)
+    log_handler.poll()
+    revert_to_snapshot(w3, snapshot_id)
+    mine(w3, 1)
+    contract.transact(default_tx_detail).emit_log(2)
+    mine(w3, 1)
+    contract.transact(default_tx_detail).emit_log(3)
+    mine(w3, 1)
+    log_handler.poll()
+    # the revoked logs which are not consumed yet are dropped
+    removed_logs, added_logs = subscription.get_log_delta()
+    assert removed_logs == tuple()
+    assert tuple(int(log['data'], 16) for log in added_logs) == (2, 3)
+
+    snapshot_id = take_snapshot(w3)
+    contract.transact(default_tx_detail).emit_log(4)
+    mine(w3, 1)
+    assert len(subscription.get_new_logs()) == 1
+    revert_to_snapshot(w3, snapshot_id)
+    mine(w3, 2)
+    removed_logs, added_logs = subscription.get_log_delta()
+    assert tuple(int(log['data'], 16) for log in removed_logs) == (4,)
+    assert added_logs == tuple()
+
+
+@pytest.mark.parametrize(
+    'from_block, to_block, chunk_size, expected',
+    (
+        (0, 0, 1, ((0, 0),)),
+        (0, 9, 5, ((0, 4), (5, 9))),
+        (3, 10, 3, ((3, 5), (6, 8), (9, 10))),
+        (5, 4, 3, tuple()),
+    )
+)
+def test_split_block_range(from_block, to_block, chunk_size, expected):
+    assert split_block_range(from_block, to_block, chunk_size) == expected
+
+
+@pytest.mark.parametrize(
+    'chunk_size',
+    (0, None),
+)
+def test_split_block_range_invalid_chunk_size(chunk_size):
+    with pytest.raises(ValueError):
+        split_block_range(0, 1, chunk_size)
+
+
+@pytest.mark.parametrize(
+    'chunk_size, max_workers',
+    (
+        (1, 1),
+        (2, 2),
+        (3, 8),
+    )
+)
+def test_log_handler_catch_up(contract, chunk_size, max_workers):
+    w3 = contract.web3
+    history_size = 3
+    log_handler = LogHandler(w3, history_size=history_size)
+    subscription = log_handler.subscribe(address=contract.address)
+    from_block = w3.eth.blockNumber + 1
+    for i in range(8):
+        contract.transact(default_tx_detail).emit_log(i)
+        mine(w3, 1)
+    with pytest.raises(NoCommonAncestor):
+        log_handler.get_new_logs(address=contract.address)
+    logs = tuple(log_handler.catch_up(
+        from_block,
+        address=contract.address,
+        chunk_size=chunk_size,
+        max_workers=max_workers,
+    ))
+    assert tuple(int(log['data'], 16) for log in logs) == tuple(range(8))
+    assert tuple(log_handler.recent_block_hashes) == get_recent_block_hashes(w3, history_size)
+    # the subscriptions catch up as well
+    assert subscription.pop_log_delta() == (tuple(), logs)
+    # continue from the head afterwards
+    contract.transact(default_tx_detail).emit_log(8)
+    mine(w3, 1)
+    logs = log_handler.get_new_logs(address=contract.address)
+    assert tuple(int(log['data'], 16) for log in logs) == (8,)
+
+
+def test_log_handler_catch_up_stopped_part_way(contract):
+    w3 = contract.web3
+    history_size = 3
+    log_handler = LogHandler(w3, history_size=history_size)
+    recent_block_hashes = tuple(log_handler.recent_block_hashes)
+    for i in range(8):
+        contract.transact(default_tx_detail).emit_log(i)
+        mine(w3, 1)
+    logs = log_handler.catch_up(address=contract.address, chunk_size=2, max_workers=1)
+    first_logs = tuple(itertools.islice(logs, 3))
+    logs.close()
+    assert tuple(int(log['data'], 16) for log in first_logs) == (0, 1, 2)
+    # the window only moves once the last chunk is yielded
+    assert tuple(log_handler.recent_block_hashes) == recent_block_hashes
+    # the chunk of the last log yielded is not done, so it is yielded again
+    assert log_handler.caught_up_block_number == log_handler.get_last_block_number()
+    logs = tuple(log_handler.catch_up(address=contract.address))
+    assert tuple(int(log['data'], 16) for log in logs) == tuple(range(2, 8))
+    assert tuple(log_handler.recent_block_hashes) == get_recent_block_hashes(w3, history_size)
+    assert log_handler.caught_up_block_number is None
+    assert log_handler.get_last_block_number() == w3.eth.blockNumber
+
+
+@pytest.mark.parametrize(
+    'block_numbers, expected',
+    (
+        (tuple(), tuple()),
+        ((3,), ((3, 3),)),
+        ((1, 2, 3, 5, 7, 8), ((1, 3), (5, 5), (7, 8))),
+    )
+)
+def test_group_block_ranges(block_numbers, expected):
+    assert group_block_ranges(block_numbers) == expected
+
+
+def test_log_handler_bloom_filter(contract, monkeypatch):
+    w3 = contract.web3
+    log_handler = LogHandler(w3, bloom_filter=True)
+    get_logs_params = []
+    get_logs = w3.eth.getLogs
+
+    def counting_get_logs(filter_params):
+        get_logs_params.append(filter_params)
+        return get_logs(filter_params)
+
+    monkeypatch.setattr(w3.eth, 'getLogs', counting_get_logs)
+    mine(w3, 3)
+    assert log_handler.get_new_logs(address=contract.address) == tuple()
+    # no block can have the logs
+    assert len(get_logs_params) == 0
+
+    first_block_number = w3.eth.blockNumber + 1
+    for i in range(6):
+        if i in (1, 2, 4):
+            contract.transact(default_tx_detail).emit_log(i)
+        mine(w3, 1)
+    logs = log_handler.get_new_logs(
+        address=contract.address,
+        topics=[encode_hex(test_event_signature)],
+    )
+    assert tuple(int(log['data'], 16) for log in logs) == (1, 2, 4)
+    assert tuple(
+        (params['fromBlock'], params['toBlock'])
+        for params in get_logs_params
+    ) == (
+        (first_block_number + 1, first_block_number + 2),
+        (first_block_number + 4, first_block_number + 4),
+    )
+
+    contract.transact(default_tx_detail).emit_log(6)
+    mine(w3, 1)
+    assert log_handler.get_new_logs(topics=[other_event_signature]) == tuple()
+    assert len(get_logs_params) == 2
@@ -0,0 +1,147 @@
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+
+import pytest
+
+from handler.log_handler import (
+    LogHandler,
+)
+from handler.utils.metrics import (
+    LATENCY_BUCKETS,
+    NULL_METRICS,
+    CallStats,
+    Metrics,
+    get_payload_size,
+    make_metrics_middleware,
+    timed_operation,
+)
+from handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.handler.fixtures import (  # noqa: F401
+    smc_handler,
+)
+from tests.handler.test_log_handler import (  # noqa: F401
+    contract,
+    default_tx_detail,
+)
+
+
+class Operations:
+
+    metrics = NULL_METRICS
+
+    @timed_operation('do')
+    def do(self, value):
+        return value
+
+    @timed_operation('fail')
+    def fail(self):
+        raise ValueError
+
+
+def test_call_stats():
+    call_stats = CallStats()
+    assert call_stats.average_duration == 0
+    call_stats.record(0.002, request_size=10, response_size=20)
+    call_stats.record(100)
+    assert call_stats.count == 2
+    assert call_stats.max_duration == 100
+    assert call_stats.average_duration == pytest.approx(50.001)
+    assert call_stats.latency_histogram[1] == 1
+    assert call_stats.latency_histogram[-1] == 1
+    assert sum(call_stats.latency_histogram) == 2
+    assert len(call_stats.latency_histogram) == len(LATENCY_BUCKETS)
+    assert call_stats.request_size == 10
+    assert call_stats.response_size == 20
+    assert call_stats.error_count == 0
+    call_stats.record(0.002, is_error=True)
+    assert call_stats.count == 3
+    assert call_stats.error_count == 1
+
+
+def test_metrics_concurrent_record():
+    metrics = Metrics()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in executor.map(lambda idx: metrics.record_rpc(str(idx % 2), 0.001), range(4000)):
+            pass
+    assert metrics.rpc_stats['0'].count == 2000
+    assert metrics.rpc_stats['1'].count == 2000
+
+
+def test_timed_operation():
+    operations = Operations()
+    # nothing is recorded by default
+    assert operations.do(1) == 1
+    metrics = Metrics()
+    operations.metrics = metrics
+    assert operations.do(2) == 2
+    assert operations.do(3) == 3
+    with pytest.raises(ValueError):
+        operations.fail()
+    assert metrics.operation_stats['do'].count == 2
+    assert metrics.operation_stats['fail'].count == 1
+    assert metrics.operation_stats['do'].error_count == 0
+    assert metrics.operation_stats['fail'].error_count == 1
+    assert metrics.rpc_stats == {}
+
+
+def test_get_payload_size():
+    assert get_payload_size([]) == 2
+    assert get_payload_size([b'\x01']) == len('["0x01"]')
+
+
+def test_metrics_middleware(contract):  # noqa: F811
+    w3 = contract.web3
+    metrics = Metrics()
+    w3.middleware_stack.add(make_metrics_middleware(metrics))
+    log_handler = LogHandler(w3, history_size=5, metrics=metrics)
+    assert metrics.rpc_stats['eth_getBlockByNumber'].count >= 1
+    mine(w3, 1)
+    log_handler.get_new_logs()
+    assert metrics.operation_stats['get_new_logs'].count == 1
+    assert metrics.operation_stats['get_log_delta'].count == 1
+    get_logs_stats = metrics.rpc_stats['eth_getLogs']
+    assert get_logs_stats.count == 1
+    assert get_logs_stats.error_count == 0
+    # the payload sizes are opt-in
+    assert get_logs_stats.request_size == 0
+    assert get_logs_stats.response_size == 0
+
+
+def test_metrics_middleware_payload_size(contract):  # noqa: F811
+    w3 = contract.web3
+    metrics = Metrics()
+    w3.middleware_stack.add(make_metrics_middleware(metrics, measures_payload_size=True))
+    w3.eth.getLogs({'fromBlock': 0, 'toBlock': 'latest'})
+    get_logs_stats = metrics.rpc_stats['eth_getLogs']
+    assert get_logs_stats.request_size > 0
+    assert get_logs_stats.response_size > 0
+
+
+def test_metrics_middleware_errors():
+    metrics = Metrics()
+    responses = iter(({'result': 1}, {'error': 'failed'}))
+
+    def make_request(method, params):
+        response = next(responses, None)
+        if response is None:
+            raise ConnectionError
+        return response
+
+    middleware = make_metrics_middleware(metrics)(make_request, None)
+    assert middleware('eth_blockNumber', []) == {'result': 1}
+    assert middleware('eth_blockNumber', []) == {'error': 'failed'}
+    with pytest.raises(ConnectionError):
+        middleware('eth_blockNumber', [])
+    assert metrics.rpc_stats['eth_blockNumber'].count == 3
+    assert metrics.rpc_stats['eth_blockNumber'].error_count == 2
+
+
+def test_smc_handler_metrics(smc_handler):  # noqa: F811
+    metrics = Metrics()
+    smc_handler.metrics = metrics
+    smc_handler.register_notary()
+    assert metrics.operation_stats['_send_transaction'].count == 1
@@ -0,0 +1,96 @@
+import pytest
+
+from handler.log_handler import (
+    LogHandler,
+)
+from handler.multi_shard_tracker import (
+    MultiShardTracker,
+    get_log_shard_id,
+)
+from handler.shard_tracker import (
+    NextLogUnavailable,
+    NoCandidateHead,
+)
+from handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.handler.fixtures import (  # noqa: F401
+    smc_handler,
+)
+from tests.handler.test_shard_tracker import (
+    COLLATION_ADDED_LOG_0,
+    COLLATION_ADDED_LOG_1,
+)
+
+
+def make_shard_log(log, shard_id, address):
+    return dict(
+        log,
+        topics=[log['topics'][0], shard_id.to_bytes(32, byteorder='big')],
+        address=address,
+    )
+
+
+def test_get_log_shard_id():
+    assert get_log_shard_id(make_shard_log(COLLATION_ADDED_LOG_0, 5, None)) == 5
+    log = dict(COLLATION_ADDED_LOG_0, topics=['0x0', '0x' + '00' * 31 + '07'])
+    assert get_log_shard_id(log) == 7
+
+
+def test_multi_shard_tracker(smc_handler, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    log_handler = LogHandler(w3)
+    address = smc_handler.address
+    get_logs_params = []
+    mock_logs = [
+        make_shard_log(COLLATION_ADDED_LOG_0, 1, address),
+        make_shard_log(COLLATION_ADDED_LOG_0, 3, address),
+        make_shard_log(COLLATION_ADDED_LOG_1, 3, address),
+    ]
+
+    def mock_get_logs(filter_params):
+        get_logs_params.append(filter_params)
+        logs = list(mock_logs)
+        mock_logs.clear()
+        return logs
+
+    monkeypatch.setattr(w3.eth, 'getLogs', mock_get_logs)
+    multi_shard_tracker = MultiShardTracker(log_handler, address)
+    assert multi_shard_tracker.active_shard_ids == ()
+    mine(w3, 1)
+
+    log = multi_shard_tracker.fetch_candidate_head(3)
+    assert log['score'] == 2
+    # only the shards with logs are tracked
+    assert multi_shard_tracker.active_shard_ids == (1, 3)
+    log = multi_shard_tracker.fetch_candidate_head(1)
+    assert log['header'].shard_id == 1
+    assert log['score'] == 1
+    log = multi_shard_tracker.fetch_candidate_head(3)
+    assert log['header'].shard_id == 3
+    assert log['score'] == 1
+    with pytest.raises(NoCandidateHead):
+        multi_shard_tracker.fetch_candidate_head(0)
+    with pytest.raises(NextLogUnavailable):
+        multi_shard_tracker.get_next_log(0)
+    assert tuple(multi_shard_tracker.iter_candidate_heads(0)) == ()
+    assert 0 not in multi_shard_tracker.shard_trackers
+    # one filter for all the shards, with the shard id topic unconstrained
+    assert len(get_logs_params) == 1
+    assert len(get_logs_params[0]['topics']) == 1
+
+
+def test_multi_shard_tracker_close(smc_handler, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    log_handler = LogHandler(w3)
+    address = smc_handler.address
+    mock_logs = [make_shard_log(COLLATION_ADDED_LOG_0, 1, address)]
+    monkeypatch.setattr(w3.eth, 'getLogs', lambda filter_params: mock_logs)
+    multi_shard_tracker = MultiShardTracker(log_handler, address)
+    mine(w3, 1)
+    assert multi_shard_tracker.get_shard_tracker(1) is not None
+    multi_shard_tracker.close()
+    assert multi_shard_tracker.shard_subscriptions == {}
+    assert multi_shard_tracker.shard_trackers == {}
+    assert log_handler.subscriptions == []
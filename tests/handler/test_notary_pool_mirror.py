@@ -0,0 +1,187 @@
+from eth_tester.backends.pyevm.main import (
+    get_default_account_keys,
+)
+
+from handler.log_handler import (
+    LogHandler,
+    merge_log_filters,
+    normalize_topic,
+)
+from handler.notary_pool_mirror import (
+    DEREGISTER_NOTARY_TOPIC,
+    NOTARY_EVENT_TOPICS,
+    REGISTER_NOTARY_TOPIC,
+    NotaryPoolMirror,
+    NotaryRecord,
+    parse_notary_log,
+)
+from handler.shard_tracker import (
+    COLLATION_ADDED_TOPIC,
+    ShardTracker,
+)
+from handler.utils.web3_utils import (
+    mine,
+    revert_to_snapshot,
+    take_snapshot,
+)
+
+from tests.handler.fixtures import (  # noqa: F401
+    smc_handler,
+)
+
+
+# the calls to eth-tester can not be concurrent, since they share the journal of py-evm
+SERIAL_BATCH_SIZE = 1
+
+
+def assert_same_as_contract(mirror, smc_handler):  # noqa: F811
+    assert mirror.notary_pool == smc_handler.get_notary_pool(batch_size=SERIAL_BATCH_SIZE)
+    assert mirror.notary_pool_len == smc_handler.notary_pool_len()
+    assert mirror.empty_slots_stack_top == smc_handler.empty_slots_stack_top()
+
+
+def test_parse_notary_log():
+    notary = b'\x35' * 20
+    log = {
+        'topics': [REGISTER_NOTARY_TOPIC],
+        'data': '0x' + '00' * 31 + '03' + '00' * 12 + '35' * 20,
+    }
+    assert parse_notary_log(log) == (REGISTER_NOTARY_TOPIC, 3, notary, None)
+    log = {
+        'topics': ['0x' + DEREGISTER_NOTARY_TOPIC.hex()],
+        'data': '0x' + '00' * 31 + '03' + '00' * 12 + '35' * 20 + '00' * 31 + '07',
+    }
+    assert parse_notary_log(log) == (DEREGISTER_NOTARY_TOPIC, 3, notary, 7)
+
+
+def test_notary_pool_mirror(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_handler.config
+    private_keys = get_default_account_keys()[:3]
+    notary_addresses = tuple(
+        private_key.public_key.to_canonical_address()
+        for private_key in private_keys
+    )
+    log_handler = LogHandler(w3, history_size=10)
+    mirror = NotaryPoolMirror(log_handler, smc_handler.address, config)
+    assert mirror.poll() == 0
+    assert mirror.notary_pool == ()
+
+    for private_key in private_keys:
+        smc_handler.register_notary(private_key=private_key)
+        mine(w3, 1)
+    smc_handler.deregister_notary(private_key=private_keys[1])
+    mine(w3, 1)
+    deregistered_period = w3.eth.blockNumber // config['PERIOD_LENGTH']
+    assert mirror.poll() == 4
+    assert_same_as_contract(mirror, smc_handler)
+    assert mirror.notary_pool == (notary_addresses[0], None, notary_addresses[2])
+    assert mirror.get_notary_index(notary_addresses[2]) == 2
+    assert mirror.get_notary_index(notary_addresses[1]) is None
+    assert mirror.does_notary_exist(notary_addresses[1])
+    assert mirror.get_notary_record(notary_addresses[1]) == NotaryRecord(
+        deregistered=deregistered_period,
+        pool_index=1,
+    )
+    release_period = deregistered_period + config['NOTARY_LOCKUP_LENGTH'] + 1
+    assert mirror.get_release_period(notary_addresses[1]) == release_period
+    assert mirror.get_release_period(notary_addresses[0]) is None
+    assert not mirror.can_release(notary_addresses[1], release_period - 1)
+    assert mirror.can_release(notary_addresses[1], release_period)
+    assert not mirror.can_release(notary_addresses[0], release_period)
+
+    # the empty slot is reused
+    new_private_key = get_default_account_keys()[3]
+    new_notary_address = new_private_key.public_key.to_canonical_address()
+    smc_handler.register_notary(private_key=new_private_key)
+    mine(w3, 1)
+    assert mirror.poll() == 1
+    assert_same_as_contract(mirror, smc_handler)
+    assert mirror.get_notary_index(new_notary_address) == 1
+    assert mirror.get_release_period(new_notary_address) is None
+
+    # the logs of other contracts are ignored
+    smc_handler.deregister_notary(private_key=private_keys[0])
+    mine(w3, 1)
+    other_log_handler = LogHandler(w3, history_size=10)
+    other_mirror = NotaryPoolMirror(other_log_handler, b'\x01' * 20, config)
+    assert other_mirror.poll() == 0
+    assert mirror.poll() == 1
+    assert mirror.notary_pool == (None, new_notary_address, notary_addresses[2])
+
+
+def test_notary_pool_mirror_shared_log_handler(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    log_handler = LogHandler(w3, history_size=10)
+    ShardTracker(0, log_handler, smc_handler.address)
+    mirror = NotaryPoolMirror(log_handler, smc_handler.address, smc_handler.config)
+    # the merged filter only widens to the events of both
+    _, merged_topics = merge_log_filters(
+        (subscription.address, subscription.topics)
+        for subscription in log_handler.subscriptions
+    )
+    assert set(normalize_topic(topic) for topic in merged_topics[0]) == set(
+        (COLLATION_ADDED_TOPIC,) + NOTARY_EVENT_TOPICS
+    )
+    smc_handler.register_notary()
+    mine(w3, 1)
+    assert mirror.poll() == 1
+    assert_same_as_contract(mirror, smc_handler)
+
+
+def test_notary_pool_mirror_reorg(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_handler.config
+    private_keys = get_default_account_keys()[:3]
+    notary_addresses = tuple(
+        private_key.public_key.to_canonical_address()
+        for private_key in private_keys
+    )
+    log_handler = LogHandler(w3, history_size=10)
+    mirror = NotaryPoolMirror(log_handler, smc_handler.address, config)
+    for private_key in private_keys[:2]:
+        smc_handler.register_notary(private_key=private_key)
+        mine(w3, 1)
+    assert mirror.poll() == 2
+    pool_before_reorg = mirror.notary_pool
+
+    snapshot_id = take_snapshot(w3)
+    smc_handler.deregister_notary(private_key=private_keys[0])
+    mine(w3, 1)
+    smc_handler.register_notary(private_key=private_keys[2])
+    mine(w3, 1)
+    assert mirror.poll() == 2
+    assert mirror.notary_pool == (notary_addresses[2], notary_addresses[1])
+    assert mirror.empty_slots_stack_top == 0
+
+    # the reorg revokes both events
+    revert_to_snapshot(w3, snapshot_id)
+    mine(w3, 3)
+    assert mirror.poll() == 0
+    assert mirror.notary_pool == pool_before_reorg
+    assert not mirror.does_notary_exist(notary_addresses[2])
+    assert mirror.get_notary_index(notary_addresses[0]) == 0
+    assert_same_as_contract(mirror, smc_handler)
+
+    # a reorg revoking only the latest event
+    smc_handler.deregister_notary(private_key=private_keys[1])
+    mine(w3, 1)
+    snapshot_id = take_snapshot(w3)
+    smc_handler.register_notary(private_key=private_keys[2])
+    mine(w3, 1)
+    assert mirror.poll() == 2
+    assert mirror.notary_pool == (notary_addresses[0], notary_addresses[2])
+    revert_to_snapshot(w3, snapshot_id)
+    mine(w3, 2)
+    mirror.poll()
+    assert mirror.notary_pool == (notary_addresses[0], None)
+    assert_same_as_contract(mirror, smc_handler)
+
+    # the events out of the window of the `LogHandler` can not be undone anymore
+    for _ in range(3):
+        mine(w3, log_handler.history_size // 2)
+        mirror.poll()
+    smc_handler.register_notary(private_key=private_keys[2])
+    mine(w3, 1)
+    assert mirror.poll() == 1
+    assert len(mirror._journal) == 1
@@ -0,0 +1,142 @@
+import pytest
+
+from cytoolz import (
+    merge,
+)
+from eth_tester.backends.pyevm.main import (
+    get_default_account_keys,
+)
+from eth_utils import (
+    big_endian_to_int,
+    keccak,
+)
+
+from evm.constants import (
+    ZERO_ADDRESS,
+    ZERO_HASH32,
+)
+
+from handler.proposer_oracle import (
+    BLOCKHASH_WINDOW,
+    ProposerOracle,
+    get_proposer_index,
+)
+from handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.handler.fixtures import (  # noqa: F401
+    smc_handler,
+)
+
+
+# the calls to eth-tester can not be concurrent, since they share the journal of py-evm
+SERIAL_BATCH_SIZE = 1
+
+
+def test_get_proposer_index():
+    seed_block_hash = b'\x35' * 32
+    shard_id = 7
+    expected_index = big_endian_to_int(
+        keccak(seed_block_hash + b'\x00' * 31 + b'\x07')
+    ) % 5
+    assert get_proposer_index(seed_block_hash, shard_id, 5) == expected_index
+    assert get_proposer_index(seed_block_hash, shard_id, 1) == 0
+
+
+def test_get_available_periods():
+    config = {'PERIOD_LENGTH': 5, 'LOOKAHEAD_PERIODS': 4}
+    oracle = ProposerOracle(None, config)
+    # no seed block is before the genesis
+    assert tuple(oracle.get_available_periods(0)) == ()
+    assert tuple(oracle.get_available_periods(1)) == (4,)
+    assert tuple(oracle.get_available_periods(20)) == (4, 5, 6, 7)
+    assert tuple(oracle.get_available_periods(21)) == (4, 5, 6, 7, 8)
+    # the seed blocks of all the periods are before the block
+    for block_number in range(1, 50):
+        for period in oracle.get_available_periods(block_number):
+            assert 0 <= oracle.get_seed_block_number(period) < block_number
+
+
+def test_get_schedule(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_handler.config
+    private_keys = get_default_account_keys()[:3]
+    for private_key in private_keys:
+        smc_handler.register_notary(private_key=private_key)
+        mine(w3, 1)
+    smc_handler.deregister_notary(private_key=private_keys[1])
+    mine(w3, config['PERIOD_LENGTH'] * config['LOOKAHEAD_PERIODS'] + 2)
+    notary_pool = smc_handler.get_notary_pool(batch_size=SERIAL_BATCH_SIZE)
+    assert notary_pool[1] is None
+
+    oracle = ProposerOracle(w3, config)
+    block_number = w3.eth.blockNumber
+    schedule = oracle.get_schedule(notary_pool, batch_size=SERIAL_BATCH_SIZE)
+    assert tuple(schedule.keys()) == tuple(oracle.get_available_periods(block_number))
+    assert len(schedule) >= config['LOOKAHEAD_PERIODS']
+    for period, proposers in schedule.items():
+        assert len(proposers) == config['SHARD_COUNT']
+        seed_block_hash = w3.eth.getBlock(oracle.get_seed_block_number(period))['hash']
+        for shard_id, proposer in enumerate(proposers):
+            proposer_index = get_proposer_index(bytes(seed_block_hash), shard_id, 3)
+            expected_proposer = notary_pool[proposer_index]
+            if expected_proposer is None:
+                expected_proposer = ZERO_ADDRESS
+            assert proposer == expected_proposer
+
+    # a subset of the shards
+    shard_ids = (3, 1)
+    partial_schedule = oracle.get_schedule(
+        notary_pool,
+        shard_ids=shard_ids,
+        batch_size=SERIAL_BATCH_SIZE,
+    )
+    assert partial_schedule == {
+        period: (proposers[3], proposers[1])
+        for period, proposers in schedule.items()
+    }
+
+    with pytest.raises(ValueError):
+        oracle.get_schedule((), batch_size=SERIAL_BATCH_SIZE)
+
+
+def test_get_schedule_out_of_blockhash_window(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    config = merge(smc_handler.config, {'PERIOD_LENGTH': 100, 'LOOKAHEAD_PERIODS': 4})
+    mine(w3, 201)
+    notary_pool = tuple(bytes([idx]) * 20 for idx in range(1, 8))
+    oracle = ProposerOracle(w3, config)
+    schedule = oracle.get_schedule(
+        notary_pool,
+        block_number=300,
+        shard_ids=(0,),
+        batch_size=SERIAL_BATCH_SIZE,
+    )
+    assert tuple(schedule.keys()) == (4, 5, 6)
+    # the seed block 0 is too old for `BLOCKHASH`, which gives zero
+    assert schedule[4] == (notary_pool[get_proposer_index(ZERO_HASH32, 0, 7)],)
+    seed_block_hash = bytes(w3.eth.getBlock(200)['hash'])
+    assert schedule[6] == (notary_pool[get_proposer_index(seed_block_hash, 0, 7)],)
+
+
+def test_get_seed_block_hashes_blockhash_window_boundary(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    config = merge(smc_handler.config, {'PERIOD_LENGTH': 100, 'LOOKAHEAD_PERIODS': 4})
+    mine(w3, 301)
+    oracle = ProposerOracle(w3, config)
+    # the seed block of period 5
+    seed_block_number = 100
+    seed_block_hash = bytes(w3.eth.getBlock(seed_block_number)['hash'])
+    # `BLOCKHASH` in the next block still has the seed block
+    assert oracle._get_seed_block_hashes(
+        (5,),
+        seed_block_number + BLOCKHASH_WINDOW - 1,
+        SERIAL_BATCH_SIZE,
+    ) == (seed_block_hash,)
+    # exactly `BLOCKHASH_WINDOW` blocks back, it is zero
+    assert oracle._get_seed_block_hashes(
+        (5,),
+        seed_block_number + BLOCKHASH_WINDOW,
+        SERIAL_BATCH_SIZE,
+    ) == (ZERO_HASH32,)
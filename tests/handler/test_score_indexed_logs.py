@@ -0,0 +1,42 @@
+from handler.utils.score_indexed_logs import (
+    ScoreIndexedLogs,
+)
+
+
+def make_log_entry(name, score):
+    return {'name': name, 'score': score}
+
+
+def test_score_indexed_logs_pop_latest():
+    logs = ScoreIndexedLogs([
+        make_log_entry('a', 1),
+        make_log_entry('b', 2),
+        make_log_entry('c', 1),
+    ])
+    assert len(logs) == 3
+    assert logs.pop_latest(3) is None
+    assert logs.pop_latest(None) is None
+    assert logs.pop_latest(1)['name'] == 'c'
+    logs.append(make_log_entry('d', 1))
+    assert logs.pop_latest(1)['name'] == 'd'
+    assert logs.pop_latest(1)['name'] == 'a'
+    assert logs.pop_latest(1) is None
+    assert len(logs) == 1
+    assert logs.pop_latest(2)['name'] == 'b'
+    assert len(logs) == 0
+
+
+def test_score_indexed_logs_arrival_order():
+    names_and_scores = (('a', 3), ('b', 1), ('c', 3), ('d', 2), ('e', 1))
+    logs = ScoreIndexedLogs(make_log_entry(*item) for item in names_and_scores)
+    assert tuple(log_entry['name'] for log_entry in logs) == ('a', 'b', 'c', 'd', 'e')
+
+
+def test_score_indexed_logs_remove_if():
+    names_and_scores = (('a', 3), ('b', 1), ('c', 3), ('d', 2), ('e', 1))
+    logs = ScoreIndexedLogs(make_log_entry(*item) for item in names_and_scores)
+    logs.remove_if(lambda log_entry: log_entry['name'] in ('a', 'd', 'e'))
+    assert len(logs) == 2
+    assert tuple(log_entry['name'] for log_entry in logs) == ('b', 'c')
+    assert logs.pop_latest(2) is None
+    assert logs.pop_latest(3)['name'] == 'c'
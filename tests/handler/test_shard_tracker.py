@@ -2,13 +2,24 @@ import logging
 
 import pytest
 
+from eth_utils import (
+    encode_hex,
+)
+
 from contracts.utils.headers import (
     CollationHeader,
 )
 from handler.log_handler import (
     LogHandler,
+    expand_topic_alternatives,
+    merge_log_filters,
+)
+from handler.utils.web3_utils import (
+    mine,
 )
 from handler.shard_tracker import (
+    COLLATION_ADDED_TOPIC,
+    NextLogUnavailable,
     NoCandidateHead,
     ShardTracker,
     parse_collation_added_log,
@@ -21,18 +32,21 @@ from tests.handler.fixtures import (  # noqa: F401
 
 logger = logging.getLogger('evm.chain.sharding.mainchain_handler.ShardTracker')
 
+COLLATION_ADDED_LOG_0 = {'type': 'mined', 'logIndex': 0, 'transactionIndex': 0, 'transactionHash': b'\xda\xb8:\xe5\x86\xe9Q\xf2\x9c\xc6<g\x9bl\x84\x85\xf4\x1dh\xce\x8d\xe6\xc0D\xa0*E\xd8m\xd4\x01\xcf', 'blockHash': b'\x13\xa97d\r\x90t\xe5;\x84\xf9\xe0\xb8\xf2c\x1c}\x88\xbf\x84DN\xa0\x16Q\xd9|\xa1\x00\x91\xc0\xbd', 'blockNumber': 25, 'address': '0xf4F1600B0a65995833854738764b50A4DA8d6BE1', 'data': '0x000000000000000000000000000000000000000000000000000000000000000534c998a5b8325a1276f385558aae7f5c3f8a40023d289f39649d2fcdd7d49100000000000000000000000000000000000000000000000000000000000000000074785f6c6973742074785f6c6973742074785f6c6973742074785f6c697374200000000000000000000000007e5f4552091a69125d5dfcb7b8c2659029395bdf706f73745f737461706f73745f737461706f73745f737461706f73745f7374617265636569707420726563656970742072656365697074207265636569707420000000000000000000000000000000000000000000000000000000000000000100000000000000000000000000000000000000000000000000000000000000010000000000000000000000000000000000000000000000000000000000000001', 'topics': [b'\x95\x86g\xed\xf5J\xea\x9d\xfa[\xee!\xb2\xb4\x9f|\x11D\xe4[\xa0h"\xa3\xa5\x8fc\x90\xa9\xa1\xc5C', b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00']}  # noqa: E501
+COLLATION_ADDED_LOG_1 = {'type': 'mined', 'logIndex': 0, 'transactionIndex': 0, 'transactionHash': b'\x16\xc2\x0b\xadZ|\x92l@@\xb1\x15\x93nh\xd6]p\x16\xae\xd5\xe7\x9crKl\x8c\xcf\x06\x9a\xd4\x05', 'blockHash': b'\x94\\\xce\x19\x01:j\xbb\xf8\xba\x19\xcfv\xc3z3}^\xb6>\xa0\x0e\xf74\xe8A\t\x12p\x9a\xf6V', 'blockNumber': 30, 'address': '0xf4F1600B0a65995833854738764b50A4DA8d6BE1', 'data': '0x0000000000000000000000000000000000000000000000000000000000000006833a3857300f5dc95cb88d3473ea3158c7d386ac0537d614662f9de55c610c230e5f6e7e4d527c69ee38d61018b7fd8cc5d563abddcfaaaf704a43fd870cf6bf74785f6c6973742074785f6c6973742074785f6c6973742074785f6c697374200000000000000000000000007e5f4552091a69125d5dfcb7b8c2659029395bdf706f73745f737461706f73745f737461706f73745f737461706f73745f7374617265636569707420726563656970742072656365697074207265636569707420000000000000000000000000000000000000000000000000000000000000000200000000000000000000000000000000000000000000000000000000000000010000000000000000000000000000000000000000000000000000000000000002', 'topics': [b'\x95\x86g\xed\xf5J\xea\x9d\xfa[\xee!\xb2\xb4\x9f|\x11D\xe4[\xa0h"\xa3\xa5\x8fc\x90\xa9\xa1\xc5C', b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00']}  # noqa: E501
+
 
 @pytest.mark.parametrize(
     'log, expected_header_dict, expected_is_new_head, expected_score',
     (
         (
-            {'type': 'mined', 'logIndex': 0, 'transactionIndex': 0, 'transactionHash': b'\xda\xb8:\xe5\x86\xe9Q\xf2\x9c\xc6<g\x9bl\x84\x85\xf4\x1dh\xce\x8d\xe6\xc0D\xa0*E\xd8m\xd4\x01\xcf', 'blockHash': b'\x13\xa97d\r\x90t\xe5;\x84\xf9\xe0\xb8\xf2c\x1c}\x88\xbf\x84DN\xa0\x16Q\xd9|\xa1\x00\x91\xc0\xbd', 'blockNumber': 25, 'address': '0xf4F1600B0a65995833854738764b50A4DA8d6BE1', 'data': '0x000000000000000000000000000000000000000000000000000000000000000534c998a5b8325a1276f385558aae7f5c3f8a40023d289f39649d2fcdd7d49100000000000000000000000000000000000000000000000000000000000000000074785f6c6973742074785f6c6973742074785f6c6973742074785f6c697374200000000000000000000000007e5f4552091a69125d5dfcb7b8c2659029395bdf706f73745f737461706f73745f737461706f73745f737461706f73745f7374617265636569707420726563656970742072656365697074207265636569707420000000000000000000000000000000000000000000000000000000000000000100000000000000000000000000000000000000000000000000000000000000010000000000000000000000000000000000000000000000000000000000000001', 'topics': [b'\x95\x86g\xed\xf5J\xea\x9d\xfa[\xee!\xb2\xb4\x9f|\x11D\xe4[\xa0h"\xa3\xa5\x8fc\x90\xa9\xa1\xc5C', b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00']},  # noqa: E501
+            COLLATION_ADDED_LOG_0,
             {'shard_id': 0, 'expected_period_number': 5, 'period_start_prevhash': b'4\xc9\x98\xa5\xb82Z\x12v\xf3\x85U\x8a\xae\x7f\\?\x8a@\x02=(\x9f9d\x9d/\xcd\xd7\xd4\x91\x00', 'parent_hash': b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', 'transaction_root': b'tx_list tx_list tx_list tx_list ', 'coinbase': b'~_ER\t\x1ai\x12]]\xfc\xb7\xb8\xc2e\x90)9[\xdf', 'state_root': b'post_stapost_stapost_stapost_sta', 'receipt_root': b'receipt receipt receipt receipt ', 'number': 1},  # noqa: E501
             True,
             1,
         ),
         (
-            {'type': 'mined', 'logIndex': 0, 'transactionIndex': 0, 'transactionHash': b'\x16\xc2\x0b\xadZ|\x92l@@\xb1\x15\x93nh\xd6]p\x16\xae\xd5\xe7\x9crKl\x8c\xcf\x06\x9a\xd4\x05', 'blockHash': b'\x94\\\xce\x19\x01:j\xbb\xf8\xba\x19\xcfv\xc3z3}^\xb6>\xa0\x0e\xf74\xe8A\t\x12p\x9a\xf6V', 'blockNumber': 30, 'address': '0xf4F1600B0a65995833854738764b50A4DA8d6BE1', 'data': '0x0000000000000000000000000000000000000000000000000000000000000006833a3857300f5dc95cb88d3473ea3158c7d386ac0537d614662f9de55c610c230e5f6e7e4d527c69ee38d61018b7fd8cc5d563abddcfaaaf704a43fd870cf6bf74785f6c6973742074785f6c6973742074785f6c6973742074785f6c697374200000000000000000000000007e5f4552091a69125d5dfcb7b8c2659029395bdf706f73745f737461706f73745f737461706f73745f737461706f73745f7374617265636569707420726563656970742072656365697074207265636569707420000000000000000000000000000000000000000000000000000000000000000200000000000000000000000000000000000000000000000000000000000000010000000000000000000000000000000000000000000000000000000000000002', 'topics': [b'\x95\x86g\xed\xf5J\xea\x9d\xfa[\xee!\xb2\xb4\x9f|\x11D\xe4[\xa0h"\xa3\xa5\x8fc\x90\xa9\xa1\xc5C', b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00']},  # noqa: E501
+            COLLATION_ADDED_LOG_1,
             {'shard_id': 0, 'expected_period_number': 6, 'period_start_prevhash': b'\x83:8W0\x0f]\xc9\\\xb8\x8d4s\xea1X\xc7\xd3\x86\xac\x057\xd6\x14f/\x9d\xe5\\a\x0c#', 'parent_hash': b'\x0e_n~MR|i\xee8\xd6\x10\x18\xb7\xfd\x8c\xc5\xd5c\xab\xdd\xcf\xaa\xafpJC\xfd\x87\x0c\xf6\xbf', 'transaction_root': b'tx_list tx_list tx_list tx_list ', 'coinbase': b'~_ER\t\x1ai\x12]]\xfc\xb7\xb8\xc2e\x90)9[\xdf', 'state_root': b'post_stapost_stapost_stapost_sta', 'receipt_root': b'receipt receipt receipt receipt ', 'number': 2},  # noqa: E501
             True,
             2,
@@ -90,3 +104,216 @@ def test_shard_tracker_fetch_candidate_head(smc_handler,
         assert log['is_new_head'] == expected_is_new_head[i]
     with pytest.raises(NoCandidateHead):
         log = shard_0_tracker.fetch_candidate_head()
+
+
+class DeltaLogHandler:
+    """Replay the given `(removed_logs, added_logs)` deltas
+    """
+
+    def __init__(self, deltas):
+        self.deltas = list(deltas)
+
+    def subscribe(self, address=None, topics=None):
+        return self
+
+    def get_log_delta(self):
+        if len(self.deltas) == 0:
+            return tuple(), tuple()
+        return self.deltas.pop(0)
+
+
+@pytest.mark.parametrize(
+    'mock_score,mock_is_new_head,expected_score,expected_is_new_head',
+    (
+        # test case in doc.md
+        (
+            (10, 11, 12, 11, 13, 14, 15, 11, 12, 13, 14, 12, 13, 14, 15, 16, 17, 18, 19, 16),
+            (True, True, True, False, True, True, True, False, False, False, False, False, False, False, False, True, True, True, True, False),  # noqa: E501
+            (19, 18, 17, 16, 16, 15, 15, 14, 14, 14, 13, 13, 13, 12, 12, 12, 11, 11, 11, 10),
+            (True, True, True, True, False, True, False, True, False, False, True, False, False, True, False, False, True, False, False, True),  # noqa: E501
+        ),
+        (
+            (1, 2, 3, 2, 2, 2),
+            (True, True, True, False, False, False),
+            (3, 2, 2, 2, 2, 1),
+            (True, True, False, False, False, True),
+        ),
+    )
+)
+def test_shard_tracker_iter_candidate_heads(mock_score,
+                                            mock_is_new_head,
+                                            expected_score,
+                                            expected_is_new_head):
+    shard_0_tracker = ShardTracker(0, DeltaLogHandler(()), COLLATION_ADDED_LOG_0['address'])
+    shard_0_tracker.new_logs = [
+        {
+            'header': [None] * 10,
+            'score': mock_score[i],
+            'is_new_head': mock_is_new_head[i],
+        } for i in range(len(mock_score))
+    ]
+    log_entries = tuple(shard_0_tracker.iter_candidate_heads())
+    assert tuple(log_entry['score'] for log_entry in log_entries) == expected_score
+    assert tuple(log_entry['is_new_head'] for log_entry in log_entries) == expected_is_new_head
+    assert len(shard_0_tracker.new_logs) == 0
+
+
+def test_shard_tracker_iter_candidate_heads_lazily():
+    shard_0_tracker = ShardTracker(0, DeltaLogHandler(()), COLLATION_ADDED_LOG_0['address'])
+    mock_scores = (1, 2, 3, 2, 4, 3)
+    shard_0_tracker.new_logs = [
+        {'header': None, 'score': score, 'is_new_head': score > max(mock_scores[:i] or (0,))}
+        for i, score in enumerate(mock_scores)
+    ]
+    candidate_heads = shard_0_tracker.iter_candidate_heads()
+    assert next(candidate_heads)['score'] == 4
+    # the newest head is known once the new head with score 4 is pulled
+    assert len(shard_0_tracker.new_logs) == 4
+    # the older one of the logs with score 3
+    assert next(candidate_heads)['is_new_head']
+    candidate_heads.close()
+    # the logs pulled but not yielded are put back, in the same order
+    assert tuple(log_entry['score'] for log_entry in shard_0_tracker.new_logs) == (1, 2, 2, 3)
+
+
+def test_shard_tracker_remove_revoked_logs():
+    log_handler = DeltaLogHandler((
+        (tuple(), (COLLATION_ADDED_LOG_0, COLLATION_ADDED_LOG_1)),
+        ((COLLATION_ADDED_LOG_1,), tuple()),
+    ))
+    shard_0_tracker = ShardTracker(0, log_handler, COLLATION_ADDED_LOG_0['address'])
+    log = shard_0_tracker.get_next_log()
+    assert log['score'] == 2
+    shard_0_tracker.unchecked_logs.append(log)
+    assert len(shard_0_tracker.new_logs) == 1
+    # the block including the log with score 2 is revoked
+    log = shard_0_tracker.get_next_log()
+    assert log['score'] == 1
+    assert len(shard_0_tracker.unchecked_logs) == 0
+    assert len(shard_0_tracker.new_logs) == 0
+
+
+def test_shard_trackers_share_log_handler(smc_handler, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    log_handler = LogHandler(w3)
+    shard_1_log = dict(
+        COLLATION_ADDED_LOG_0,
+        topics=[COLLATION_ADDED_LOG_0['topics'][0], (1).to_bytes(32, byteorder='big')],
+        address=smc_handler.address,
+    )
+    shard_0_log = dict(COLLATION_ADDED_LOG_1, address=smc_handler.address)
+    get_logs_params = []
+
+    def mock_get_logs(filter_params):
+        get_logs_params.append(filter_params)
+        return [shard_1_log, shard_0_log]
+
+    monkeypatch.setattr(w3.eth, 'getLogs', mock_get_logs)
+    shard_trackers = tuple(
+        ShardTracker(shard_id, log_handler, smc_handler.address)
+        for shard_id in range(3)
+    )
+    mine(w3, 1)
+    log = shard_trackers[0].get_next_log()
+    assert type(log['header']) is CollationHeader
+    assert log['header'].shard_id == 0
+    assert log['score'] == 2
+    log = shard_trackers[1].get_next_log()
+    assert log['header'].shard_id == 1
+    assert log['score'] == 1
+    with pytest.raises(NextLogUnavailable):
+        shard_trackers[2].get_next_log()
+    # all the shards are served by one `getLogs`, with the shard id topics as the alternatives
+    assert len(get_logs_params) == 1
+    assert get_logs_params[0]['topics'] == expand_topic_alternatives([
+        encode_hex(COLLATION_ADDED_TOPIC),
+        [encode_hex(shard_id.to_bytes(32, byteorder='big')) for shard_id in range(3)],
+    ])
+
+
+def test_shard_tracker_close(smc_handler):  # noqa: F811
+    log_handler = LogHandler(smc_handler.web3)
+    shard_trackers = tuple(
+        ShardTracker(shard_id, log_handler, smc_handler.address)
+        for shard_id in range(2)
+    )
+    shard_trackers[0].close()
+    assert log_handler.subscriptions == [shard_trackers[1].log_subscription]
+    # the shard id topic of the closed tracker is not fetched anymore
+    assert merge_log_filters(
+        (subscription.address, subscription.topics)
+        for subscription in log_handler.subscriptions
+    ) == (
+        smc_handler.address,
+        [encode_hex(COLLATION_ADDED_TOPIC), encode_hex((1).to_bytes(32, byteorder='big'))],
+    )
+
+
+class MockHeader:
+
+    def __init__(self, hash):
+        self.hash = hash
+
+
+def make_mock_log_entry(score, is_new_head):
+    return {
+        'header': MockHeader(score.to_bytes(32, byteorder='big')),
+        'score': score,
+        'is_new_head': is_new_head,
+    }
+
+
+def test_shard_tracker_restore_snapshot(monkeypatch):
+    shard_0_tracker = ShardTracker(0, DeltaLogHandler(()), COLLATION_ADDED_LOG_0['address'])
+    pending_logs = []
+    monkeypatch.setattr(
+        shard_0_tracker,
+        '_get_new_logs',
+        lambda: pending_logs.pop(0) if pending_logs else tuple(),
+    )
+    pending_logs.append((
+        make_mock_log_entry(1, True),
+        make_mock_log_entry(2, True),
+        make_mock_log_entry(3, True),
+        make_mock_log_entry(2, False),
+    ))
+    shard_0_tracker.take_snapshot()
+    assert shard_0_tracker.has_snapshot
+    assert shard_0_tracker.fetch_candidate_head()['score'] == 3
+    assert len(shard_0_tracker.unchecked_logs) == 1
+    assert shard_0_tracker.fetch_candidate_head()['score'] == 2
+    # a new block with a higher score head arrives
+    pending_logs.append((make_mock_log_entry(4, True),))
+    # without restoring, the unchecked log with the current score is still returned first
+    assert shard_0_tracker.fetch_candidate_head()['score'] == 2
+    assert shard_0_tracker.fetch_candidate_head()['score'] == 4
+    # all the logs are fetched after the snapshot
+    assert shard_0_tracker.restore_snapshot() == 5
+    assert shard_0_tracker.current_score is None
+    assert len(shard_0_tracker.unchecked_logs) == 0
+    # re-run from the start, with the new logs merged
+    scores = tuple(shard_0_tracker.fetch_candidate_head()['score'] for _ in range(5))
+    assert scores == (4, 3, 2, 2, 1)
+    with pytest.raises(NoCandidateHead):
+        shard_0_tracker.fetch_candidate_head()
+
+
+def test_shard_tracker_restore_snapshot_revoked_logs(monkeypatch):
+    shard_0_tracker = ShardTracker(0, DeltaLogHandler(()), COLLATION_ADDED_LOG_0['address'])
+    shard_0_tracker.new_logs = [make_mock_log_entry(1, True), make_mock_log_entry(2, False)]
+    shard_0_tracker.take_snapshot()
+    assert shard_0_tracker.fetch_candidate_head()['score'] == 1
+    revoked_log_entry = make_mock_log_entry(2, False)
+    monkeypatch.setattr(
+        'handler.shard_tracker.parse_collation_added_logs',
+        lambda logs: [revoked_log_entry] if len(logs) != 0 else [],
+    )
+    shard_0_tracker._process_log_delta((COLLATION_ADDED_LOG_1,), tuple())
+    monkeypatch.setattr(shard_0_tracker, '_get_new_logs', lambda: tuple())
+    assert shard_0_tracker.restore_snapshot() == 0
+    # the revoked log is not brought back
+    assert tuple(log_entry['score'] for log_entry in shard_0_tracker.new_logs) == (1,)
+    shard_0_tracker.discard_snapshot()
+    assert not shard_0_tracker.has_snapshot
+    with pytest.raises(ValueError):
+        shard_0_tracker.restore_snapshot()
@@ -1,11 +1,35 @@
+from concurrent.futures import (
+    ProcessPoolExecutor,
+)
 import logging
 
 import pytest
 
+from eth_tester.backends.pyevm.main import (
+    get_default_account_keys,
+)
+from eth_utils import (
+    to_checksum_address,
+)
+
 from handler.smc_handler import (
     make_call_context,
+    make_transaction_call,
     make_transaction_context,
 )
+from handler.utils.nonce_manager import (
+    NonceManager,
+)
+from handler.utils.transaction_builder import (
+    sign_raw_transaction_job,
+)
+from handler.utils.web3_utils import (
+    batch_requests,
+)
+
+from tests.handler.fixtures import (  # noqa: F401
+    smc_handler,
+)
 
 
 ZERO_ADDR = b'\x00' * 20
@@ -50,3 +74,263 @@ def test_make_call_context():
             sender_address=None,
             gas=1000,
         )
+
+
+def test_make_transaction_call():
+    transaction_call = make_transaction_call('register_notary', value=10)
+    assert transaction_call == {'func_name': 'register_notary', 'args': [], 'value': 10}
+    transaction_call = make_transaction_call('release_notary', gas=100, gas_price=1)
+    assert transaction_call['gas'] == 100
+    assert transaction_call['gas_price'] == 1
+
+
+def test_nonce_manager(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    sender_address = smc_handler.private_key.public_key.to_checksum_address()
+    nonce_manager = NonceManager(w3)
+    transaction_count = w3.eth.getTransactionCount(sender_address)
+    assert nonce_manager.reserve_nonces(sender_address, 2) == range(
+        transaction_count,
+        transaction_count + 2,
+    )
+    assert nonce_manager.get_next_nonce(sender_address) == transaction_count + 2
+    nonce_manager.reset(sender_address)
+    assert nonce_manager.get_next_nonce(sender_address) == transaction_count
+
+
+def enable_auto_mine_transactions(w3):
+    # eth-tester only validates the pending transactions against the latest block, so the
+    # consecutive nonces are accepted only if each transaction is mined right away
+    w3.providers[0].ethereum_tester.enable_auto_mine_transactions()
+
+
+def test_send_transactions_back_to_back(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    enable_auto_mine_transactions(w3)
+    sender_address = smc_handler.private_key.public_key.to_checksum_address()
+    transaction_count = w3.eth.getTransactionCount(sender_address)
+    smc_handler.nonce_manager = NonceManager(w3)
+    get_transaction_count_calls = []
+    get_transaction_count = w3.eth.getTransactionCount
+
+    def counting_get_transaction_count(*args):
+        get_transaction_count_calls.append(args)
+        return get_transaction_count(*args)
+
+    w3.eth.getTransactionCount = counting_get_transaction_count
+    tx_hashes = (
+        smc_handler.register_notary(),
+        smc_handler.deregister_notary(),
+    )
+    tx_hashes += smc_handler.send_many((
+        make_transaction_call('release_notary'),
+        make_transaction_call('register_notary', value=smc_handler.config['NOTARY_DEPOSIT']),
+    ))
+    assert len(get_transaction_count_calls) == 1
+    # none of the nonces is reused
+    assert get_transaction_count(sender_address) == transaction_count + 4
+    for tx_hash in tx_hashes:
+        assert w3.eth.getTransactionReceipt(tx_hash) is not None
+
+
+def test_signing_failure_gives_nonce_back(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    sender_address = smc_handler.private_key.public_key.to_checksum_address()
+    transaction_count = w3.eth.getTransactionCount(sender_address)
+    smc_handler.nonce_manager = NonceManager(w3)
+    # `register_notary` takes no argument
+    with pytest.raises(ValueError):
+        smc_handler._send_transaction('register_notary', [1])
+    assert smc_handler.nonce_manager.get_next_nonce(sender_address) == transaction_count
+    smc_handler.nonce_manager.reset(sender_address)
+    with pytest.raises(ValueError):
+        smc_handler.send_many((
+            make_transaction_call('release_notary'),
+            make_transaction_call('register_notary', args=(1,)),
+        ))
+    assert smc_handler.nonce_manager.get_next_nonce(sender_address) == transaction_count
+
+
+def test_send_many_without_nonce_manager(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    enable_auto_mine_transactions(w3)
+    sender_address = smc_handler.private_key.public_key.to_checksum_address()
+    transaction_count = w3.eth.getTransactionCount(sender_address)
+    tx_hashes = smc_handler.send_many((
+        make_transaction_call('register_notary', value=smc_handler.config['NOTARY_DEPOSIT']),
+        make_transaction_call('deregister_notary'),
+    ))
+    assert len(tx_hashes) == 2
+    assert w3.eth.getTransactionCount(sender_address) == transaction_count + 2
+
+
+# the calls to eth-tester can not be concurrent, since they share the journal of py-evm
+SERIAL_BATCH_SIZE = 1
+
+
+def test_batch_call(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    enable_auto_mine_transactions(w3)
+    private_keys = get_default_account_keys()[:3]
+    notary_addresses = tuple(
+        private_key.public_key.to_canonical_address()
+        for private_key in private_keys
+    )
+    assert smc_handler.get_notary_pool(batch_size=SERIAL_BATCH_SIZE) == ()
+    for private_key in private_keys:
+        smc_handler.register_notary(private_key=private_key)
+    block_number = w3.eth.blockNumber
+    smc_handler.deregister_notary(private_key=private_keys[1])
+
+    assert smc_handler.get_notary_pool(batch_size=SERIAL_BATCH_SIZE) == (
+        notary_addresses[0],
+        None,
+        notary_addresses[2],
+    )
+    # the reads are pinned to the given block
+    assert smc_handler.get_notary_pool(
+        block_identifier=block_number,
+        batch_size=SERIAL_BATCH_SIZE,
+    ) == notary_addresses
+    results = smc_handler.batch_call(
+        (
+            ('notary_pool_len', ()),
+            ('empty_slots_stack_top', ()),
+            ('does_notary_exist', (to_checksum_address(notary_addresses[1]),)),
+        ),
+        block_identifier=block_number,
+        batch_size=SERIAL_BATCH_SIZE,
+    )
+    assert results == (3, 0, True)
+    assert smc_handler.batch_call((('notary_pool_len', ()),)) == (2,)
+    assert smc_handler.batch_call(()) == ()
+    # the calls are serial by default, as eth-tester needs
+    assert smc_handler.get_notary_pool() == (notary_addresses[0], None, notary_addresses[2])
+
+
+def test_batch_requests():
+    assert batch_requests(pow, ((2, 3), (3, 2))) == (8, 9)
+    assert batch_requests(pow, ((2, idx) for idx in range(10)), batch_size=4) == tuple(
+        2 ** idx
+        for idx in range(10)
+    )
+    with pytest.raises(ValueError):
+        batch_requests(pow, ((2, 3),), batch_size=0)
+
+
+def test_sign_raw_transaction_job(smc_handler):  # noqa: F811
+    private_key = get_default_account_keys()[1]
+    signing_job = smc_handler._make_signing_job(
+        private_key,
+        5,
+        None,
+        **make_transaction_call('register_notary', value=smc_handler.config['NOTARY_DEPOSIT'])
+    )
+    expected_raw_transaction = smc_handler._sign_transaction(
+        'register_notary',
+        [],
+        private_key,
+        5,
+        value=smc_handler.config['NOTARY_DEPOSIT'],
+    )
+    assert sign_raw_transaction_job(signing_job) == bytes(expected_raw_transaction)
+
+
+def test_send_bulk(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    enable_auto_mine_transactions(w3)
+    private_keys = get_default_account_keys()[:3]
+    notary_addresses = tuple(
+        private_key.public_key.to_canonical_address()
+        for private_key in private_keys
+    )
+    register_notary_call = make_transaction_call(
+        'register_notary',
+        value=smc_handler.config['NOTARY_DEPOSIT'],
+    )
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        tx_hashes = smc_handler.send_bulk(
+            (
+                (private_keys[0], register_notary_call),
+                (private_keys[1], register_notary_call),
+                (private_keys[2], register_notary_call),
+                # the nonces of the same key are consecutive
+                (private_keys[0], make_transaction_call('deregister_notary')),
+            ),
+            executor=executor,
+            chunk_size=1,
+        )
+    assert len(tx_hashes) == 4
+    for tx_hash in tx_hashes:
+        assert w3.eth.getTransactionReceipt(tx_hash) is not None
+    assert smc_handler.get_notary_pool(batch_size=SERIAL_BATCH_SIZE) == (
+        None,
+        notary_addresses[1],
+        notary_addresses[2],
+    )
+    # a pool is made for the call if none is given
+    tx_hashes = smc_handler.send_bulk(
+        ((private_keys[1], make_transaction_call('deregister_notary')),),
+        max_workers=1,
+    )
+    assert w3.eth.getTransactionReceipt(tx_hashes[0]) is not None
+    assert smc_handler.notary_pool_len() == 1
+    assert smc_handler.send_bulk(()) == ()
+
+
+class FailingExecutor:
+
+    def map(self, fn, *iterables, chunksize=1):
+        tuple(zip(*iterables))
+        raise ValueError('failed to sign')
+
+
+def test_send_bulk_signing_failure(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    smc_handler.nonce_manager = NonceManager(w3)
+    private_keys = get_default_account_keys()[:2]
+    sender_addresses = tuple(
+        private_key.public_key.to_checksum_address()
+        for private_key in private_keys
+    )
+    transaction_counts = tuple(
+        w3.eth.getTransactionCount(sender_address)
+        for sender_address in sender_addresses
+    )
+    with pytest.raises(ValueError):
+        smc_handler.send_bulk(
+            tuple(
+                (private_key, make_transaction_call('deregister_notary'))
+                for private_key in private_keys
+            ),
+            executor=FailingExecutor(),
+        )
+    # the reserved nonces of all the keys are given back
+    for sender_address, transaction_count in zip(sender_addresses, transaction_counts):
+        assert smc_handler.nonce_manager.get_next_nonce(sender_address) == transaction_count
+
+
+def test_send_bulk_nonce_reservation_failure(smc_handler, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    smc_handler.nonce_manager = NonceManager(w3)
+    private_keys = get_default_account_keys()[:2]
+    sender_address = private_keys[0].public_key.to_checksum_address()
+    transaction_count = w3.eth.getTransactionCount(sender_address)
+    reserve_nonces = smc_handler._reserve_nonces
+
+    def failing_reserve_nonces(private_key, count):
+        if private_key == private_keys[1]:
+            raise ConnectionError
+        return reserve_nonces(private_key, count)
+
+    monkeypatch.setattr(smc_handler, '_reserve_nonces', failing_reserve_nonces)
+    with pytest.raises(ConnectionError):
+        smc_handler.send_bulk(
+            tuple(
+                (private_key, make_transaction_call('deregister_notary'))
+                for private_key in private_keys
+            ),
+            max_workers=1,
+        )
+    # the nonces reserved for the keys before the failing one are given back
+    assert smc_handler.nonce_manager.get_next_nonce(sender_address) == transaction_count
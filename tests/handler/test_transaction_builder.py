@@ -0,0 +1,152 @@
+import time
+from types import (
+    SimpleNamespace,
+)
+
+import pytest
+
+from eth_utils import (
+    to_canonical_address,
+    to_checksum_address,
+)
+
+from handler.shard_tracker import (
+    parse_collation_added_log,
+)
+from handler.utils.collation_added_logs import (
+    parse_collation_added_logs,
+)
+from handler.utils.nonce_manager import (
+    NonceManager,
+)
+from handler.utils.transaction_builder import (
+    ADD_HEADER_DATA_SIZE,
+    ADD_HEADER_SELECTOR,
+    make_add_header_data,
+    sign_raw_transaction,
+)
+
+from tests.handler.fixtures import (  # noqa: F401
+    smc_handler,
+)
+from tests.handler.test_shard_tracker import (
+    COLLATION_ADDED_LOG_1,
+)
+
+
+BENCHMARK_TRANSACTION_COUNT = 200
+# the time to build an `add_header` transaction, in seconds
+MAX_BUILD_DURATION = 0.001
+
+COLLATION_HEADER = parse_collation_added_log(COLLATION_ADDED_LOG_1)['header']
+
+
+def get_add_header_args(collation_header):
+    return [
+        collation_header.shard_id,
+        collation_header.expected_period_number,
+        collation_header.period_start_prevhash,
+        collation_header.parent_hash,
+        collation_header.transaction_root,
+        to_checksum_address(collation_header.coinbase),
+        collation_header.state_root,
+        collation_header.receipt_root,
+        collation_header.number,
+    ]
+
+
+def sign_add_header(smc_handler, nonce, chain_id=None, private_key=None):  # noqa: F811
+    if private_key is None:
+        private_key = smc_handler.private_key
+    return sign_raw_transaction(
+        private_key,
+        nonce=nonce,
+        gas_price=smc_handler.config['GAS_PRICE'],
+        gas=smc_handler.config['DEFAULT_GAS'],
+        to=to_canonical_address(smc_handler.address),
+        value=0,
+        data=make_add_header_data(COLLATION_HEADER),
+        chain_id=chain_id,
+    )
+
+
+def make_malformed_header():
+    malformed_header = SimpleNamespace(**dict(
+        (field_name, getattr(COLLATION_HEADER, field_name))
+        for field_name, _ in COLLATION_HEADER.fields
+    ))
+    malformed_header.parent_hash = b'\x01' * 31
+    return malformed_header
+
+
+def test_make_add_header_data(smc_handler):  # noqa: F811
+    data = make_add_header_data(COLLATION_HEADER)
+    assert len(data) == ADD_HEADER_DATA_SIZE
+    assert data[:4] == ADD_HEADER_SELECTOR
+    expected_data = smc_handler.encodeABI(
+        'add_header',
+        args=get_add_header_args(COLLATION_HEADER),
+    )
+    assert '0x' + data.hex() == expected_data
+    # the lazy headers of the logs are encoded the same
+    lazy_log_entry, = parse_collation_added_logs((COLLATION_ADDED_LOG_1,))
+    assert make_add_header_data(lazy_log_entry['header']) == data
+
+    with pytest.raises(ValueError):
+        make_add_header_data(make_malformed_header())
+
+
+@pytest.mark.parametrize('chain_id', (None, 1))  # noqa: F811
+def test_sign_raw_transaction(smc_handler, chain_id):
+    raw_transaction = sign_add_header(smc_handler, nonce=3, chain_id=chain_id)
+    expected_raw_transaction = smc_handler._sign_transaction(
+        'add_header',
+        get_add_header_args(COLLATION_HEADER),
+        smc_handler.private_key,
+        3,
+        chain_id=chain_id,
+    )
+    assert raw_transaction == bytes(expected_raw_transaction)
+
+
+def test_add_header_malformed_header(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    sender_address = smc_handler.private_key.public_key.to_checksum_address()
+    transaction_count = w3.eth.getTransactionCount(sender_address)
+    smc_handler.nonce_manager = NonceManager(w3)
+    with pytest.raises(ValueError):
+        smc_handler.add_header(make_malformed_header())
+    # the reserved nonce is given back
+    assert smc_handler.nonce_manager.get_next_nonce(sender_address) == transaction_count
+
+
+class PresignedPrivateKey:
+    """A private key returning the same signature for every message, so the time to build the
+    transaction is measured apart from the time of the ECDSA signature, which depends on the
+    backend of `eth_keys`
+    """
+
+    def __init__(self, private_key):
+        self.signature = private_key.sign_msg_hash(b'\x00' * 32)
+
+    def sign_msg_hash(self, msg_hash):
+        return self.signature
+
+
+def test_sign_add_header_benchmark(smc_handler):  # noqa: F811
+    private_key = PresignedPrivateKey(smc_handler.private_key)
+    start = time.perf_counter()
+    for nonce in range(BENCHMARK_TRANSACTION_COUNT):
+        sign_add_header(smc_handler, nonce, private_key=private_key)
+    duration = time.perf_counter() - start
+    assert duration / BENCHMARK_TRANSACTION_COUNT < MAX_BUILD_DURATION
+
+
+def test_sign_add_header_with_signature_benchmark(smc_handler):  # noqa: F811
+    # only the native C backend of `eth_keys` signs within the bound
+    pytest.importorskip('coincurve')
+    start = time.perf_counter()
+    for nonce in range(BENCHMARK_TRANSACTION_COUNT):
+        sign_add_header(smc_handler, nonce)
+    duration = time.perf_counter() - start
+    assert duration / BENCHMARK_TRANSACTION_COUNT < MAX_BUILD_DURATION
@@ -0,0 +1,157 @@
+import pytest
+
+from handler.validity_cache import (
+    INVALID,
+    UNAVAILABLE,
+    VALID,
+    ValidityCache,
+    guess_head,
+    memoized_fetch_and_verify_collation,
+)
+
+
+class MockHeader:
+
+    def __init__(self, hash, parent_hash):
+        self.hash = hash
+        self.parent_hash = parent_hash
+
+
+def make_chain(hashes, parent_hash=b'genesis'):
+    headers = []
+    for collation_hash in hashes:
+        headers.append(MockHeader(collation_hash, parent_hash))
+        parent_hash = collation_hash
+    return headers
+
+
+def test_validity_cache_status():
+    validity_cache = ValidityCache(max_size=2)
+    assert validity_cache.get(b'a') is None
+    validity_cache.set_status(b'a', VALID)
+    validity_cache.set_status(b'b', UNAVAILABLE)
+    assert validity_cache.get(b'a') == VALID
+    assert validity_cache.get(b'b') == UNAVAILABLE
+    with pytest.raises(ValueError):
+        validity_cache.set_status(b'a', 'unknown')
+    # `a` is the least recently used one
+    validity_cache.get(b'b')
+    validity_cache.set_status(b'c', INVALID)
+    assert len(validity_cache) == 2
+    assert b'a' not in validity_cache
+    # an invalid collation stays invalid
+    validity_cache.set_status(b'c', VALID)
+    assert validity_cache.get(b'c') == INVALID
+
+
+def test_validity_cache_bounded_with_unknown_parents():
+    max_size = 8
+    validity_cache = ValidityCache(max_size=max_size)
+    for idx in range(100):
+        # neither the parents, nor the grandparents are added
+        validity_cache.add_collation(b'c' + bytes([idx]), b'p' + bytes([idx]))
+        validity_cache.add_collation(b'd' + bytes([idx]), b'p' + bytes([idx]))
+    assert len(validity_cache) == max_size
+    assert len(validity_cache._children) <= max_size
+    assert sum(len(children) for children in validity_cache._children.values()) <= max_size
+    assert len(validity_cache._parents) <= max_size
+    # the evicted collations are not linked to their parents anymore
+    validity_cache.set_status(b'p\x00', INVALID)
+    assert validity_cache.get(b'c\x00') is None
+    # the children of the recent parents are still known
+    validity_cache.set_status(b'p\x63', INVALID)
+    assert validity_cache.get(b'c\x63') == INVALID
+    assert validity_cache.get(b'd\x63') == INVALID
+
+
+def test_validity_cache_propagate_invalidity():
+    validity_cache = ValidityCache()
+    for header in make_chain((b'a', b'b', b'c')):
+        validity_cache.add_collation(header.hash, header.parent_hash)
+        validity_cache.set_status(header.hash, VALID)
+    validity_cache.add_collation(b'd', b'b')
+    validity_cache.set_status(b'b', INVALID)
+    assert validity_cache.get(b'a') == VALID
+    assert validity_cache.get(b'b') == INVALID
+    assert validity_cache.get(b'c') == INVALID
+    assert validity_cache.get(b'd') == INVALID
+    # a collation added under an invalid parent is invalid
+    validity_cache.add_collation(b'e', b'c')
+    assert validity_cache.get(b'e') == INVALID
+
+
+def test_memoized_fetch_and_verify_collation():
+    validity_cache = ValidityCache()
+    verified_hashes = []
+    statuses = {b'a': True, b'b': UNAVAILABLE, b'c': False}
+
+    def fetch_and_verify_collation(header):
+        verified_hashes.append(header.hash)
+        return statuses[header.hash]
+
+    header_a, header_b, header_c = make_chain((b'a', b'b', b'c'))
+    for _ in range(2):
+        assert memoized_fetch_and_verify_collation(
+            validity_cache,
+            header_a,
+            fetch_and_verify_collation,
+        ) == VALID
+        assert memoized_fetch_and_verify_collation(
+            validity_cache,
+            header_b,
+            fetch_and_verify_collation,
+        ) == UNAVAILABLE
+    # the unavailable collation is fetched again
+    assert verified_hashes == [b'a', b'b', b'b']
+    statuses[b'b'] = False
+    assert memoized_fetch_and_verify_collation(
+        validity_cache,
+        header_b,
+        fetch_and_verify_collation,
+    ) == INVALID
+    # the invalidity of the parent is inherited without fetching
+    assert memoized_fetch_and_verify_collation(
+        validity_cache,
+        header_c,
+        fetch_and_verify_collation,
+    ) == INVALID
+    assert verified_hashes == [b'a', b'b', b'b', b'b']
+
+
+def test_guess_head():
+    # genesis <- a <- b <- c, and a <- x <- y <- z, where x is invalid
+    headers = make_chain((b'a', b'b', b'c')) + make_chain((b'x', b'y', b'z'), parent_hash=b'a')
+    headers_by_hash = {header.hash: header for header in headers}
+    verified_hashes = []
+
+    def fetch_and_verify_collation(header):
+        verified_hashes.append(header.hash)
+        return header.hash != b'x'
+
+    def get_parent(header):
+        return headers_by_hash.get(header.parent_hash)
+
+    validity_cache = ValidityCache()
+    candidate_heads = (
+        {'header': headers_by_hash[b'z'], 'score': 4},
+        {'header': headers_by_hash[b'y'], 'score': 3},
+        {'header': headers_by_hash[b'c'], 'score': 3},
+    )
+    head = guess_head(candidate_heads, get_parent, fetch_and_verify_collation, validity_cache)
+    assert head['header'].hash == b'c'
+    # `y` is known invalid once `x` is, and `a` is verified once
+    assert verified_hashes == [b'z', b'y', b'x', b'c', b'b', b'a']
+    assert guess_head(
+        candidate_heads[:2],
+        get_parent,
+        fetch_and_verify_collation,
+        validity_cache,
+    ) is None
+    head = guess_head(
+        candidate_heads,
+        get_parent,
+        lambda header: True,
+        ValidityCache(),
+        max_depth=0,
+    )
+    assert head['header'].hash == b'z'